@@ -1,22 +1,34 @@
 # Monitor and control Apache web server workers from Python.
 #
 # Author: Peter Odding <peter@peterodding.com>
-# Last Change: February 28, 2020
+# Last Change: October 18, 2026
 # URL: https://apache-manager.readthedocs.io
 
 """The :mod:`apache_manager` module defines the core logic of the Apache manager."""
 
 # Standard library modules.
+import collections
+import contextlib
+import errno
+import functools
+import heapq
+import json
 import os
 import re
+import signal
+import socket
+import time
 
 # External dependencies.
 from bs4 import BeautifulSoup
 from humanfriendly import (
+    InvalidSize,
     compact,
     concatenate,
+    format_path,
     format_size,
     format_timespan,
+    parse_path,
     parse_size,
     parse_timespan,
     pluralize,
@@ -24,7 +36,7 @@ from humanfriendly import (
 )
 from humanfriendly.terminal import output
 from humanfriendly.text import generate_slug
-from proc.apache import find_apache_memory_usage, find_apache_workers
+from proc.apache import ApacheDaemonNotRunning, MaybeApacheWorker, StatsList
 from proc.core import Process
 from property_manager import (
     PropertyManager,
@@ -34,13 +46,19 @@ from property_manager import (
     required_property,
     writable_property,
 )
-from six.moves.urllib.error import HTTPError
+from six.moves.http_client import HTTPException
+from six.moves.urllib.error import HTTPError, URLError
 from six.moves.urllib.request import urlopen
 from update_dotdee import ConfigLoader
 from verboselogs import VerboseLogger
 
 # Modules included in our package.
+from apache_manager.cache import DiscoveryCache, find_sources, fingerprint_files
+from apache_manager.discovery import APACHE_CONFIG_FILES, PROBE_TIMEOUT, STATUS_PATH, ApacheConfig, probe_status_urls
 from apache_manager.exceptions import AddressDiscoveryError, StatusPageError
+from apache_manager.history import HISTORY_RETENTION, MetricHistory
+from apache_manager.processes import PROC_ROOT, open_process, wait_for_exit
+from apache_manager.profiling import CycleProfiler
 
 # Semi-standard module versioning.
 __version__ = '2.2'
@@ -48,14 +66,28 @@ __version__ = '2.2'
 # Hide internal identifiers from API documentation.
 __all__ = (
     # Configuration defaults.
+    'CGROUP_ROOT',
     'CONFIG_NAME',
+    'CPU_SAMPLE_COUNT',
+    'EXIT_TIMEOUT',
+    'GROWTH_SAMPLE_COUNT',
     'HANGING_WORKER_THRESHOLD',
     'IDLE_MODES',
+    'KILL_WINDOW',
+    'MEMORY_METRICS',
     'NATIVE_WORKERS_LABEL',
+    'OUTLIER_MEMORY_FLOOR',
+    'OUTLIER_MIN_WORKERS',
+    'OUTLIER_TIME_FLOOR',
     'PORTS_CONF',
+    'PRESSURE_STALL_THRESHOLD',
     'STATUS_COLUMNS',
+    'STATUS_TIMEOUT',
+    'THRESHOLD_OPTIONS',
+    'TIMED_PHASES',
     # Public classes.
     'ApacheManager',
+    'KillCandidate',
     'KillableWorker',
     'NetworkAddress',
     'NonNativeWorker',
@@ -65,12 +97,15 @@ __all__ = (
 CONFIG_NAME = 'apache-manager'
 """The program name used to load configuration files (a string)."""
 
+CGROUP_ROOT = '/sys/fs/cgroup'
+"""The mount point of the unified (version 2) control group hierarchy (a string)."""
+
 PORTS_CONF = '/etc/apache2/ports.conf'
 """
 The absolute pathname of the configuration file that defines the port(s) that
-Apache listens on (a string). This constant is used as a default value for
-:attr:`~ApacheManager.ports_config`. It's based on Debian's Apache 2
-packaging.
+Apache listens on (a string). This file is parsed when neither
+:attr:`~ApacheManager.ports_config` nor :attr:`~ApacheManager.apache_config`
+is available. It's based on Debian's Apache 2 packaging.
 """
 
 STATUS_COLUMNS = (
@@ -82,12 +117,64 @@ The expected column names in the worker status table of the Apache status page
 (an iterable of strings).
 """
 
+CPU_SAMPLE_COUNT = 3
+"""
+The default number of successive CPU utilization samples that must exceed
+:attr:`ApacheManager.max_cpu_percent` before a worker is killed (an integer).
+"""
+
+GROWTH_SAMPLE_COUNT = 10
+"""
+The default number of memory usage samples used to estimate the memory growth
+rate of workers (an integer). Refer to :attr:`ApacheManager.memory_growth`.
+"""
+
 IDLE_MODES = ('_', 'I', '.')
 """
 Worker modes that are considered idle (a tuple of strings). Refer to
 :attr:`WorkerStatus.is_idle`.
 """
 
+EXIT_TIMEOUT = 10
+"""The number of seconds that :func:`ApacheManager.stop_workers()` waits for killed workers to exit (a number)."""
+
+KILL_WINDOW = 60 * 60
+"""The default time window of :attr:`ApacheManager.max_kills_per_window` (a number of seconds)."""
+
+MEMORY_METRICS = ('rss', 'pss', 'uss', 'swap')
+"""
+The supported ways to measure the memory usage of workers (a tuple of strings).
+
+``rss``
+  The resident set size, this includes pages shared with other processes (for
+  example the copy-on-write pages inherited from the Apache master process).
+
+``pss``
+  The proportional set size, this divides shared pages between the processes
+  that share them.
+
+``uss``
+  The unique set size, this only counts the pages that are private to the
+  process (i.e. the memory that is returned when the process is killed).
+
+``swap``
+  The amount of memory that has been swapped out.
+
+Refer to :attr:`ApacheManager.memory_metric` for details.
+"""
+
+OUTLIER_MEMORY_FLOOR = 1024 * 1024 * 100
+"""The default lower bound of adaptive memory thresholds (a number of bytes, 100 MiB)."""
+
+OUTLIER_MIN_WORKERS = 5
+"""The default minimum number of workers in a group for :attr:`ApacheManager.outlier_factor` to apply (an integer)."""
+
+OUTLIER_TIME_FLOOR = 60
+"""The default lower bound of adaptive request duration thresholds (a number of seconds)."""
+
+PRESSURE_STALL_THRESHOLD = 10
+"""The default value of :attr:`ApacheManager.pressure_stall_threshold` (a percentage)."""
+
 NATIVE_WORKERS_LABEL = 'native'
 """
 The label used to identify native Apache workers in exported metrics (a string).
@@ -96,16 +183,82 @@ This is used by :func:`ApacheManager.save_metrics()` to distinguish native
 Apache workers from WSGI process groups.
 """
 
+STATUS_TIMEOUT = 10
+"""The default number of seconds that :func:`ApacheManager.fetch_status_page()` waits for Apache (a number)."""
+
 HANGING_WORKER_THRESHOLD = 60 * 5
 """
 The number of seconds before an active worker is considered 'hanging' (a
 number). Refer to :attr:`ApacheManager.hanging_workers`.
 """
 
+THRESHOLD_OPTIONS = (
+    ('max-cpu-percent', 'max_cpu_percent', 'max_cpu_percent'),
+    ('max-memory-active', 'max_memory_active', 'max_memory_active'),
+    ('max-memory-idle', 'max_memory_idle', 'max_memory_idle'),
+    ('recycle-horizon', 'recycle_horizon', 'recycle_horizon'),
+    ('worker-timeout', 'timeout', 'worker_timeout'),
+)
+"""
+The thresholds that can be overridden per group of workers (a tuple of tuples).
+
+Each tuple contains the name of a configuration option, the corresponding
+keyword argument of :func:`ApacheManager.kill_workers()` and the
+corresponding property of :class:`ApacheManager`.
+"""
+
+TIMED_PHASES = ('discovery', 'fetch', 'parse', 'proc-scan', 'decide', 'kill', 'save')
+"""
+The phases of a monitoring cycle that are timed (a tuple of strings).
+
+``discovery``
+  Discovering the listen addresses (see :attr:`ApacheManager.listen_addresses`).
+
+``fetch``
+  Fetching status pages (see :func:`ApacheManager.fetch_status_page()`).
+
+``parse``
+  Parsing status pages (see :attr:`ApacheManager.slots` and
+  :attr:`ApacheManager.server_metrics`).
+
+``proc-scan``
+  Finding worker processes and reading their memory usage (see
+  :attr:`ApacheManager.apache_workers` and
+  :attr:`ApacheManager.killable_workers`).
+
+``decide``
+  Selecting the workers to kill (see :func:`ApacheManager.find_kill_candidates()`).
+
+``kill``
+  Stopping the selected workers (see :func:`ApacheManager.stop_workers()`).
+
+``save``
+  Writing the data file, metric history and state file (see
+  :func:`ApacheManager.save_metrics()`).
+
+Refer to :attr:`ApacheManager.phase_timings` for details.
+"""
+
 # Initialize a logger for this module.
 logger = VerboseLogger(__name__)
 
 
+def timed_phase(name):
+    """
+    Decorate an :class:`ApacheManager` method to time it as a phase of the monitoring cycle.
+
+    :param name: One of the strings in :data:`TIMED_PHASES`.
+    :returns: A decorator (see :func:`ApacheManager.time_phase()`).
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(self, *args, **kw):
+            with self.time_phase(name):
+                return function(self, *args, **kw)
+        return wrapper
+    return decorator
+
+
 class ApacheManager(PropertyManager):
 
     """
@@ -117,24 +270,114 @@ class ApacheManager(PropertyManager):
     at once is to call the :func:`refresh()` method.
     """
 
+    @mutable_property
+    def apache_config(self):
+        """
+        The pathname of the main Apache configuration file (a string or :data:`None`).
+
+        This file is parsed (following its includes) to discover where
+        Apache is listening and where the status page is served (see
+        :func:`parse_apache_config()`). The configuration file option is
+        called ``apache-config``. Defaults to the first file in
+        :data:`~apache_manager.discovery.APACHE_CONFIG_FILES` that exists.
+        """
+        value = self.config.get('apache-config')
+        if value:
+            return value
+        for filename in APACHE_CONFIG_FILES:
+            if os.path.isfile(filename):
+                return filename
+
+    @cached_property
+    @timed_phase('proc-scan')
+    def apache_workers(self):
+        """
+        The result of :func:`find_worker_processes()` for :attr:`proc_root` (a list of process objects).
+
+        This property caches the result so that :attr:`combined_memory_usage`
+        and :attr:`foreign_workers` share a single scan of ``/proc``.
+        """
+        return find_worker_processes(self.proc_root)
+
+    @mutable_property
+    def cache_file(self):
+        """
+        The pathname of the cache file used by :attr:`discovery_cache` (a string or :data:`None`).
+
+        Because the cache contains the configuration this can't be set in a
+        configuration file. The default is :data:`None` which disables the
+        cache (the command line interface enables it by default, see
+        :data:`~apache_manager.cache.CACHE_FILE`).
+        """
+
+    @mutable_property
+    def cgroup_limit_percent(self):
+        """
+        Kill workers when Apache's control group approaches its memory limit (a number).
+
+        When the memory usage of :attr:`cgroup_path` exceeds this percentage
+        of its memory limit (``memory.high`` or, when that isn't set,
+        ``memory.max``) the minimum number of idle workers is killed to bring
+        the memory usage below the percentage again (larger workers before
+        smaller ones, see :func:`find_budget_candidates()`). The memory usage
+        is ``memory.current`` minus the page cache (``file`` in
+        ``memory.stat``), because killing workers doesn't free the page cache
+        (the kernel reclaims it when needed). Active workers are never killed
+        by this policy, so when the idle workers don't use enough memory the
+        control group can stay above the percentage.
+
+        The configuration file option is called ``cgroup-limit-percent``. The
+        default is zero (which disables this policy).
+        """
+        value = self.config.get('cgroup-limit-percent')
+        return float(value.rstrip('%')) if value else 0
+
+    @cached_property
+    def cgroup_path(self):
+        """
+        The pathname of the control group of Apache (a string or :data:`None`).
+
+        The control group is discovered using ``/proc/<pid>/cgroup`` of
+        :attr:`master_pid` (see :func:`find_cgroup()`), it can be set
+        explicitly using the configuration file option ``cgroup-path``. On
+        systems without a unified (version 2) control group hierarchy the
+        value of this property is :data:`None`.
+        """
+        value = self.config.get('cgroup-path')
+        if value:
+            return value
+        if self.master_pid:
+            return find_cgroup(self.master_pid, self.proc_root)
+
+    @cached_property
+    def cgroup_stats(self):
+        """
+        The memory and CPU usage of :attr:`cgroup_path` (a dictionary or :data:`None`).
+
+        Refer to :func:`read_cgroup_stats()` for details. Reading a handful of
+        files for the whole control group is much cheaper than summing the
+        memory usage of thousands of processes, and unlike those sums it
+        includes the page cache charged to Apache.
+        """
+        if self.cgroup_path:
+            return read_cgroup_stats(self.cgroup_path)
+
     @cached_property
+    @timed_phase('proc-scan')
     def combined_memory_usage(self):
         """
-        The result of :func:`~proc.apache.find_apache_memory_usage()`.
+        The memory usage of :attr:`apache_workers` (see :func:`summarize_memory_usage()`).
 
         This property caches the result so that when :attr:`memory_usage` and
-        :attr:`wsgi_process_groups` are both dereferenced, the function
-        :func:`~proc.apache.find_apache_memory_usage()` only has to be called
-        once.
+        :attr:`wsgi_process_groups` are both dereferenced, the memory usage
+        only has to be computed once.
         """
-        return find_apache_memory_usage()
+        return self.summarize_memory_usage(self.apache_workers)
 
     @lazy_property
     def config(self):
         """A dictionary with user defined configuration options."""
-        if CONFIG_NAME in self.config_loader.section_names:
-            return self.config_loader.get_options(CONFIG_NAME)
-        return {}
+        return dict(self.config_sections.get(CONFIG_NAME, {}))
 
     @lazy_property
     def config_loader(self):
@@ -170,24 +413,304 @@ class ApacheManager(PropertyManager):
 
         ============================  =================================
         Configuration option          Instance property (documentation)
+        ``apache-config``             :attr:`apache_config`
+        ``cgroup-limit-percent``      :attr:`cgroup_limit_percent`
+        ``cgroup-path``               :attr:`cgroup_path`
+        ``cpu-sample-count``          :attr:`cpu_sample_count`
+        ``cycle-time-budget``         :attr:`cycle_time_budget`
+        ``drain-timeout``             :attr:`drain_timeout`
+        ``growth-sample-count``       :attr:`growth_sample_count`
         ``hanging-worker-threshold``  :attr:`hanging_worker_threshold`
+        ``history-directory``         :attr:`history_directory`
+        ``history-retention``         :attr:`history_retention`
+        ``kill-window``               :attr:`kill_window`
+        ``max-cpu-percent``           :attr:`max_cpu_percent`
+        ``max-kills-per-cycle``       :attr:`max_kills_per_cycle`
+        ``max-kills-per-window``      :attr:`max_kills_per_window`
         ``max-memory-active``         :attr:`max_memory_active`
         ``max-memory-idle``           :attr:`max_memory_idle`
+        ``memory-budgets``            :attr:`memory_budgets`
+        ``memory-metric``             :attr:`memory_metric`
+        ``outlier-factor``            :attr:`outlier_factor`
+        ``outlier-memory-ceiling``    :attr:`outlier_memory_ceiling`
+        ``outlier-memory-floor``      :attr:`outlier_memory_floor`
+        ``outlier-min-workers``       :attr:`outlier_min_workers`
+        ``outlier-time-ceiling``      :attr:`outlier_time_ceiling`
+        ``outlier-time-floor``        :attr:`outlier_time_floor`
+        ``pressure-curve``            :attr:`pressure_curve`
+        ``pressure-stall-threshold``  :attr:`pressure_stall_threshold`
+        ``probe-timeout``             :attr:`probe_timeout`
+        ``proc-root``                 :attr:`proc_root`
+        ``profile-every``             :attr:`profile_every`
+        ``profile-file``              :attr:`profile_file`
+        ``profile-mode``              :attr:`profile_mode`
+        ``recycle-horizon``           :attr:`recycle_horizon`
+        ``state-file``                :attr:`state_file`
+        ``status-timeout``            :attr:`status_timeout`
         ``worker-timeout``            :attr:`worker_timeout`
         ============================  =================================
+
+        Thresholds can be overridden for specific groups of workers in
+        ``[apache-manager:NAME]`` sections (see :attr:`group_thresholds`).
         """
         return ConfigLoader(program_name=CONFIG_NAME)
 
+    @lazy_property
+    def config_sections(self):
+        """
+        The options in each section of the configuration files (a dictionary of dictionaries).
+
+        The configuration files are loaded by :attr:`config_loader`, unless
+        :attr:`discovery_cache` contains the options and none of the files
+        (or the directories searched for files) have changed since.
+        """
+        patterns = [parse_path(p) for p in self.config_loader.filename_patterns]
+        if self.discovery_cache:
+            value = self.discovery_cache.get('config', key=patterns)
+            if value is not None:
+                return value
+            sources = fingerprint_files(find_sources(patterns))
+        value = dict(
+            (section, self.config_loader.get_options(section))
+            for section in self.config_loader.section_names
+        )
+        if self.discovery_cache:
+            self.discovery_cache.set('config', value, sources, key=patterns)
+        return value
+
+    @lazy_property
+    def cpu_history(self):
+        """
+        Recent CPU time samples of Apache worker processes (a dictionary).
+
+        The keys of this dictionary are tuples with a process ID and the start
+        time of the process (in clock ticks since boot, so that reuse of
+        process IDs is detected) and the values are lists of tuples with two
+        numbers: A timestamp and the total CPU time used by the process (in
+        seconds). The samples are added by :attr:`cpu_usage` and survive
+        :func:`refresh()`, so a single :class:`ApacheManager` object that is
+        refreshed periodically accumulates the history that's needed to
+        compute CPU utilization. Like :attr:`deferred_kills` the samples are
+        also kept in :attr:`state_file` (for invocations from cron).
+        """
+        return load_samples(self.state.get('cpu_history', []))
+
+    @mutable_property
+    def cpu_sample_count(self):
+        """
+        The number of successive samples used to detect CPU spinning workers (an integer).
+
+        A worker is only killed for exceeding :attr:`max_cpu_percent` when
+        its CPU utilization exceeded the threshold in this many successive
+        samples (see :attr:`cpu_usage`). The configuration file option is
+        called ``cpu-sample-count``, the default is :data:`CPU_SAMPLE_COUNT`.
+        """
+        value = self.config.get('cpu-sample-count')
+        return int(value) if value else CPU_SAMPLE_COUNT
+
+    @cached_property
+    def cpu_usage(self):
+        """
+        The CPU utilization of Apache worker processes (a dictionary).
+
+        The keys of this dictionary are process IDs and the values are lists
+        with the CPU utilization (a percentage where 100% equals one CPU core)
+        during each interval between successive samples, with the most recent
+        interval last. Processes that have been sampled only once map to an
+        empty list.
+
+        The CPU time of every process in :attr:`killable_workers` is sampled
+        from ``/proc/[pid]/stat`` (this doesn't require additional I/O because
+        the file was already read to construct the process objects) and added
+        to :attr:`cpu_history`. Because the value of this property is cached
+        a new sample is taken after every :func:`refresh()`.
+        """
+        timestamp = self.sample_time
+        processes = dict((w.pid, w.process) for w in self.killable_workers if w.process)
+        history = {}
+        usage = {}
+        for pid, process in processes.items():
+            key = (pid, self.get_start_ticks(process))
+            samples = self.cpu_history.get(key, [])
+            cpu_time = self.get_cpu_time(process)
+            if cpu_time is None:
+                continue
+            samples.append((timestamp, cpu_time))
+            # We keep one more sample than there are intervals.
+            samples = samples[-(self.cpu_sample_count + 1):]
+            history[key] = samples
+            usage[pid] = [
+                100.0 * (c2 - c1) / (t2 - t1)
+                for (t1, c1), (t2, c2) in zip(samples, samples[1:])
+                if t2 > t1
+            ]
+        # Forget about processes that have disappeared.
+        self.cpu_history.clear()
+        self.cpu_history.update(history)
+        return usage
+
+    @cached_property
+    def cpu_usage_by_group(self):
+        """
+        The CPU utilization of Apache workers per group (a dictionary).
+
+        The keys of this dictionary are the group names reported by
+        :attr:`KillableWorker.group_name` and the values are
+        :class:`~proc.apache.StatsList` objects with the most recent CPU
+        utilization of each process in the group (processes without a
+        utilization measurement yet are excluded, see :attr:`cpu_usage`).
+        """
+        groups = collections.defaultdict(StatsList)
+        seen = set()
+        for worker in self.killable_workers:
+            if worker.pid not in seen:
+                seen.add(worker.pid)
+                if worker.cpu_percent is not None:
+                    groups[worker.group_name].append(worker.cpu_percent)
+        return groups
+
+    @mutable_property
+    def cycle_time_budget(self):
+        """
+        The maximum expected duration of a monitoring cycle (a number of seconds).
+
+        When a cycle takes longer :func:`check_cycle_time()` logs a warning
+        with the time spent in each of the :data:`TIMED_PHASES`, so that it's
+        clear whether the time went into the network, parsing, ``/proc`` or
+        killing workers. The configuration file option is called
+        ``cycle-time-budget`` (its value will be parsed by
+        :func:`~humanfriendly.parse_timespan()`). The default value of 0
+        disables the warning.
+        """
+        value = self.config.get('cycle-time-budget')
+        return parse_timespan(value) if value else 0
+
+    @lazy_property
+    def deferred_kills(self):
+        """
+        Kill candidates that were deferred because of the kill budget (a dictionary).
+
+        The keys of this dictionary are strings that identify a worker process
+        (its process ID and start time) and the values are the times at which
+        the workers were first deferred. Deferred workers are killed before
+        other candidates by the next call to :func:`kill_workers()`, so that
+        workers can't be starved by newer candidates. This state is kept in
+        memory (for long running processes) and in :attr:`state_file` (for
+        invocations from cron).
+        """
+        return dict(self.state.get('deferred_kills', {}))
+
+    @lazy_property
+    def discovery_cache(self):
+        """
+        A :class:`~apache_manager.cache.DiscoveryCache` object for :attr:`cache_file` (or :data:`None`).
+
+        The cache holds :attr:`config_sections` and :attr:`listen_addresses`,
+        so that runs from cron don't need to load the configuration files and
+        parse the Apache configuration. Cached values are validated using the
+        inode numbers, sizes and modification times of the files they were
+        derived from.
+        """
+        return DiscoveryCache(filename=self.cache_file) if self.cache_file else None
+
+    @mutable_property
+    def drain_timeout(self):
+        """
+        The time active workers are given to finish their current request (a number of seconds).
+
+        When this is nonzero :func:`kill_workers()` doesn't kill active workers
+        immediately but asks them to exit once their current request is
+        finished, so that in-flight requests aren't aborted. Workers that are
+        still running after this timeout are killed (see
+        :func:`stop_workers()`).
+
+        The configuration file option is called ``drain-timeout`` (its value
+        will be parsed by :func:`~humanfriendly.parse_timespan()`). The
+        default value of 0 disables draining.
+        """
+        value = self.config.get('drain-timeout')
+        return parse_timespan(value) if value else 0
+
+    @cached_property
+    def foreign_pid_namespace(self):
+        """
+        :data:`True` if :attr:`proc_root` shows another PID namespace, :data:`False` otherwise.
+
+        The process IDs in the ``proc`` file system of another PID namespace
+        (e.g. of a container observed from the host) don't refer to the same
+        processes in the PID namespace of the Apache manager, so they can't be
+        used to send signals (see :func:`stop_workers()`). This is detected by
+        checking whether ``self`` in :attr:`proc_root` refers to the current
+        process.
+        """
+        if self.proc_root == PROC_ROOT:
+            return False
+        try:
+            return os.readlink(os.path.join(self.proc_root, 'self')) != str(os.getpid())
+        except EnvironmentError:
+            return True
+
     @cached_property
     def foreign_workers(self):
         """A list of :class:`NonNativeWorker` objects."""
         native_process_ids = set(w.pid for w in self.workers)
         return [
-            NonNativeWorker(process=process)
-            for process in find_apache_workers()
+            NonNativeWorker(process=process, manager=self)
+            for process in self.apache_workers
             if process.pid not in native_process_ids
         ]
 
+    @lazy_property
+    def group_thresholds(self):
+        """
+        Thresholds that are specific to a group of workers (a dictionary).
+
+        The keys of this dictionary are the names of worker groups (see
+        :attr:`KillableWorker.group_name`) and the values are dictionaries
+        that map configuration options to their parsed values. These are
+        loaded from configuration sections named ``[apache-manager:NAME]``
+        where ``NAME`` is the name of a WSGI process group or
+        :data:`NATIVE_WORKERS_LABEL`, for example:
+
+        .. code-block:: ini
+
+           [apache-manager]
+           max-memory-idle = 100M
+
+           [apache-manager:reports]
+           max-memory-idle = 1.5G
+           worker-timeout = 10m
+
+        The options ``max-cpu-percent``, ``max-memory-active``,
+        ``max-memory-idle``, ``recycle-horizon`` and ``worker-timeout`` are
+        supported in these sections (see :func:`resolve_thresholds()`), as
+        well as ``memory-budget`` (see :attr:`memory_budgets`).
+        """
+        thresholds = {}
+        prefix = '%s:' % CONFIG_NAME
+        for section, options in sorted(self.config_sections.items()):
+            if section.startswith(prefix):
+                group = section[len(prefix):]
+                thresholds[group] = dict(
+                    (option, parse_threshold(option, options[option]))
+                    for option, keyword, attribute in THRESHOLD_OPTIONS
+                    if options.get(option)
+                )
+                if options.get('memory-budget'):
+                    thresholds[group]['memory-budget'] = parse_size(options['memory-budget'], binary=True)
+        return thresholds
+
+    @mutable_property
+    def growth_sample_count(self):
+        """
+        The number of memory usage samples used to estimate growth rates (an integer).
+
+        The configuration file option is called ``growth-sample-count``, the
+        default is :data:`GROWTH_SAMPLE_COUNT`. See :attr:`memory_growth`.
+        """
+        value = self.config.get('growth-sample-count')
+        return int(value) if value else GROWTH_SAMPLE_COUNT
+
     @mutable_property
     def hanging_worker_threshold(self):
         """
@@ -216,6 +739,38 @@ class ApacheManager(PropertyManager):
         """
         return [ws for ws in self.workers if ws.is_active and ws.ss >= self.hanging_worker_threshold]
 
+    @lazy_property
+    def history(self):
+        """
+        A :class:`~apache_manager.history.MetricHistory` object (or :data:`None`).
+
+        This is :data:`None` when :attr:`history_directory` isn't set.
+        """
+        if self.history_directory:
+            return MetricHistory(directory=self.history_directory, retention=self.history_retention)
+
+    @mutable_property
+    def history_directory(self):
+        """
+        The directory where :func:`save_history()` stores metrics (a string or :data:`None`).
+
+        The configuration file option is called ``history-directory``. The
+        default value :data:`None` disables the metric history.
+        """
+        return self.config.get('history-directory')
+
+    @mutable_property
+    def history_retention(self):
+        """
+        The number of seconds that the metric history is retained (a number).
+
+        The configuration file option is called ``history-retention`` (its
+        value will be parsed by :func:`~humanfriendly.parse_timespan()`). The
+        default value is :data:`~apache_manager.history.HISTORY_RETENTION`.
+        """
+        value = self.config.get('history-retention')
+        return parse_timespan(value) if value else HISTORY_RETENTION
+
     @cached_property
     def html_status(self):
         """
@@ -240,31 +795,87 @@ class ApacheManager(PropertyManager):
         >>> manager = ApacheManager()
         >>> manager.html_status_url
         'http://127.0.0.1:80/server-status'
+
+        When there are several candidate URLs (see :attr:`status_urls`) they
+        are probed concurrently and the URL that returns a valid status page
+        the fastest is used (see
+        :func:`~apache_manager.discovery.probe_status_urls()`). The selected
+        URL is kept in :attr:`discovery_cache` until the Apache configuration
+        changes or fetching the status page fails. When none of the
+        candidates respond the first candidate is used. When
+        :attr:`status_url` is set it's used without any discovery.
         """
-        status_url = "%s/server-status" % self.listen_addresses[0].url
+        if self.status_url:
+            return self.status_url
+        candidates = self.status_urls
+        status_url = candidates[0]
+        if len(candidates) > 1:
+            cached_url = self.discovery_cache.get('status-url', key=candidates) if self.discovery_cache else None
+            if cached_url:
+                status_url = cached_url
+            else:
+                probed_url = probe_status_urls(candidates, timeout=self.probe_timeout)
+                if probed_url:
+                    status_url = probed_url
+                    if self.discovery_cache:
+                        sources = self.parsed_config['sources']
+                        self.discovery_cache.set('status-url', status_url, sources, key=candidates)
         logger.debug("Discovered Apache HTML status page URL: %s", status_url)
         return status_url
 
+    @lazy_property
+    def kill_history(self):
+        """
+        The times at which workers were killed (a dictionary).
+
+        The keys of this dictionary are the names of worker groups (see
+        :attr:`KillableWorker.group_name`) and the values are lists of
+        timestamps that fall within :attr:`kill_window`. Like
+        :attr:`deferred_kills` this state is kept in memory and in
+        :attr:`state_file`.
+        """
+        return dict((group, list(times)) for group, times in self.state.get('kill_history', {}).items())
+
+    @mutable_property
+    def kill_window(self):
+        """
+        The time window of :attr:`max_kills_per_window` (a number of seconds).
+
+        The configuration file option is called ``kill-window`` (its value will
+        be parsed by :func:`~humanfriendly.parse_timespan()`). Defaults to
+        :data:`KILL_WINDOW`.
+        """
+        value = self.config.get('kill-window')
+        return parse_timespan(value) if value else KILL_WINDOW
+
     @cached_property
+    @timed_phase('proc-scan')
     def killable_workers(self):
         """
         A list of :class:`KillableWorker` objects.
 
-        This combines :attr:`workers` and :attr:`foreign_workers`.
+        This combines :attr:`workers` and :attr:`foreign_workers`. The memory
+        usage of each worker is read while the list is being constructed so
+        that the ``proc-scan`` phase is timed once per cycle instead of once
+        per process (see :func:`get_memory_usage()`).
         """
         all_workers = list(self.workers)
         all_workers.extend(self.foreign_workers)
+        for worker in all_workers:
+            worker.memory_usage
         return sorted(all_workers, key=lambda p: p.pid)
 
     @cached_property
+    @timed_phase('discovery')
     def listen_addresses(self):
         """
         The network address(es) where Apache is listening (a list of :class:`NetworkAddress` objects).
 
         :raises: :exc:`.AddressDiscoveryError` when discovery fails (e.g. because
-                 ``/etc/apache2/ports.conf`` is missing or can't be parsed).
+                 the Apache configuration is missing or doesn't contain any
+                 ``Listen`` directives).
 
-        Here's an example:
+        The addresses are taken from :attr:`parsed_config`. Here's an example:
 
         >>> from apache_manager import ApacheManager
         >>> manager = ApacheManager()
@@ -274,57 +885,17 @@ class ApacheManager(PropertyManager):
                         port=81,
                         url='http://127.0.0.1:81')]
         """
-        logger.debug("Discovering where Apache is listening by parsing %s ..", self.ports_config)
-        # Make sure the configuration file exists.
-        if not os.path.isfile(self.ports_config):
-            raise AddressDiscoveryError(compact("""
-                Failed to discover any addresses or ports that Apache is
-                listening on! The configuration file {filename} is missing. Are
-                you sure the Apache web server is properly installed? If so
-                you'll have to specify the configuration's location.
-            """, filename=self.ports_config))
-        # Parse the configuration file.
-        matched_addresses = []
-        pattern = re.compile(r'^(.+):(\d+)$')
-        with open(self.ports_config) as handle:
-            for lnum, line in enumerate(handle, start=1):
-                tokens = line.split()
-                # We are looking for `Listen' directives.
-                if len(tokens) >= 2 and tokens[0] == 'Listen':
-                    parsed_value = None
-                    # Check for a port number without an IP address.
-                    if tokens[1].isdigit():
-                        parsed_value = NetworkAddress(port=int(tokens[1]))
-                    else:
-                        # Check for an IP address with a port number.
-                        match = pattern.match(tokens[1])
-                        if match:
-                            address = match.group(1)
-                            port = int(match.group(2))
-                            if address == '0.0.0.0':
-                                address = '127.0.0.1'
-                            parsed_value = NetworkAddress(address=address, port=port)
-                    # Check if we have a match.
-                    if parsed_value is not None:
-                        # Override the protocol if necessary.
-                        if len(tokens) >= 3:
-                            parsed_value.protocol = tokens[2]
-                        logger.debug("Parsed listen directive on line %i: %s", lnum, parsed_value)
-                        matched_addresses.append(parsed_value)
-                    else:
-                        logger.warning("Failed to parse listen directive on line %i: %s", lnum, line)
-        # Sanity check the results.
-        if not matched_addresses:
+        addresses = [NetworkAddress(**a) for a in self.parsed_config['listen_addresses']]
+        if not addresses:
             raise AddressDiscoveryError(compact("""
                 Failed to discover any addresses or ports that Apache is
                 listening on! Maybe I'm parsing the wrong configuration file?
                 ({filename})
-            """, filename=self.ports_config))
-        # Log and return sorted port numbers.
+            """, filename=self.parsed_config['filename']))
         logger.debug("Discovered %s that Apache is listening on: %s",
-                     pluralize(len(matched_addresses), "address", "addresses"),
-                     concatenate(map(str, matched_addresses)))
-        return matched_addresses
+                     pluralize(len(addresses), "address", "addresses"),
+                     concatenate(map(str, addresses)))
+        return addresses
 
     @property
     def manager_metrics(self):
@@ -338,32 +909,141 @@ class ApacheManager(PropertyManager):
         >>> manager = ApacheManager()
         >>> pprint(manager.manager_metrics)
         {'foreign_worker_count': 0,
+         'memory_reclaimed': 0,
          'native_worker_count': 50,
+         'phase_time_decide': 0.0,
+         'phase_time_discovery': 0.0004,
+         'phase_time_fetch': 0.0061,
+         'phase_time_kill': 0.0,
+         'phase_time_parse': 0.0153,
+         'phase_time_proc_scan': 0.0208,
          'status_response': True,
+         'workers_deferred': 0,
+         'workers_drained': 0,
+         'workers_exit_confirmed': 0,
+         'workers_exit_failed': 0,
          'workers_hanging': 0,
          'workers_killed_active': 0,
-         'workers_killed_idle': 0}
+         'workers_killed_idle': 0,
+         'workers_recycled': 0}
 
         Notes about these metrics:
 
+        - The ``phase_time_*`` keys give the number of seconds spent in each
+          of the :data:`TIMED_PHASES` during the current cycle (see
+          :attr:`phase_timings`), except for ``phase_time_save`` which gives
+          the time spent saving the results of the previous cycle (because
+          the data file can't contain the time it takes to write itself).
+          When there is no previous cycle (for example when running from
+          cron) the ``phase_time_save`` key is omitted (see
+          :attr:`previous_save_time`).
         - The ``status_response`` key is :data:`None` by default. Once an
           Apache status page has been fetched it becomes :data:`True` if the
           status page was fetched successfully or :data:`False` if fetching of
           the status page failed (see :func:`fetch_status_page()`,
           :attr:`html_status` and :attr:`text_status`).
+        - The ``workers_deferred`` key gives the number of workers that exceed
+          a threshold but weren't killed by :func:`kill_workers()` because of
+          the kill budget (see :attr:`max_kills_per_cycle` and
+          :attr:`max_kills_per_window`).
+        - The ``workers_drained`` key gives the number of active workers that
+          exited gracefully after being drained (see :attr:`drain_timeout`).
+        - The ``workers_exit_confirmed`` and ``workers_exit_failed`` keys give
+          the number of killed workers whose exit was confirmed and the number
+          of workers that couldn't be killed, while the ``memory_reclaimed``
+          key gives the memory returned by the killed workers (their unique
+          set size, see :attr:`memory_reclaimed`).
         - The ``workers_hanging`` key gives the number of hanging workers
           (based on the length of :attr:`hanging_workers`).
         - The ``workers_killed_active`` and ``workers_killed_idle`` keys give
           the number of Apache workers killed by :func:`kill_workers()`.
+        - The ``workers_recycled`` key gives the number of idle workers that
+          were proactively recycled because of their memory growth (these
+          are included in ``workers_killed_idle``).
         """
-        return dict(
+        metrics = dict(
             foreign_worker_count=len(self.foreign_workers),
+            memory_reclaimed=self.memory_reclaimed,
             native_worker_count=len(self.workers),
             status_response=self.status_response,
+            workers_deferred=self.num_deferred,
+            workers_drained=self.num_drained,
+            workers_exit_confirmed=self.num_confirmed,
+            workers_exit_failed=self.num_failed,
             workers_hanging=len(self.hanging_workers),
             workers_killed_active=self.num_killed_active,
             workers_killed_idle=self.num_killed_idle,
+            workers_recycled=self.num_recycled,
         )
+        for phase in TIMED_PHASES:
+            if phase == 'save':
+                value = self.previous_save_time
+                if value is None:
+                    continue
+            else:
+                value = self.phase_timings.get(phase, 0)
+            metrics['phase_time_%s' % phase.replace('-', '_')] = round(value, 4)
+        return metrics
+
+    @cached_property
+    def master_pid(self):
+        """
+        The process ID of the Apache master process (an integer or :data:`None`).
+
+        This is the parent process of :attr:`apache_workers`.
+        """
+        parents = collections.Counter(p.ppid for p in self.apache_workers)
+        if parents:
+            return parents.most_common(1)[0][0]
+
+    @mutable_property
+    def max_cpu_percent(self):
+        """
+        CPU utilization limit for Apache worker processes (a percentage).
+
+        The value of this property defines the maximum CPU utilization (where
+        100% equals one CPU core) that Apache worker processes are allowed to
+        sustain for :attr:`cpu_sample_count` successive samples before
+        :func:`kill_workers()` terminates them. This applies to native as well
+        as non-native workers (e.g. WSGI daemon processes that are stuck in a
+        loop). Because CPU utilization is computed from successive samples
+        this requires an :class:`ApacheManager` object that is refreshed
+        periodically (see :attr:`cpu_usage`).
+
+        The configuration file option is called ``max-cpu-percent``. The
+        default value of 0 disables killing of workers based on CPU usage.
+        """
+        value = self.config.get('max-cpu-percent')
+        return parse_threshold('max-cpu-percent', value) if value else 0
+
+    @mutable_property
+    def max_kills_per_cycle(self):
+        """
+        The maximum number of workers killed per group by a single :func:`kill_workers()` call (an integer).
+
+        When a deploy causes all workers of a WSGI process group to exceed
+        their threshold at the same time, killing all of them at once means
+        that all of the respawned workers start with cold caches at the same
+        time. Limiting the number of kills per cycle staggers the recycling of
+        workers over multiple cycles (see :attr:`deferred_kills`).
+
+        The configuration file option is called ``max-kills-per-cycle``. The
+        default value of 0 disables this limit.
+        """
+        value = self.config.get('max-kills-per-cycle')
+        return int(value) if value else 0
+
+    @mutable_property
+    def max_kills_per_window(self):
+        """
+        The maximum number of workers killed per group within :attr:`kill_window` (an integer).
+
+        This limit is enforced using :attr:`kill_history`. The configuration
+        file option is called ``max-kills-per-window``. The default value of 0
+        disables this limit.
+        """
+        value = self.config.get('max-kills-per-window')
+        return int(value) if value else 0
 
     @mutable_property
     def max_memory_active(self):
@@ -379,7 +1059,7 @@ class ApacheManager(PropertyManager):
         The default value of 0 disables killing of active workers.
         """
         value = self.config.get('max-memory-active')
-        return parse_size(value, binary=True) if value else 0
+        return parse_threshold('max-memory-active', value) if value else 0
 
     @mutable_property
     def max_memory_idle(self):
@@ -395,14 +1075,172 @@ class ApacheManager(PropertyManager):
         value of 0 disables killing of idle workers.
         """
         value = self.config.get('max-memory-idle')
-        return parse_size(value, binary=True) if value else 0
+        return parse_threshold('max-memory-idle', value) if value else 0
+
+    @mutable_property
+    def memory_budgets(self):
+        """
+        The total memory budget of worker groups (a dictionary).
+
+        The keys of this dictionary are the names of worker groups (see
+        :attr:`KillableWorker.group_name`, this includes
+        :data:`NATIVE_WORKERS_LABEL`) and the values are the maximum number of
+        bytes that the workers in each group are allowed to use combined.
+        When a group exceeds its budget :func:`kill_workers()` kills the
+        minimum number of workers needed to bring the group below its budget
+        (see :func:`find_budget_candidates()`).
+
+        The configuration file option is called ``memory-budgets`` (its value
+        will be parsed by :func:`parse_memory_budgets()`). The budget of a
+        single group can also be defined using the ``memory-budget`` option in
+        the configuration section of the group (see :attr:`group_thresholds`).
+        By default no memory budgets are enforced.
+        """
+        value = self.config.get('memory-budgets')
+        budgets = parse_memory_budgets(value) if value else {}
+        for group, overrides in self.group_thresholds.items():
+            if 'memory-budget' in overrides:
+                budgets[group] = overrides['memory-budget']
+        return budgets
+
+    @cached_property
+    def memory_growth(self):
+        """
+        The memory growth rate of Apache worker processes (a dictionary).
+
+        The keys of this dictionary are process IDs and the values are the
+        estimated growth rate in bytes per second (a float) or :data:`None`
+        when fewer than three samples are available.
+
+        The memory usage of every process in :attr:`killable_workers` is
+        sampled (according to :attr:`memory_metric`) and added to
+        :attr:`memory_history`, after which the growth rate is estimated by
+        fitting a line through the last :attr:`growth_sample_count` samples
+        using least squares. Because the value of this property is cached a
+        new sample is taken after every :func:`refresh()`.
+        """
+        timestamp = self.sample_time
+        history = {}
+        growth = {}
+        for worker in self.killable_workers:
+            if worker.process and worker.pid not in growth and worker.memory_usage is not None:
+                key = (worker.pid, self.get_start_ticks(worker.process))
+                samples = self.memory_history.get(key, [])
+                samples.append((timestamp, worker.memory_usage))
+                samples = samples[-self.growth_sample_count:]
+                history[key] = samples
+                growth[worker.pid] = linear_slope(samples) if len(samples) >= 3 else None
+        # Forget about processes that have disappeared.
+        self.memory_history.clear()
+        self.memory_history.update(history)
+        return growth
+
+    @cached_property
+    def memory_growth_by_group(self):
+        """
+        The memory growth rate of Apache workers per group (a dictionary).
+
+        The keys of this dictionary are the group names reported by
+        :attr:`KillableWorker.group_name` and the values are
+        :class:`~proc.apache.StatsList` objects with the growth rate of each
+        process in the group (in bytes per second, processes without an
+        estimated growth rate are excluded, see :attr:`memory_growth`).
+        """
+        groups = collections.defaultdict(StatsList)
+        seen = set()
+        for worker in self.killable_workers:
+            if worker.pid not in seen:
+                seen.add(worker.pid)
+                if worker.memory_growth is not None:
+                    groups[worker.group_name].append(worker.memory_growth)
+        return groups
+
+    @lazy_property
+    def memory_history(self):
+        """
+        Recent memory usage samples of Apache worker processes (a dictionary).
+
+        The keys of this dictionary are tuples with a process ID and the start
+        time of the process (see :func:`get_start_ticks()`) and the values are
+        lists of tuples with a timestamp and the memory usage of the process
+        in bytes. The samples are added by :attr:`memory_growth` and survive
+        :func:`refresh()`. Like :attr:`cpu_history` the samples are also kept
+        in :attr:`state_file`.
+        """
+        return load_samples(self.state.get('memory_history', []))
+
+    @cached_property
+    def memory_info(self):
+        """
+        Memory usage details of Apache worker processes (a dictionary).
+
+        The keys of this dictionary are process IDs and the values are
+        dictionaries as returned by :func:`read_memory_info()`. The dictionary
+        is populated by :func:`get_memory_usage()` as processes are evaluated,
+        so that each process's memory usage details are read at most once per
+        :func:`refresh()`.
+        """
+        return {}
+
+    @mutable_property
+    def memory_metric(self):
+        """
+        How the memory usage of workers is measured (one of the strings in :data:`MEMORY_METRICS`).
+
+        This determines the values of :attr:`KillableWorker.memory_usage`,
+        :attr:`memory_usage` and :attr:`wsgi_process_groups` and therefore
+        affects the memory thresholds applied by :func:`kill_workers()` as
+        well as the metrics written by :func:`save_metrics()`.
+
+        The default is ``rss`` which is available without reading any files
+        besides ``/proc/[pid]/stat``, however the resident set size includes
+        shared (copy-on-write) pages and so overstates the real cost of
+        prefork workers. The other metrics are read from
+        ``/proc/[pid]/smaps_rollup`` (falling back to ``/proc/[pid]/smaps``
+        on kernels older than Linux 4.14), see :func:`read_memory_info()`.
+
+        The configuration file option is called ``memory-metric``.
+
+        :raises: :exc:`~exceptions.ValueError` when the configured value isn't
+                 supported.
+        """
+        value = self.config.get('memory-metric', 'rss').lower()
+        if value not in MEMORY_METRICS:
+            msg = "Unsupported memory metric %r! (supported values are %s)"
+            raise ValueError(msg % (value, concatenate(map(repr, MEMORY_METRICS))))
+        return value
+
+    @cached_property
+    def memory_pressure(self):
+        """
+        The memory pressure stall information of the host (a dictionary or :data:`None`).
+
+        This is the result of :func:`read_pressure()` for
+        ``/proc/pressure/memory`` (below :attr:`proc_root`), which is
+        :data:`None` on systems without pressure stall information (Linux <
+        4.20 or ``CONFIG_PSI`` disabled).
+        """
+        return read_pressure(os.path.join(self.proc_root, 'pressure', 'memory'))
+
+    @writable_property
+    def memory_reclaimed(self):
+        """
+        The memory returned by workers stopped by :func:`stop_workers()` (number of bytes).
+
+        This is the sum of the unique set size (see
+        :func:`get_unique_memory()`) of the workers whose exit was confirmed,
+        measured right before the workers were signaled. Pages shared with
+        other processes aren't included because they aren't freed when a
+        worker exits, regardless of :attr:`memory_metric`.
+        """
+        return 0
 
     @cached_property
     def memory_usage(self):
         """
         The memory usage of the Apache workers (a :class:`~proc.apache.StatsList` object).
 
-        Based on :func:`proc.apache.find_apache_memory_usage()`. See also
+        Based on :attr:`combined_memory_usage`. See also
         :attr:`wsgi_process_groups`.
 
         Here's an example:
@@ -421,6 +1259,38 @@ class ApacheManager(PropertyManager):
         """
         return self.combined_memory_usage[0]
 
+    @cached_property
+    def memory_used_percent(self):
+        """
+        The percentage of memory in use on the host (a float or :data:`None`).
+
+        This is based on the ``MemTotal`` and ``MemAvailable`` fields of
+        :attr:`system_memory` (the latter includes reclaimable caches).
+        """
+        info = self.system_memory
+        if info and info.get('MemTotal') and 'MemAvailable' in info:
+            return 100.0 - info['MemAvailable'] * 100.0 / info['MemTotal']
+
+    @writable_property
+    def num_confirmed(self):
+        """The number of workers stopped by :func:`stop_workers()` whose exit was confirmed (an integer)."""
+        return 0
+
+    @writable_property
+    def num_deferred(self):
+        """The number of kill candidates deferred by the last :func:`kill_workers()` call (an integer)."""
+        return 0
+
+    @writable_property
+    def num_drained(self):
+        """The number of active workers that exited gracefully after being drained (an integer)."""
+        return 0
+
+    @writable_property
+    def num_failed(self):
+        """The number of workers that :func:`stop_workers()` failed to kill (an integer)."""
+        return 0
+
     @writable_property
     def num_killed_active(self):
         """The number of active workers killed by :func:`kill_workers()` (an integer)."""
@@ -431,17 +1301,316 @@ class ApacheManager(PropertyManager):
         """The number of idle workers killed by :func:`kill_workers()` (an integer)."""
         return 0
 
+    @writable_property
+    def num_recycled(self):
+        """The number of idle workers proactively recycled by :func:`kill_workers()` (an integer)."""
+        return 0
+
+    @mutable_property
+    def outlier_factor(self):
+        """
+        Sensitivity of the adaptive (outlier based) thresholds (a number).
+
+        When this is nonzero :func:`kill_workers()` kills workers whose memory
+        usage (or request duration) exceeds the median of their group by more
+        than this many times the median absolute deviation of the group (see
+        :func:`get_outlier_thresholds()`). Unlike static thresholds this keeps
+        recycling proportional to the normal footprint of each group, without
+        the need for per-group configuration. A value of 5 is a reasonable
+        starting point. Active workers are only killed for unusual memory
+        usage when they can be drained (see :attr:`drain_timeout`), so that
+        in-flight requests aren't aborted.
+
+        The configuration file option is called ``outlier-factor``. The
+        default value of 0 disables adaptive thresholds.
+        """
+        value = self.config.get('outlier-factor')
+        return float(value) if value else 0
+
+    @mutable_property
+    def outlier_memory_ceiling(self):
+        """
+        The upper bound of adaptive memory thresholds (number of bytes).
+
+        This guards against a group whose normal footprint grows without
+        bounds. The configuration file option is called
+        ``outlier-memory-ceiling`` (its value will be parsed by
+        :func:`~humanfriendly.parse_size()`). The default value of 0 disables
+        the upper bound.
+        """
+        value = self.config.get('outlier-memory-ceiling')
+        return parse_size(value, binary=True) if value else 0
+
+    @mutable_property
+    def outlier_memory_floor(self):
+        """
+        The lower bound of adaptive memory thresholds (number of bytes).
+
+        This avoids killing workers that are unusual but small. The
+        configuration file option is called ``outlier-memory-floor`` (its
+        value will be parsed by :func:`~humanfriendly.parse_size()`). Defaults
+        to :data:`OUTLIER_MEMORY_FLOOR`, the value 0 disables the lower bound.
+        """
+        value = self.config.get('outlier-memory-floor')
+        return parse_size(value, binary=True) if value else OUTLIER_MEMORY_FLOOR
+
+    @mutable_property
+    def outlier_min_workers(self):
+        """
+        The minimum number of workers in a group for adaptive thresholds to apply (an integer).
+
+        The configuration file option is called ``outlier-min-workers``.
+        Defaults to :data:`OUTLIER_MIN_WORKERS`.
+        """
+        value = self.config.get('outlier-min-workers')
+        return int(value) if value else OUTLIER_MIN_WORKERS
+
+    @mutable_property
+    def outlier_time_ceiling(self):
+        """
+        The upper bound of adaptive request duration thresholds (a number of seconds).
+
+        The configuration file option is called ``outlier-time-ceiling`` (its
+        value will be parsed by :func:`~humanfriendly.parse_timespan()`). The
+        default value of 0 disables the upper bound.
+        """
+        value = self.config.get('outlier-time-ceiling')
+        return parse_timespan(value) if value else 0
+
+    @mutable_property
+    def outlier_time_floor(self):
+        """
+        The lower bound of adaptive request duration thresholds (a number of seconds).
+
+        The configuration file option is called ``outlier-time-floor`` (its
+        value will be parsed by :func:`~humanfriendly.parse_timespan()`).
+        Defaults to :data:`OUTLIER_TIME_FLOOR` because most requests finish
+        within a second, which makes the median absolute deviation of request
+        durations very small.
+        """
+        value = self.config.get('outlier-time-floor')
+        return parse_timespan(value) if value else OUTLIER_TIME_FLOOR
+
+    @cached_property
+    @timed_phase('discovery')
+    def parsed_config(self):
+        """
+        The results of :func:`parse_apache_config()` (a dictionary).
+
+        The dictionary contains the pathname of the parsed configuration file
+        (``filename``), the ``listen_addresses`` (a list of dictionaries, see
+        :func:`~apache_manager.discovery.parse_listen_directive()`), the
+        ``status_paths`` (a list of strings) and the ``sources`` that were
+        read (see :attr:`~apache_manager.discovery.ApacheConfig.sources`).
+        The results are kept in
+        :attr:`discovery_cache` until one of the configuration files (or a
+        directory that was searched for configuration files) changes.
+        """
+        key = [self.ports_config, self.apache_config]
+        if self.discovery_cache:
+            value = self.discovery_cache.get('apache-config', key=key)
+            if value is not None:
+                return value
+        config = self.parse_apache_config()
+        value = dict(
+            filename=config.filename,
+            listen_addresses=config.listen_addresses,
+            sources=config.sources,
+            status_paths=config.status_paths,
+        )
+        if self.discovery_cache:
+            self.discovery_cache.set('apache-config', value, config.sources, key=key)
+        return value
+
+    @lazy_property
+    def phase_stack(self):
+        """The time spent in nested phases by the phases in progress (a list of lists, see :func:`time_phase()`)."""
+        return []
+
+    @cached_property
+    def phase_timings(self):
+        """
+        The number of seconds spent in each phase of the current cycle (a dictionary).
+
+        The keys of this dictionary are strings in :data:`TIMED_PHASES` and
+        the values are floats. Phases that haven't run yet are missing. Time
+        spent in nested phases (e.g. fetching the status page while parsing
+        it) is only counted for the innermost phase, so the values can be
+        added up. Because this is a cached property :func:`refresh()` starts
+        a new cycle.
+        """
+        return {}
+
     @mutable_property
     def ports_config(self):
         """
         The absolute pathname of the ``ports.conf`` configuration file (a string).
 
         The configuration file is expected to define the port(s) that Apache
-        listens on. Defaults to :data:`PORTS_CONF`.
+        listens on. When this is set only this file (and the files it
+        includes) is parsed instead of :attr:`apache_config`. Defaults to
+        :data:`None`, in which case :func:`parse_apache_config()` parses
+        :attr:`apache_config` or (when that isn't available either)
+        :data:`PORTS_CONF`.
+        """
+
+    @mutable_property
+    def pressure_curve(self):
+        """
+        How memory thresholds are scaled according to the memory usage of the host (a list of tuples).
+
+        Each tuple contains two numbers: A percentage of memory in use (see
+        :attr:`memory_used_percent`) and the factor by which
+        :attr:`max_memory_active` and :attr:`max_memory_idle` are multiplied
+        at that percentage. Between points the factor is interpolated linearly,
+        outside of the curve the factor of the nearest point is used. For
+        example the curve ``50:1.5, 80:1, 95:0.5`` relaxes the memory
+        thresholds by 50% when the host has plenty of memory available and
+        makes them twice as strict when the host is nearly out of memory. See
+        also :attr:`threshold_scale`.
+
+        The configuration file option is called ``pressure-curve`` (its value
+        will be parsed by :func:`parse_pressure_curve()`). By default the
+        memory thresholds are not scaled.
         """
-        return PORTS_CONF
+        value = self.config.get('pressure-curve')
+        return parse_pressure_curve(value) if value else []
+
+    @mutable_property
+    def pressure_stall_threshold(self):
+        """
+        The memory stall percentage considered high memory pressure (a number).
+
+        When the ``some avg10`` value of :attr:`memory_pressure` (the
+        percentage of time in the last 10 seconds that at least one task was
+        stalled waiting for memory) reaches this value the host is considered
+        to be under high memory pressure (see :attr:`under_pressure`).
+
+        The configuration file option is called ``pressure-stall-threshold``.
+        Defaults to :data:`PRESSURE_STALL_THRESHOLD`.
+        """
+        value = self.config.get('pressure-stall-threshold')
+        return float(value.rstrip('%')) if value else PRESSURE_STALL_THRESHOLD
+
+    @writable_property
+    def previous_save_time(self):
+        """
+        The number of seconds spent in the ``save`` phase of the previous cycle (a float or :data:`None`).
+
+        This is :data:`None` until :func:`refresh()` is called after results
+        have been saved, so it's always :data:`None` when running from cron.
+        """
+        return None
+
+    @mutable_property
+    def probe_timeout(self):
+        """
+        The maximum time to wait for candidate status page URLs (a number of seconds).
+
+        Refer to :attr:`html_status_url` for details. The configuration file
+        option is called ``probe-timeout`` (its value will be parsed by
+        :func:`~humanfriendly.parse_timespan()`). Defaults to
+        :data:`~apache_manager.discovery.PROBE_TIMEOUT`.
+        """
+        value = self.config.get('probe-timeout')
+        return parse_timespan(value) if value else PROBE_TIMEOUT
+
+    @mutable_property
+    def proc_root(self):
+        """
+        The mount point of the ``proc`` file system (a string).
+
+        All process information (the worker scan, the memory usage details of
+        workers, ``meminfo``, memory pressure and control group membership) is
+        read below this directory. Changing it makes it possible to observe
+        Apache in a container from the host (using a bind mounted ``proc`` file
+        system of the container's PID namespace, see
+        :attr:`foreign_pid_namespace`) and to benchmark the Apache manager
+        against synthetic process trees.
+
+        The configuration file option is called ``proc-root``. Defaults to
+        :data:`~apache_manager.processes.PROC_ROOT`.
+        """
+        return self.config.get('proc-root', PROC_ROOT)
+
+    @mutable_property
+    def profile_every(self):
+        """
+        Profile every Nth cycle (an integer).
+
+        The configuration file option is called ``profile-every``. The
+        default is 1 (every cycle is profiled when :attr:`profile_file` is
+        set). See :attr:`~apache_manager.profiling.CycleProfiler.every`.
+        """
+        return int(self.config.get('profile-every', 1))
+
+    @mutable_property
+    def profile_file(self):
+        """
+        The pathname of the file where profiles of cycles are saved (a string or :data:`None`).
+
+        When this is set :func:`profile_cycle()` profiles cycles (see
+        :attr:`profiler`). The configuration file option is called
+        ``profile-file``. By default profiling is disabled.
+        """
+        return self.config.get('profile-file')
+
+    @mutable_property
+    def profile_mode(self):
+        """
+        The profiler used by :func:`profile_cycle()` (one of the strings ``cprofile`` or ``sampling``).
+
+        The configuration file option is called ``profile-mode``. Defaults to
+        ``cprofile``. See :attr:`~apache_manager.profiling.CycleProfiler.mode`.
+        """
+        return self.config.get('profile-mode', 'cprofile').lower()
+
+    @lazy_property
+    def profiler(self):
+        """
+        A :class:`~apache_manager.profiling.CycleProfiler` object (or :data:`None`).
+
+        This is :data:`None` unless :attr:`profile_file` is set. When
+        :attr:`cycle_time_budget` is set only the profiles of cycles that
+        exceeded the budget are saved.
+        """
+        if self.profile_file:
+            return CycleProfiler(
+                every=self.profile_every,
+                filename=self.profile_file,
+                latency_budget=self.cycle_time_budget,
+                mode=self.profile_mode,
+            )
+
+    @mutable_property
+    def recycle_horizon(self):
+        """
+        How far ahead to look when recycling leaking workers (a number of seconds).
+
+        When this is nonzero :func:`kill_workers()` proactively recycles idle
+        workers whose memory usage is projected (based on
+        :attr:`memory_growth`) to exceed :attr:`max_memory_active` (or
+        :attr:`max_memory_idle` when no limit for active workers is set)
+        within this many seconds. This avoids killing leaking workers during
+        peak traffic, when they're likely to be busy handling a request.
+
+        Because growth rates are estimated from successive samples this
+        requires an :class:`ApacheManager` object that is refreshed
+        periodically. The configuration file option is called
+        ``recycle-horizon`` (its value will be parsed by
+        :func:`~humanfriendly.parse_timespan()`). The default value of 0
+        disables predictive recycling.
+        """
+        value = self.config.get('recycle-horizon')
+        return parse_threshold('recycle-horizon', value) if value else 0
 
     @cached_property
+    def sample_time(self):
+        """The time at which the current samples were taken (a number, see :attr:`cpu_usage`)."""
+        return time.time()
+
+    @cached_property
+    @timed_phase('parse')
     def server_metrics(self):
         """
         Global web server metrics parsed from the machine readable plain text status page.
@@ -485,6 +1654,7 @@ class ApacheManager(PropertyManager):
         )
 
     @cached_property
+    @timed_phase('parse')
     def slots(self):
         """
         The status of Apache workers (a list of :class:`WorkerStatus` objects).
@@ -508,20 +1678,49 @@ class ApacheManager(PropertyManager):
         # multiprocessing modules result in a status page with a different
         # number of tables and the table with worker details is not clearly
         # marked as such in the HTML output ...
-        for table in soup.findAll('table'):
+        for table in soup.find_all('table'):
             # Parse the table into a list of dictionaries, one for each row.
             matched_rows = list(parse_status_table(table))
             # Filter out rows that don't contain the required columns.
             validated_rows = [r for r in matched_rows if all(c in r for c in required_columns)]
             # If one or more rows remain we found the right table! :-)
             if validated_rows:
-                return [WorkerStatus(status_fields=f) for f in validated_rows]
+                return [WorkerStatus(status_fields=f, manager=self) for f in validated_rows]
         raise StatusPageError(compact("""
             Failed to parse Apache status page! No tables found containing all
             of the required column headings and at least one row of data that
             could be parsed.
         """))
 
+    @lazy_property
+    def state(self):
+        """
+        The state loaded from :attr:`state_file` (a dictionary).
+
+        When :attr:`state_file` isn't set, doesn't exist yet or can't be
+        parsed an empty dictionary is returned.
+        """
+        if self.state_file and os.path.isfile(self.state_file):
+            try:
+                with open(self.state_file) as handle:
+                    return json.load(handle)
+            except Exception as e:
+                logger.warning("Ignoring invalid state file %s! (%s)", self.state_file, e)
+        return {}
+
+    @mutable_property
+    def state_file(self):
+        """
+        The pathname of the file where state is kept between runs (a string or :data:`None`).
+
+        When the Apache manager is run periodically from cron each run starts
+        with a fresh :class:`ApacheManager` object, so state like
+        :attr:`deferred_kills` and :attr:`kill_history` needs to be stored on
+        disk (see :func:`save_state()`). The configuration file option is
+        called ``state-file``. By default no state is kept between runs.
+        """
+        return self.config.get('state-file')
+
     @writable_property
     def status_response(self):
         """
@@ -530,6 +1729,51 @@ class ApacheManager(PropertyManager):
         This will be :data:`None` as long as :attr:`fetch_status_page` hasn't been called.
         """
 
+    @mutable_property
+    def status_timeout(self):
+        """
+        The maximum time to wait for Apache's status page (a number of seconds).
+
+        This timeout applies to establishing the connection as well as to
+        every read of the response, so a stalled Apache (e.g. because all
+        worker slots are busy) makes :func:`fetch_status_page()` fail instead
+        of hanging the monitoring cycle. The configuration file option is
+        called ``status-timeout`` (its value will be parsed by
+        :func:`~humanfriendly.parse_timespan()`). Defaults to
+        :data:`STATUS_TIMEOUT`.
+        """
+        value = self.config.get('status-timeout')
+        return parse_timespan(value) if value else STATUS_TIMEOUT
+
+    @mutable_property
+    def status_url(self):
+        """
+        The URL of Apache's HTML status page (a string or :data:`None`).
+
+        When this is set it's used as :attr:`html_status_url` instead of
+        discovering the status page. Unlike :attr:`html_status_url` this
+        property isn't cleared by :func:`refresh()`. Defaults to :data:`None`.
+        """
+
+    @cached_property
+    def status_urls(self):
+        """
+        The candidate URLs of Apache's HTML status page (a list of strings).
+
+        This combines :attr:`listen_addresses` with the locations of the
+        status page found in the Apache configuration (see
+        :attr:`parsed_config`). When the configuration doesn't define the
+        location of the status page
+        :data:`~apache_manager.discovery.STATUS_PATH` is assumed.
+        """
+        paths = self.parsed_config['status_paths'] or [STATUS_PATH]
+        return ['%s%s' % (address.url, path) for address in self.listen_addresses for path in paths]
+
+    @cached_property
+    def system_memory(self):
+        """The result of :func:`read_meminfo()` for ``meminfo`` in :attr:`proc_root` (a dictionary or :data:`None`)."""
+        return read_meminfo(os.path.join(self.proc_root, 'meminfo'))
+
     @cached_property
     def text_status(self):
         """
@@ -575,6 +1819,37 @@ class ApacheManager(PropertyManager):
         logger.debug("Discovered Apache plain text status page URL: %s", status_url)
         return status_url
 
+    @cached_property
+    def threshold_scale(self):
+        """
+        The factor by which memory thresholds are currently scaled (a float).
+
+        This is based on :attr:`pressure_curve` and :attr:`memory_used_percent`.
+        When the host is :attr:`under_pressure` the smallest factor in the
+        curve is used, regardless of the percentage of memory in use. When no
+        curve is configured or the memory usage of the host is unknown the
+        factor is 1.
+        """
+        curve = self.pressure_curve
+        if not curve:
+            return 1.0
+        if self.under_pressure:
+            return min(scale for level, scale in curve)
+        level = self.memory_used_percent
+        if level is None:
+            return 1.0
+        return interpolate(curve, level)
+
+    @property
+    def under_pressure(self):
+        """
+        :data:`True` if the host is under high memory pressure, :data:`False` otherwise.
+
+        See :attr:`pressure_stall_threshold` for details.
+        """
+        pressure = self.memory_pressure
+        return bool(pressure and pressure['some']['avg10'] >= self.pressure_stall_threshold)
+
     @mutable_property
     def worker_timeout(self):
         """
@@ -589,7 +1864,7 @@ class ApacheManager(PropertyManager):
         value of 0 disables killing of hanging workers.
         """
         value = self.config.get('worker-timeout')
-        return parse_timespan(value) if value else 0
+        return parse_threshold('worker-timeout', value) if value else 0
 
     @cached_property
     def workers(self):
@@ -614,7 +1889,7 @@ class ApacheManager(PropertyManager):
         The value of this property is a dictionary with process group names as
         keys and :class:`~proc.apache.StatsList` objects as values.
 
-        Based on :func:`proc.apache.find_apache_memory_usage()`. See also
+        Based on :attr:`combined_memory_usage`. See also
         :attr:`memory_usage`.
 
         Here's an example:
@@ -629,6 +1904,143 @@ class ApacheManager(PropertyManager):
         """
         return self.combined_memory_usage[1]
 
+    def check_cycle_time(self, elapsed=None):
+        """
+        Warn when a monitoring cycle exceeded :attr:`cycle_time_budget`.
+
+        :param elapsed: The duration of the cycle in seconds (a number,
+                        defaults to the sum of :attr:`phase_timings`).
+        :returns: :data:`True` if the cycle exceeded its budget,
+                  :data:`False` otherwise.
+        """
+        timings = self.phase_timings
+        if elapsed is None:
+            elapsed = sum(timings.values())
+        if not (self.cycle_time_budget and elapsed > self.cycle_time_budget):
+            return False
+        breakdown = concatenate(
+            "%s %s" % (phase, format_timespan(timings[phase]))
+            for phase in TIMED_PHASES if phase in timings
+        )
+        logger.warning("Cycle took %s which exceeds the budget of %s! (%s)",
+                       format_timespan(elapsed), format_timespan(self.cycle_time_budget),
+                       breakdown or "no phases timed")
+        return True
+
+    def drain_worker(self, worker, handle):
+        """
+        Ask a worker process to exit after finishing its current request.
+
+        :param worker: A :class:`KillableWorker` object.
+        :param handle: A :class:`~apache_manager.processes.ProcessHandle` object.
+        :returns: :data:`True` if the worker was signaled, :data:`False`
+                  otherwise.
+
+        Native workers are sent the ``SIGUSR1`` signal, which Apache uses for
+        graceful restarts (the worker stops accepting new connections and exits
+        once its current request is finished). Other workers (like WSGI daemon
+        processes) are sent ``SIGTERM``, which mod_wsgi handles by shutting
+        down gracefully.
+        """
+        signal_number = signal.SIGUSR1 if isinstance(worker, WorkerStatus) else signal.SIGTERM
+        try:
+            return handle.send_signal(signal_number)
+        except OSError as e:
+            logger.warning("Failed to signal %s to exit gracefully! (%s)", worker, e)
+            return False
+
+    def export_metrics(self):
+        """
+        Get the metrics written by :func:`save_metrics()` as structured data.
+
+        :returns: A list of tuples with two values each:
+
+                  1. A comment that describes a group of metrics (a string).
+                  2. A list of tuples with the tokens of each metric. The last
+                     token is the value of the metric, the preceding tokens
+                     form its name.
+
+        This method is used by :func:`save_metrics()` and
+        :func:`save_history()` so that both export the same metrics.
+        """
+        # Start with the server metrics.
+        sections = [('Global Apache server metrics.', [
+            (name.replace('_', '-'), value)
+            for name, value in sorted(self.server_metrics.items())
+        ])]
+        # Add our internal metrics.
+        sections.append(('Metrics internal to apache-manager.', [
+            (name.replace('_', '-'), (0 if value else 1) if isinstance(value, bool) else value)
+            for name, value in sorted(self.manager_metrics.items())
+        ]))
+        # Add memory usage metrics per group of (WSGI) workers.
+        groups = dict(self.wsgi_process_groups)
+        ordered_group_names = [NATIVE_WORKERS_LABEL] + sorted(groups.keys())
+        groups[NATIVE_WORKERS_LABEL] = self.memory_usage
+        metric_names = ('count', 'min', 'max', 'average', 'median')
+        for group_name in ordered_group_names:
+            if group_name == NATIVE_WORKERS_LABEL:
+                heading = 'Memory usage of native Apache worker processes.'
+            else:
+                heading = 'Memory usage of %r WSGI worker processes.' % group_name
+            sections.append((heading, [
+                ('memory-usage', group_name, metric, (
+                    len(groups[group_name]) if metric == 'count'
+                    else getattr(groups[group_name], metric)
+                )) for metric in metric_names
+            ]))
+        # Add the resource usage of Apache's control group.
+        stats = self.cgroup_stats
+        if stats:
+            sections.append(('Resource usage of the control group of Apache.', [
+                ('cgroup-memory', 'current', stats['memory_current']),
+                ('cgroup-memory', 'high', stats['memory_high'] or 0),
+                ('cgroup-memory', 'max', stats['memory_max'] or 0),
+                ('cgroup-memory', 'anon', stats['memory_stat'].get('anon', 0)),
+                ('cgroup-memory', 'file', stats['memory_stat'].get('file', 0)),
+                ('cgroup-cpu', 'usage', round(stats['cpu_stat'].get('usage_usec', 0) / 1e6, 2)),
+                ('cgroup-cpu', 'throttled', round(stats['cpu_stat'].get('throttled_usec', 0) / 1e6, 2)),
+                ('cgroup-cpu', 'nr-throttled', stats['cpu_stat'].get('nr_throttled', 0)),
+            ]))
+        # Add CPU utilization metrics per group of (WSGI) workers.
+        cpu_groups = self.cpu_usage_by_group
+        for group_name in ordered_group_names:
+            if group_name == NATIVE_WORKERS_LABEL:
+                heading = 'CPU utilization of native Apache worker processes.'
+            else:
+                heading = 'CPU utilization of %r WSGI worker processes.' % group_name
+            values = cpu_groups.get(group_name)
+            sections.append((heading, [
+                ('cpu-usage', group_name, 'average', round(values.average, 2) if values else 0),
+                ('cpu-usage', group_name, 'max', round(values.max, 2) if values else 0),
+            ]))
+        # Add memory growth metrics per group of (WSGI) workers.
+        growth_groups = self.memory_growth_by_group
+        for group_name in ordered_group_names:
+            if group_name == NATIVE_WORKERS_LABEL:
+                heading = 'Memory growth of native Apache worker processes (bytes per second).'
+            else:
+                heading = 'Memory growth of %r WSGI worker processes (bytes per second).' % group_name
+            values = growth_groups.get(group_name)
+            sections.append((heading, [
+                ('memory-growth', group_name, 'average', round(values.average, 2) if values else 0),
+                ('memory-growth', group_name, 'max', round(values.max, 2) if values else 0),
+            ]))
+        # Add the memory usage and memory pressure of the host.
+        rows = []
+        if self.system_memory:
+            rows.append(('memory-total', self.system_memory.get('MemTotal', 0)))
+            rows.append(('memory-available', self.system_memory.get('MemAvailable', 0)))
+        if self.memory_used_percent is not None:
+            rows.append(('memory-used-percent', round(self.memory_used_percent, 2)))
+        if self.memory_pressure:
+            for kind in ('some', 'full'):
+                for name in ('avg10', 'avg60', 'avg300'):
+                    rows.append(('memory-pressure', kind, name, self.memory_pressure[kind][name]))
+        rows.append(('threshold-scale', round(self.threshold_scale, 2)))
+        sections.append(('Memory usage and pressure of the host.', rows))
+        return sections
+
     def extract_metric(self, pattern, default='0'):
         """
         Extract a metric from the Apache text status page.
@@ -653,37 +2065,376 @@ class ApacheManager(PropertyManager):
             logger.warning("Pattern %r didn't match plain text Apache status page contents!", pattern)
             return default
 
+    @timed_phase('fetch')
     def fetch_status_page(self, status_url):
         """
         Fetch an Apache status page and return its content.
 
         :param url: The URL of the status page (a string).
         :returns: The response body (a string).
-        :raises: :exc:`.StatusPageError` if fetching of the status page fails.
+        :raises: :exc:`.StatusPageError` if fetching of the status page fails
+                 (this includes connection errors and exceeding
+                 :attr:`status_timeout`).
+
+        When fetching fails and the URL was selected by probing (see
+        :attr:`html_status_url`) the selection is removed from
+        :attr:`discovery_cache`, so that the next run probes again.
         """
         timer = Timer()
         # Get the Apache status page.
         logger.debug("Fetching Apache status page from %s ..", status_url)
         try:
-            response = urlopen(status_url)
-        except HTTPError as e:
-            # These objects can be treated as response objects.
-            response = e
-        # Validate the HTTP response status.
-        response_code = response.getcode()
-        if response_code != 200:
+            try:
+                response = urlopen(status_url, timeout=self.status_timeout)
+            except HTTPError as e:
+                # These objects can be treated as response objects.
+                response = e
+            except (URLError, HTTPException, socket.error) as e:
+                raise StatusPageError("Failed to retrieve Apache status page from %s! (%s)" % (status_url, e))
+            # Validate the HTTP response status.
+            response_code = response.getcode()
+            if response_code != 200:
+                # Notify the caller using a custom exception.
+                raise StatusPageError(compact("""
+                    Failed to retrieve Apache status page from {url}! Expected to
+                    get HTTP response status 200, got {code} instead.
+                """, url=status_url, code=response_code))
+            try:
+                response_body = response.read()
+            except (HTTPException, socket.error) as e:
+                # The connection was closed or stalled halfway through the response.
+                raise StatusPageError("Failed to read Apache status page from %s! (%s)" % (status_url, e))
+        except StatusPageError:
             # Record the failure.
             self.status_response = False
-            # Notify the caller using a custom exception.
-            raise StatusPageError(compact("""
-                Failed to retrieve Apache status page from {url}! Expected to
-                get HTTP response status 200, got {code} instead.
-            """, url=status_url, code=response_code))
-        response_body = response.read()
+            if self.discovery_cache:
+                self.discovery_cache.delete('status-url', value=status_url.partition('?')[0])
+            raise
         logger.debug("Fetched %s in %s.", format_size(len(response_body)), timer)
         self.status_response = True
         return response_body
 
+    def find_budget_candidates(self, group, budget, exclude=(), usage=None, idle_only=False):
+        """
+        Find the workers to kill to bring the memory usage of a group below its budget.
+
+        :param group: The name of a worker group (see
+                      :attr:`KillableWorker.group_name`) or :data:`None` to
+                      consider all workers (this is used to stay below
+                      :attr:`cgroup_limit_percent`).
+        :param budget: The maximum combined memory usage of the group (an integer).
+        :param exclude: A set of process IDs that are already going to be
+                        killed. This set is updated with the process IDs of the
+                        selected workers.
+        :param usage: The known memory usage of the group (an integer, defaults
+                      to the combined memory usage of the workers in the
+                      group).
+        :param idle_only: :data:`True` to never select active workers,
+                          :data:`False` (the default) otherwise.
+        :returns: A list of :class:`KillCandidate` objects.
+
+        Idle workers are selected before active workers and larger workers
+        before smaller ones, so that the minimum number of workers is killed
+        (and the minimum number of requests is interrupted).
+        """
+        heap = []
+        total = 0
+        excluded = 0
+        processes = set()
+        for worker in self.killable_workers:
+            if group in (None, worker.group_name) and worker.pid not in processes and worker.memory_usage:
+                processes.add(worker.pid)
+                total += worker.memory_usage
+                # Memory used by workers that are already going to be killed
+                # doesn't count against the budget.
+                if worker.pid in exclude:
+                    excluded += worker.memory_usage
+                elif worker.process and not (idle_only and worker.is_active):
+                    heap.append((worker.is_active, -worker.memory_usage, worker.pid, worker))
+        total = (total if usage is None else usage) - excluded
+        if group is None:
+            rule = 'cgroup-limit-percent'
+            description = "control group %s" % self.cgroup_path
+        else:
+            rule = 'memory budget'
+            description = "group '%s'" % group
+        candidates = []
+        if total > budget:
+            logger.verbose("Workers in %s use %s which exceeds their memory budget of %s.",
+                           description, format_size(total), format_size(budget))
+            heapq.heapify(heap)
+            excess = float(total) / budget
+            while heap and total > budget:
+                is_active, memory_usage, pid, worker = heapq.heappop(heap)
+                total += memory_usage
+                candidates.append(KillCandidate(
+                    worker=worker,
+                    rule=rule,
+                    excess=excess,
+                    key='%i:%s' % (pid, self.get_start_ticks(worker.process)),
+                    reason="using %s (%s) to stay within the memory budget of %s" % (
+                        format_size(worker.memory_usage),
+                        worker.request or 'last request unknown',
+                        description,
+                    ),
+                ))
+                exclude.add(pid)
+        return candidates
+
+    @timed_phase('decide')
+    def find_kill_candidates(self, **options):
+        """
+        Find Apache worker processes that exceed resource usage thresholds.
+
+        :param max_memory_active: Overrides :attr:`max_memory_active`.
+        :param max_memory_idle: Overrides :attr:`max_memory_idle`.
+        :param timeout: Overrides :attr:`worker_timeout`.
+        :param max_cpu_percent: Overrides :attr:`max_cpu_percent`.
+        :param recycle_horizon: Overrides :attr:`recycle_horizon`.
+        :param memory_budgets: Overrides :attr:`memory_budgets`.
+        :param outlier_factor: Overrides :attr:`outlier_factor`.
+        :param cgroup_limit_percent: Overrides :attr:`cgroup_limit_percent`.
+        :param drain_timeout: Overrides :attr:`drain_timeout`.
+        :returns: A list of :class:`KillCandidate` objects (at most one for
+                  each OS process).
+
+        This method doesn't kill any workers, see :func:`kill_workers()` for
+        details about the thresholds that are applied.
+        """
+        candidates = []
+        seen = set()
+        thresholds = self.resolve_thresholds(**options)
+        memory_budgets = options.get('memory_budgets', self.memory_budgets)
+        outliers = self.get_outlier_thresholds(options.get('outlier_factor', self.outlier_factor))
+        drain_timeout = options.get('drain_timeout', self.drain_timeout)
+        for worker in self.killable_workers:
+            # Depending on the multiprocessing module in use multiple workers
+            # may be using the same OS process. We leave it up to the caller
+            # whether's it's wise to kill workers using non-preforked processes
+            # (hint: it's not) but we definitely shouldn't try to kill a single
+            # OS process more than once! Workers whose process has disappeared
+            # can't be killed at all.
+            if worker.pid in seen or not worker.process:
+                continue
+            candidate = None
+            limits = thresholds.get(worker.group_name, thresholds[None])
+            memory_usage_threshold, memory_rule = limits['max_memory_active' if worker.is_active else 'max_memory_idle']
+            timeout, timeout_rule = limits['timeout']
+            max_cpu_percent, cpu_rule = limits['max_cpu_percent']
+            recycle_horizon, recycle_rule = limits['recycle_horizon']
+            recycle_threshold = limits['max_memory_active'][0] or limits['max_memory_idle'][0]
+            memory_outlier = outliers.get((worker.group_name, 'memory'))
+            time_outlier = outliers.get((worker.group_name, 'time'))
+            if memory_usage_threshold and (worker.memory_usage or 0) > memory_usage_threshold:
+                candidate = KillCandidate(
+                    worker=worker,
+                    rule=memory_rule,
+                    excess=float(worker.memory_usage) / memory_usage_threshold,
+                    reason="using %s (%s)" % (
+                        format_size(worker.memory_usage),
+                        worker.request or 'last request unknown',
+                    ),
+                )
+            elif timeout and worker.is_active and getattr(worker, 'ss', 0) > timeout:
+                candidate = KillCandidate(
+                    worker=worker,
+                    rule=timeout_rule,
+                    excess=float(worker.ss) / timeout,
+                    reason="hanging for %s since last request (%s)" % (
+                        format_timespan(worker.ss),
+                        worker.request or 'unknown',
+                    ),
+                )
+            elif max_cpu_percent and self.is_cpu_spinning(worker.pid, max_cpu_percent):
+                candidate = KillCandidate(
+                    worker=worker,
+                    rule=cpu_rule,
+                    excess=worker.cpu_percent / max_cpu_percent,
+                    reason="using %.1f%% CPU for %s (%s)" % (
+                        worker.cpu_percent,
+                        pluralize(self.cpu_sample_count, "sample"),
+                        worker.request or 'last request unknown',
+                    ),
+                )
+            elif (recycle_horizon and recycle_threshold and not worker.is_active and
+                  (worker.memory_growth or 0) > 0 and
+                  worker.memory_usage + worker.memory_growth * recycle_horizon > recycle_threshold):
+                candidate = KillCandidate(
+                    worker=worker,
+                    rule=recycle_rule,
+                    excess=float(worker.memory_usage + worker.memory_growth * recycle_horizon) / recycle_threshold,
+                    recycle=True,
+                    reason="using %s and growing %s per minute (projected to exceed %s within %s)" % (
+                        format_size(worker.memory_usage),
+                        format_size(worker.memory_growth * 60),
+                        format_size(recycle_threshold),
+                        format_timespan(recycle_horizon),
+                    ),
+                )
+            elif (memory_outlier and (worker.memory_usage or 0) > memory_outlier and
+                  (drain_timeout or not worker.is_active)):
+                candidate = KillCandidate(
+                    worker=worker,
+                    rule='outlier-factor',
+                    excess=float(worker.memory_usage) / memory_outlier,
+                    reason="using %s which is unusual for group '%s' (threshold is %s)" % (
+                        format_size(worker.memory_usage),
+                        worker.group_name,
+                        format_size(memory_outlier),
+                    ),
+                )
+            elif time_outlier and worker.is_active and getattr(worker, 'ss', 0) > time_outlier:
+                candidate = KillCandidate(
+                    worker=worker,
+                    rule='outlier-factor',
+                    excess=float(worker.ss) / time_outlier,
+                    reason="hanging for %s which is unusual for group '%s' (threshold is %s) (%s)" % (
+                        format_timespan(worker.ss),
+                        worker.group_name,
+                        format_timespan(time_outlier),
+                        worker.request or 'unknown',
+                    ),
+                )
+            if candidate:
+                candidate.key = '%i:%s' % (worker.pid, self.get_start_ticks(worker.process))
+                candidates.append(candidate)
+                seen.add(worker.pid)
+        for group, budget in sorted(memory_budgets.items()):
+            candidates.extend(self.find_budget_candidates(group, budget, seen))
+        cgroup_limit_percent = options.get('cgroup_limit_percent', self.cgroup_limit_percent)
+        if cgroup_limit_percent and self.cgroup_stats:
+            limit = self.cgroup_stats['memory_high'] or self.cgroup_stats['memory_max']
+            if limit:
+                # Killing workers doesn't free the page cache.
+                usage = self.cgroup_stats['memory_current'] - self.cgroup_stats['memory_stat'].get('file', 0)
+                budget = int(limit * cgroup_limit_percent / 100.0)
+                candidates.extend(self.find_budget_candidates(None, budget, seen, usage=usage, idle_only=True))
+        return candidates
+
+    def get_cpu_time(self, process):
+        """
+        Get the total CPU time used by a process.
+
+        :param process: A :class:`proc.core.Process` object.
+        :returns: The number of seconds spent in user and kernel mode (a float).
+        """
+        ticks = int(process.stat_fields[13]) + int(process.stat_fields[14])
+        return ticks / float(os.sysconf('SC_CLK_TCK'))
+
+    def get_memory_usage(self, process):
+        """
+        Get the memory usage of a process according to :attr:`memory_metric`.
+
+        :param process: A :class:`proc.core.Process` object.
+        :returns: The memory usage in bytes (an integer) or :data:`None` when
+                  the process disappeared.
+
+        When :attr:`memory_metric` is ``rss`` the value of
+        :attr:`proc.core.Process.rss` is used directly, otherwise the result
+        of :func:`read_memory_info()` is cached in :attr:`memory_info`. When
+        the memory usage details can't be read (for example due to missing
+        privileges) the resident set size is used instead.
+        """
+        if self.memory_metric == 'rss':
+            return process.rss
+        if process.pid not in self.memory_info:
+            self.memory_info[process.pid] = read_memory_info(process.proc_tree)
+        info = self.memory_info[process.pid]
+        if info is None:
+            logger.debug("Falling back to RSS of process %i (memory usage details not available).", process.pid)
+            return process.rss
+        return info[self.memory_metric]
+
+    def get_outlier_thresholds(self, factor):
+        """
+        Compute adaptive thresholds based on the normal footprint of each group of workers.
+
+        :param factor: The number of median absolute deviations above the
+                       median that is considered unusual (a number, zero
+                       disables adaptive thresholds).
+        :returns: A dictionary with tuples of two strings (the name of a worker
+                  group and ``memory`` or ``time``) as keys and thresholds
+                  (numbers) as values.
+
+        Memory thresholds are computed for each group of workers from the
+        same data as :attr:`memory_usage` and :attr:`wsgi_process_groups`,
+        request duration thresholds are computed for native workers (the only
+        workers whose request duration is known) based on the
+        :attr:`~WorkerStatus.ss` value of active workers. Groups with less than
+        :attr:`outlier_min_workers` workers are skipped, because their
+        statistics aren't meaningful, as are groups without spread (see
+        :func:`outlier_threshold()`). The thresholds are bounded by
+        :attr:`outlier_memory_floor`, :attr:`outlier_memory_ceiling`,
+        :attr:`outlier_time_floor` and :attr:`outlier_time_ceiling`.
+        """
+        thresholds = {}
+        if factor:
+            groups = dict(self.wsgi_process_groups)
+            groups[NATIVE_WORKERS_LABEL] = self.memory_usage
+            for group, values in groups.items():
+                if len(values) >= self.outlier_min_workers:
+                    threshold = outlier_threshold(
+                        values, factor,
+                        floor=self.outlier_memory_floor,
+                        ceiling=self.outlier_memory_ceiling,
+                    )
+                    if threshold:
+                        thresholds[(group, 'memory')] = threshold
+            durations = [w.ss for w in self.workers if w.is_active and w.ss is not None]
+            if len(durations) >= self.outlier_min_workers:
+                threshold = outlier_threshold(
+                    durations, factor,
+                    floor=self.outlier_time_floor,
+                    ceiling=self.outlier_time_ceiling,
+                )
+                if threshold:
+                    thresholds[(NATIVE_WORKERS_LABEL, 'time')] = threshold
+        return thresholds
+
+    def get_start_ticks(self, process):
+        """
+        Get the start time of a process.
+
+        :param process: A :class:`proc.core.Process` object.
+        :returns: The start time of the process in clock ticks after system
+                  boot (an integer). Unlike :attr:`proc.core.Process.starttime`
+                  this value is stable, so it can be combined with the process
+                  ID to detect reuse of process IDs.
+        """
+        return int(process.stat_fields[21])
+
+    def get_unique_memory(self, process):
+        """
+        Get the memory that's freed when a process exits.
+
+        :param process: A :class:`proc.core.Process` object.
+        :returns: The unique set size of the process in bytes (an integer).
+
+        Unlike the resident set size this excludes the pages that are shared
+        with other processes (like the copy-on-write pages inherited from the
+        Apache master process). The result of :func:`read_memory_info()` is
+        cached in :attr:`memory_info`. When the memory usage details can't be
+        read :attr:`proc.core.Process.rss` is used, which overestimates the
+        freed memory.
+        """
+        if process.pid not in self.memory_info:
+            self.memory_info[process.pid] = read_memory_info(process.proc_tree)
+        info = self.memory_info[process.pid]
+        return info['uss'] if info else process.rss
+
+    def is_cpu_spinning(self, pid, threshold):
+        """
+        Check whether a process has sustained a high CPU utilization.
+
+        :param pid: The process ID (an integer).
+        :param threshold: The CPU utilization threshold (a percentage).
+        :returns: :data:`True` if the CPU utilization of the process exceeded
+                  the threshold during each of the last
+                  :attr:`cpu_sample_count` intervals, :data:`False` otherwise.
+        """
+        samples = self.cpu_usage.get(pid, [])[-self.cpu_sample_count:]
+        return len(samples) >= self.cpu_sample_count and min(samples) > threshold
+
     def kill_workers(self, **options):
         """
         Kill Apache worker processes that exceed resource usage thresholds.
@@ -691,9 +2442,19 @@ class ApacheManager(PropertyManager):
         :param max_memory_active: Overrides :attr:`max_memory_active`.
         :param max_memory_idle: Overrides :attr:`max_memory_idle`.
         :param timeout: Overrides :attr:`worker_timeout`.
+        :param max_cpu_percent: Overrides :attr:`max_cpu_percent`.
+        :param recycle_horizon: Overrides :attr:`recycle_horizon`.
+        :param memory_budgets: Overrides :attr:`memory_budgets`.
+        :param outlier_factor: Overrides :attr:`outlier_factor`.
+        :param cgroup_limit_percent: Overrides :attr:`cgroup_limit_percent`.
+        :param max_kills_per_cycle: Overrides :attr:`max_kills_per_cycle`.
+        :param max_kills_per_window: Overrides :attr:`max_kills_per_window`.
+        :param drain_timeout: Overrides :attr:`drain_timeout`.
         :param dry_run: :data:`True` disables the killing of workers, so that
                         the ramifications of running this method become clear
                         without doing any damage (defaults to :data:`False`).
+                        This is implied when :attr:`foreign_pid_namespace` is
+                        :data:`True`, because workers can't be signaled.
         :returns: A list of integers with process ids of killed workers.
 
         Some implementation notes about this method:
@@ -703,62 +2464,212 @@ class ApacheManager(PropertyManager):
         - Memory usage is measured using :attr:`~KillableWorker.memory_usage`.
         - The number of seconds since the beginning of the most recent request
           is measured using :attr:`WorkerStatus.ss`.
-        - Worker processes are killed using the
-          :meth:`executor.process.ControllableProcess.kill()`
-          method.
-
-        See also :attr:`num_killed_active` and :attr:`num_killed_idle`.
+        - CPU utilization is measured using :attr:`cpu_usage`.
+        - Memory growth is measured using :attr:`memory_growth`.
+        - Workers whose memory usage or request duration is unusual compared
+          to the other workers in their group are killed when
+          :attr:`outlier_factor` is set (see :func:`get_outlier_thresholds()`).
+        - Groups of workers that exceed their :attr:`memory_budgets` are
+          brought below budget by killing the minimum number of workers.
+          The same happens (using idle workers only) when Apache's control
+          group approaches its memory limit (see :attr:`cgroup_limit_percent`).
+        - The workers that exceed a threshold are found using
+          :func:`find_kill_candidates()`. Workers that were deferred by a
+          previous call are killed first, after that workers are killed in
+          order of how far they exceed their threshold.
+        - The number of workers killed per WSGI process group is limited by
+          :attr:`max_kills_per_cycle` and :attr:`max_kills_per_window`,
+          remaining candidates are deferred (see :attr:`deferred_kills`).
+        - Worker processes are stopped using :func:`stop_workers()`.
+
+        See also :attr:`num_killed_active`, :attr:`num_killed_idle`,
+        :attr:`num_deferred`, :attr:`num_drained`, :attr:`num_confirmed`,
+        :attr:`num_failed` and :attr:`memory_reclaimed`.
         """
-        killed = set()
-        num_checked = 0
+        killed = []
+        selected = []
+        deferred = {}
         dry_run = options.get('dry_run', False)
-        # Use configured values for thresholds not specified by the caller.
-        max_memory_active = options.get('max_memory_active', self.max_memory_active)
-        max_memory_idle = options.get('max_memory_idle', self.max_memory_idle)
-        timeout = options.get('timeout', self.worker_timeout)
-        for worker in self.killable_workers:
-            # Depending on the multiprocessing module in use multiple workers
-            # may be using the same OS process. We leave it up to the caller
-            # whether's it's wise to kill workers using non-preforked processes
-            # (hint: it's not) but we definitely shouldn't try to kill a single
-            # OS process more than once!
-            if worker.pid not in killed:
-                kill_worker = False
-                memory_usage_threshold = max_memory_active if worker.is_active else max_memory_idle
-                if memory_usage_threshold and worker.memory_usage > memory_usage_threshold:
-                    logger.notice(
-                        "Killing %s using %s (%s) ..",
-                        worker, format_size(worker.memory_usage),
-                        worker.request or 'last request unknown',
-                    )
-                    kill_worker = True
-                elif timeout and worker.is_active and getattr(worker, 'ss', 0) > timeout:
-                    logger.notice(
-                        "Killing %s hanging for %s since last request (%s) ..",
-                        worker, format_timespan(worker.ss),
-                        worker.request or 'unknown',
-                    )
-                    kill_worker = True
-                if kill_worker:
-                    if not dry_run:
-                        worker.process.kill()
-                    killed.add(worker.pid)
-                    if worker.is_active:
-                        self.num_killed_active += 1
-                    else:
-                        self.num_killed_idle += 1
-            num_checked += 1
+        if self.foreign_pid_namespace and not dry_run:
+            logger.warning("Performing a dry run because the process IDs in %s belong to another PID namespace!",
+                           format_path(self.proc_root))
+            dry_run = True
+        drain_timeout = options.get('drain_timeout', self.drain_timeout)
+        max_kills_per_cycle = options.get('max_kills_per_cycle', self.max_kills_per_cycle)
+        max_kills_per_window = options.get('max_kills_per_window', self.max_kills_per_window)
+        candidates = self.find_kill_candidates(**options)
+        # Forget about kills that are no longer part of the time window.
+        now = self.sample_time
+        for group in list(self.kill_history):
+            self.kill_history[group] = [t for t in self.kill_history[group] if t > now - self.kill_window]
+            if not self.kill_history[group]:
+                del self.kill_history[group]
+        cycle_kills = collections.Counter()
+        window_kills = collections.Counter(dict((g, len(t)) for g, t in self.kill_history.items()))
+        for candidate in sorted(candidates, key=lambda c: (c.key not in self.deferred_kills, -c.excess)):
+            worker = candidate.worker
+            group = worker.group_name
+            if ((max_kills_per_cycle and cycle_kills[group] >= max_kills_per_cycle) or
+                    (max_kills_per_window and window_kills[group] >= max_kills_per_window)):
+                logger.notice("Deferring %s %s, the kill budget of '%s' is exhausted ..",
+                              worker, candidate.reason, group)
+                deferred[candidate.key] = self.deferred_kills.get(candidate.key, now)
+                continue
+            if candidate.recycle:
+                action = "Recycling"
+            elif drain_timeout and worker.is_active:
+                action = "Draining"
+            else:
+                action = "Killing"
+            logger.notice("%s %s %s [%s] ..", action, worker, candidate.reason, candidate.rule)
+            if not dry_run:
+                self.kill_history.setdefault(group, []).append(now)
+            selected.append(candidate)
+            killed.append(worker.pid)
+            cycle_kills[group] += 1
+            window_kills[group] += 1
+            if candidate.recycle:
+                self.num_recycled += 1
+            if worker.is_active:
+                self.num_killed_active += 1
+            else:
+                self.num_killed_idle += 1
+        self.num_deferred = len(deferred)
+        if not dry_run:
+            self.stop_workers(selected, drain_timeout)
+            self.deferred_kills.clear()
+            self.deferred_kills.update(deferred)
+            self.save_state()
+        num_checked = len(self.killable_workers)
         if killed:
-            logger.notice("Killed %i of %s.", len(killed), pluralize(num_checked, "Apache worker"))
+            logger.notice("%s %i of %s (using %s).", "Selected" if dry_run else "Killed",
+                          len(killed), pluralize(num_checked, "Apache worker"),
+                          format_size(sum(c.worker.memory_usage or 0 for c in selected)))
         else:
             logger.info("No Apache workers killed (found %s within resource usage limits).",
-                        pluralize(num_checked, "worker"))
-        return list(killed)
+                        pluralize(num_checked - len(deferred), "worker"))
+        if deferred:
+            logger.notice("Deferred killing of %s to stay within the kill budget.",
+                          pluralize(len(deferred), "Apache worker"))
+        return killed
+
+    def parse_apache_config(self):
+        """
+        Parse the Apache configuration to find where the status page is served.
+
+        :returns: A loaded :class:`~apache_manager.discovery.ApacheConfig` object.
+        :raises: :exc:`.AddressDiscoveryError` when the configuration file
+                 doesn't exist.
+
+        When :attr:`ports_config` is set only that file (and the files it
+        includes) is parsed, otherwise :attr:`apache_config` is parsed. When
+        neither is available :data:`PORTS_CONF` is tried.
+        """
+        filename = self.ports_config or self.apache_config or PORTS_CONF
+        logger.debug("Discovering where Apache is listening by parsing %s ..", filename)
+        # Make sure the configuration file exists.
+        if not os.path.isfile(filename):
+            raise AddressDiscoveryError(compact("""
+                Failed to discover any addresses or ports that Apache is
+                listening on! The configuration file {filename} is missing. Are
+                you sure the Apache web server is properly installed? If so
+                you'll have to specify the configuration's location.
+            """, filename=filename))
+        return ApacheConfig(filename=filename).load()
+
+    @contextlib.contextmanager
+    def profile_cycle(self):
+        """
+        Profile a monitoring cycle when :attr:`profiler` is set (a context manager).
+
+        Refer to :func:`.CycleProfiler.profile_cycle()` for details. When
+        :attr:`profile_file` isn't set the context manager does nothing.
+        """
+        if self.profiler:
+            with self.profiler.profile_cycle():
+                yield
+        else:
+            yield
 
     def refresh(self):
         """Clear cached properties so that their values are recomputed when dereferenced."""
+        self.previous_save_time = self.phase_timings.get('save')
         self.clear_cached_properties()
 
+    def resolve_thresholds(self, **options):
+        """
+        Resolve the thresholds that apply to each group of workers.
+
+        :param options: Overrides for the global thresholds (see :func:`kill_workers()`).
+        :returns: A dictionary that maps the names of worker groups to
+                  dictionaries with thresholds. The keys of the inner
+                  dictionaries are the keyword arguments accepted by
+                  :func:`kill_workers()` and the values are tuples with two
+                  values: The threshold and the name of the rule that defined
+                  it (see :attr:`KillCandidate.rule`). The thresholds of
+                  groups without overrides are available under the key
+                  :data:`None`.
+
+        The overrides in :attr:`group_thresholds` take precedence over the
+        global thresholds in the configuration file. Thresholds given
+        explicitly by the caller (as keyword arguments or by setting the
+        corresponding property, which is what the command line interface
+        does) take precedence over both. Finally the memory thresholds are
+        scaled by :attr:`threshold_scale`.
+        """
+        defaults = {}
+        explicit = set()
+        for option, keyword, attribute in THRESHOLD_OPTIONS:
+            defaults[keyword] = (options.get(keyword, getattr(self, attribute)), option)
+            # Properties that were assigned a value are stored in the instance dictionary.
+            if keyword in options or attribute in self.__dict__:
+                explicit.add(keyword)
+        table = {None: defaults}
+        for group, overrides in self.group_thresholds.items():
+            table[group] = dict(defaults)
+            for option, keyword, attribute in THRESHOLD_OPTIONS:
+                if option in overrides:
+                    rule = '%s in [%s:%s]' % (option, CONFIG_NAME, group)
+                    if keyword in explicit:
+                        logger.verbose("Ignoring %s because %s was given explicitly.", rule, option)
+                    else:
+                        table[group][keyword] = (overrides[option], rule)
+        # Scale the memory thresholds according to the memory pressure.
+        scale = self.threshold_scale
+        if scale != 1:
+            for thresholds in table.values():
+                for keyword in ('max_memory_active', 'max_memory_idle'):
+                    value, rule = thresholds[keyword]
+                    if value:
+                        thresholds[keyword] = (int(value * scale), '%s scaled by %.2f' % (rule, scale))
+        return table
+
+    @timed_phase('save')
+    def save_history(self, timestamp=None):
+        """
+        Append the current monitoring metrics to the metric history.
+
+        :param timestamp: The number of seconds since the Unix epoch (a number,
+                          defaults to the current time).
+        :returns: :data:`True` if the metrics were recorded, :data:`False` if
+                  :attr:`history_directory` isn't set.
+
+        The same metrics that :func:`save_metrics()` writes are stored, the
+        names of the metrics are formed by joining the tokens that precede
+        each value with dots (for example ``busy-workers`` or
+        ``memory-usage.native.max``).
+        """
+        if not self.history:
+            return False
+        metrics = []
+        for heading, rows in self.export_metrics():
+            for row in rows:
+                metrics.append(('.'.join(map(str, row[:-1])), row[-1]))
+        history_file = self.history.append(metrics, timestamp)
+        logger.debug("Stored %s in %s.", pluralize(len(metrics), "metric"), history_file.pathname)
+        return True
+
+    @timed_phase('save')
     def save_metrics(self, data_file):
         """
         Store monitoring metrics in a data file.
@@ -813,34 +2724,12 @@ class ApacheManager(PropertyManager):
             logger.debug("Reporting metrics on standard output ..")
         else:
             logger.debug("Storing metrics in %s ..", data_file)
-        # Start with the server metrics.
-        listing = ['# Global Apache server metrics.']
-        for name, value in sorted(self.server_metrics.items()):
-            listing.append('%s\t%s' % (name.replace('_', '-'), value))
-        # Add our internal metrics.
-        listing.extend(['', '# Metrics internal to apache-manager.'])
-        for name, value in sorted(self.manager_metrics.items()):
-            if isinstance(value, bool):
-                value = 0 if value else 1
-            listing.append('%s\t%s' % (name.replace('_', '-'), value))
-        # Add memory usage metrics per group of (WSGI) workers.
-        groups = dict(self.wsgi_process_groups)
-        ordered_group_names = [NATIVE_WORKERS_LABEL] + sorted(groups.keys())
-        groups[NATIVE_WORKERS_LABEL] = self.memory_usage
-        metric_names = ('count', 'min', 'max', 'average', 'median')
-        for group_name in ordered_group_names:
-            listing.append('')
-            if group_name == NATIVE_WORKERS_LABEL:
-                listing.append('# Memory usage of native Apache worker processes.')
-            else:
-                listing.append('# Memory usage of %r WSGI worker processes.' % group_name)
-            for metric in metric_names:
-                listing.append('\t'.join([
-                    'memory-usage', group_name, metric, str(
-                        len(groups[group_name]) if metric == 'count'
-                        else getattr(groups[group_name], metric)
-                    ),
-                ]))
+        listing = []
+        for heading, rows in self.export_metrics():
+            if listing:
+                listing.append('')
+            listing.append('# %s' % heading)
+            listing.extend('\t'.join(map(str, row)) for row in rows)
         if data_file == '-':
             output('\n'.join(listing))
         else:
@@ -849,6 +2738,175 @@ class ApacheManager(PropertyManager):
                 handle.write('\n'.join(listing) + '\n')
             os.rename(temporary_file, data_file)
 
+    @timed_phase('save')
+    def save_state(self):
+        """
+        Save the state that needs to survive between runs to :attr:`state_file` (if set).
+
+        This includes :attr:`deferred_kills`, :attr:`kill_history`,
+        :attr:`cpu_history` and :attr:`memory_history`.
+        """
+        if self.state_file:
+            state = dict(
+                cpu_history=dump_samples(self.cpu_history),
+                deferred_kills=self.deferred_kills,
+                kill_history=self.kill_history,
+                memory_history=dump_samples(self.memory_history),
+            )
+            # Write to a temporary file and rename it into place so that a
+            # crash doesn't leave behind a truncated state file.
+            temporary_file = '%s.tmp' % self.state_file
+            with open(temporary_file, 'w') as handle:
+                json.dump(state, handle)
+            os.rename(temporary_file, self.state_file)
+
+    @timed_phase('kill')
+    def stop_workers(self, candidates, drain_timeout=0):
+        """
+        Stop the worker processes selected by :func:`kill_workers()`.
+
+        :param candidates: A list of :class:`KillCandidate` objects.
+        :param drain_timeout: The number of seconds that active workers are
+                              given to finish their current request (a number,
+                              zero disables draining).
+
+        This method works as follows:
+
+        1. A handle is opened for each worker process using
+           :func:`~apache_manager.processes.open_process()`, which verifies
+           that the process ID hasn't been reused since the worker was
+           inspected (workers that have already exited are skipped).
+
+        2. When `drain_timeout` is nonzero active workers are asked to exit
+           gracefully after finishing their current request (see
+           :func:`drain_worker()`) and given `drain_timeout` seconds to do so.
+           All other workers are sent ``SIGKILL`` immediately (before waiting
+           for the draining workers) and draining workers that don't exit in
+           time are sent ``SIGKILL`` afterwards.
+
+        3. Finally this method waits (at most :data:`EXIT_TIMEOUT` seconds) for
+           all killed workers to exit.
+
+        Signals are sent to all workers before waiting for any of them and all
+        workers are waited for at the same time, so the time spent is bounded
+        by `drain_timeout` and :data:`EXIT_TIMEOUT` regardless of the number
+        of workers. The outcome is available in :attr:`num_confirmed`,
+        :attr:`num_failed`, :attr:`num_drained` and :attr:`memory_reclaimed`.
+        """
+        if self.foreign_pid_namespace:
+            logger.warning("Not stopping %s because the process IDs in %s belong to another PID namespace!",
+                           pluralize(len(candidates), "worker"), format_path(self.proc_root))
+            return
+        handles = []
+        unique_memory = {}
+        for candidate in candidates:
+            worker = candidate.worker
+            handle = open_process(worker.pid, self.get_start_ticks(worker.process), proc_root=self.proc_root)
+            if handle:
+                handles.append((handle, worker))
+                # The memory that will be freed can only be measured before the worker exits.
+                unique_memory[worker.pid] = self.get_unique_memory(worker.process)
+            else:
+                logger.verbose("Not stopping %s because it has already exited.", worker)
+        confirmed = []
+        signaled = []
+
+        def kill(handle, worker):
+            try:
+                if handle.send_signal(signal.SIGKILL):
+                    signaled.append((handle, worker))
+                else:
+                    confirmed.append(worker)
+            except OSError as e:
+                logger.warning("Failed to kill %s! (%s)", worker, e)
+                self.num_failed += 1
+
+        try:
+            draining = []
+            for handle, worker in handles:
+                if drain_timeout and worker.is_active and self.drain_worker(worker, handle):
+                    draining.append((handle, worker))
+                else:
+                    kill(handle, worker)
+            if draining:
+                logger.verbose("Waiting for %s to finish their current request ..",
+                               pluralize(len(draining), "worker"))
+                exited = wait_for_exit((h for h, w in draining), drain_timeout)
+                for handle, worker in draining:
+                    if handle.pid in exited:
+                        logger.verbose("%s exited gracefully.", worker)
+                        confirmed.append(worker)
+                        self.num_drained += 1
+                    else:
+                        logger.notice("Killing %s because it didn't exit within %s ..",
+                                      worker, format_timespan(drain_timeout))
+                        kill(handle, worker)
+            exited = wait_for_exit((h for h, w in signaled), EXIT_TIMEOUT)
+            for handle, worker in signaled:
+                if handle.pid in exited:
+                    confirmed.append(worker)
+                else:
+                    logger.warning("%s didn't exit within %s after being killed!",
+                                   worker, format_timespan(EXIT_TIMEOUT))
+                    self.num_failed += 1
+            reclaimed = sum(unique_memory[w.pid] or 0 for w in confirmed)
+            self.num_confirmed += len(confirmed)
+            self.memory_reclaimed += reclaimed
+            if confirmed:
+                logger.notice("Confirmed exit of %s (reclaimed %s).",
+                              pluralize(len(confirmed), "worker"), format_size(reclaimed))
+        finally:
+            for handle, worker in handles:
+                handle.close()
+
+    def summarize_memory_usage(self, processes):
+        """
+        Summarize the memory usage of Apache worker processes.
+
+        :param processes: An iterable of process objects (see :attr:`apache_workers`).
+        :returns: A tuple of two values (in the same format as
+                  :func:`~proc.apache.find_apache_memory_usage()`):
+
+                  1. A :class:`~proc.apache.StatsList` with the memory usage
+                     of workers that are not WSGI daemon processes.
+                  2. A dictionary with WSGI process group names as keys and
+                     :class:`~proc.apache.StatsList` objects as values.
+        """
+        worker_memory = StatsList()
+        wsgi_memory = collections.defaultdict(StatsList)
+        for process in processes:
+            memory_usage = self.get_memory_usage(process)
+            if memory_usage is None:
+                continue
+            if process.wsgi_process_group:
+                wsgi_memory[process.wsgi_process_group].append(memory_usage)
+            else:
+                worker_memory.append(memory_usage)
+        return worker_memory, wsgi_memory
+
+    @contextlib.contextmanager
+    def time_phase(self, name):
+        """
+        Time a phase of the monitoring cycle.
+
+        :param name: One of the strings in :data:`TIMED_PHASES`.
+        :returns: A context manager that adds the time spent in the phase
+                  (excluding the time spent in nested phases) to
+                  :attr:`phase_timings`.
+        """
+        timer = Timer()
+        nested = [0.0]
+        self.phase_stack.append(nested)
+        try:
+            yield
+        finally:
+            self.phase_stack.pop()
+            elapsed = timer.elapsed_time
+            timings = self.phase_timings
+            timings[name] = timings.get(name, 0.0) + elapsed - nested[0]
+            if self.phase_stack:
+                self.phase_stack[-1][0] += elapsed
+
 
 class NetworkAddress(PropertyManager):
 
@@ -857,7 +2915,9 @@ class NetworkAddress(PropertyManager):
     @property
     def url(self):
         """The URL corresponding to :attr:`protocol`, :attr:`address` and :attr:`port` (a string)."""
-        tokens = [self.protocol, '://', self.address]
+        # IPv6 addresses are enclosed in square brackets (RFC 3986).
+        address = '[%s]' % self.address if ':' in self.address else self.address
+        tokens = [self.protocol, '://', address]
         if not ((self.protocol == 'http' and self.port == 80) or
                 (self.protocol == 'https' and self.port == 443)):
             tokens.append(':%s' % self.port)
@@ -882,6 +2942,42 @@ class NetworkAddress(PropertyManager):
         return self.url
 
 
+class KillCandidate(PropertyManager):
+
+    """A worker that exceeds a resource usage threshold (see :func:`ApacheManager.find_kill_candidates()`)."""
+
+    @required_property
+    def excess(self):
+        """How far the worker exceeds its threshold (a ratio, e.g. 1.5 means 50% over the threshold)."""
+
+    @mutable_property
+    def key(self):
+        """A string that identifies the worker process (see :attr:`ApacheManager.deferred_kills`)."""
+
+    @required_property
+    def reason(self):
+        """A human friendly description of why the worker should be killed (a string)."""
+
+    @mutable_property
+    def recycle(self):
+        """:data:`True` if the worker is recycled because of its memory growth, :data:`False` otherwise."""
+        return False
+
+    @mutable_property
+    def rule(self):
+        """
+        The threshold that the worker exceeds (a string).
+
+        This is the name of a configuration option, followed by the
+        configuration section that defined it when the threshold is specific
+        to a group of workers (see :attr:`ApacheManager.group_thresholds`).
+        """
+
+    @required_property(repr=False)
+    def worker(self):
+        """The :class:`KillableWorker` object."""
+
+
 class KillableWorker(PropertyManager):
 
     """
@@ -900,6 +2996,31 @@ class KillableWorker(PropertyManager):
       mod_wsgi_).
     """
 
+    @property
+    def cpu_percent(self):
+        """
+        The most recent CPU utilization of the worker process (a percentage or :data:`None`).
+
+        This is based on :attr:`ApacheManager.cpu_usage` and will be
+        :data:`None` until the process has been sampled at least twice (or when
+        :attr:`manager` isn't set).
+        """
+        if self.manager:
+            samples = self.manager.cpu_usage.get(self.pid)
+            if samples:
+                return samples[-1]
+
+    @property
+    def group_name(self):
+        """
+        The name of the group that the worker belongs to (a string).
+
+        This is the name of the WSGI process group (see
+        :attr:`proc.apache.MaybeApacheWorker.wsgi_process_group`) or
+        :data:`NATIVE_WORKERS_LABEL` for other workers.
+        """
+        return getattr(self.process, 'wsgi_process_group', None) or NATIVE_WORKERS_LABEL
+
     @required_property
     def is_active(self):
         """:data:`True` if the worker is processing a request, :data:`False` otherwise."""
@@ -909,6 +3030,22 @@ class KillableWorker(PropertyManager):
         """:data:`True` if :attr:`process` is running, :data:`False` otherwise."""
         return self.process.is_alive if self.process else False
 
+    @mutable_property(repr=False)
+    def manager(self):
+        """The :class:`ApacheManager` object that created this worker (or :data:`None`)."""
+
+    @property
+    def memory_growth(self):
+        """
+        The estimated memory growth rate of the worker process (bytes per second or :data:`None`).
+
+        This is based on :attr:`ApacheManager.memory_growth` and will be
+        :data:`None` until the process has been sampled at least three times
+        (or when :attr:`manager` isn't set).
+        """
+        if self.manager:
+            return self.manager.memory_growth.get(self.pid)
+
     @lazy_property
     def memory_usage(self):
         """
@@ -917,11 +3054,17 @@ class KillableWorker(PropertyManager):
         The value of this property is an integer or :data:`None` (if the
         process disappeared before the process information is requested).
 
-        The value of this property is based on the
+        When :attr:`manager` is set the value of this property is based on
+        :func:`ApacheManager.get_memory_usage()` (so that it respects
+        :attr:`ApacheManager.memory_metric`), otherwise it's based on the
         :attr:`~proc.core.Process.rss` property of the
         :class:`proc.core.Process` class.
         """
-        return self.process.rss if self.process else None
+        if not self.process:
+            return None
+        if self.manager:
+            return self.manager.get_memory_usage(self.process)
+        return self.process.rss
 
     @required_property
     def pid(self):
@@ -939,11 +3082,14 @@ class KillableWorker(PropertyManager):
         The :class:`proc.core.Process` object for this worker process (or :data:`None`).
 
         If :attr:`pid` is set then the value of :attr:`process` defaults to the
-        result of :meth:`proc.core.Process.from_pid()`. If the worker process
-        disappears before the process information is requested :attr:`process`
-        will be :data:`None`.
+        result of :meth:`proc.core.Process.from_path()` (for the process
+        directory below :attr:`ApacheManager.proc_root` when :attr:`manager`
+        is set). If the worker process disappears before the process
+        information is requested :attr:`process` will be :data:`None`.
         """
-        return Process.from_pid(self.pid) if self.pid else None
+        if self.pid:
+            proc_root = self.manager.proc_root if self.manager else PROC_ROOT
+            return Process.from_path(os.path.join(proc_root, str(self.pid)))
 
     @mutable_property
     def request(self):
@@ -1155,7 +3301,7 @@ def coerce_tag(tag):
     Used by :func:`parse_status_table()` to get the text values of HTML tags.
     """
     try:
-        return u''.join(tag.findAll(text=True)).strip()
+        return tag.get_text().strip()
     except Exception:
         return ''
 
@@ -1178,12 +3324,365 @@ def coerce_value(type, value):
         return None
 
 
+def linear_slope(samples):
+    """
+    Estimate the rate of change of a series of samples.
+
+    :param samples: A list of tuples with two numbers each (``x`` and ``y``).
+    :returns: The slope of the least squares line through the samples (a
+              float), zero when the slope can't be determined.
+
+    Used by :attr:`ApacheManager.memory_growth` to estimate memory growth.
+    """
+    count = len(samples)
+    mean_x = sum(x for x, y in samples) / float(count)
+    mean_y = sum(y for x, y in samples) / float(count)
+    numerator = sum((x - mean_x) * (y - mean_y) for x, y in samples)
+    denominator = sum((x - mean_x) ** 2 for x, y in samples)
+    return numerator / denominator if denominator else 0.0
+
+
+def dump_samples(history):
+    """
+    Convert a history of samples to a value that can be serialized to JSON.
+
+    :param history: A dictionary like :attr:`ApacheManager.cpu_history` or
+                    :attr:`ApacheManager.memory_history`.
+    :returns: A list of lists with three values each: A process ID, the start
+              time of the process and the list of samples.
+    """
+    return [[pid, start_ticks, samples] for (pid, start_ticks), samples in history.items()]
+
+
+def load_samples(value):
+    """
+    Convert the result of :func:`dump_samples()` back to a history of samples.
+
+    :param value: A list of lists as returned by :func:`dump_samples()`.
+    :returns: A dictionary like :attr:`ApacheManager.cpu_history` or
+              :attr:`ApacheManager.memory_history`.
+    """
+    return dict(((pid, start_ticks), [tuple(s) for s in samples]) for pid, start_ticks, samples in value)
+
+
+def find_cgroup(pid, proc_root=PROC_ROOT):
+    """
+    Find the control group of a process.
+
+    :param pid: A process ID (an integer).
+    :param proc_root: The mount point of the ``proc`` file system (a string,
+                      defaults to :data:`~apache_manager.processes.PROC_ROOT`).
+    :returns: The pathname of the control group directory below
+              :data:`CGROUP_ROOT` (a string) or :data:`None` when the
+              process doesn't exist or isn't part of a unified (version 2)
+              control group hierarchy.
+    """
+    try:
+        with open(os.path.join(proc_root, str(pid), 'cgroup')) as handle:
+            for line in handle:
+                hierarchy, _, path = line.strip().partition('::')
+                if hierarchy == '0' and path:
+                    directory = os.path.join(CGROUP_ROOT, path.lstrip('/'))
+                    if os.path.isfile(os.path.join(directory, 'memory.current')):
+                        return directory
+    except EnvironmentError:
+        pass
+
+
+def find_worker_processes(proc_root=PROC_ROOT, exe_name='apache2'):
+    """
+    Find the Apache worker processes in a ``proc`` file system.
+
+    :param proc_root: The mount point of the ``proc`` file system (a string,
+                      defaults to :data:`~apache_manager.processes.PROC_ROOT`).
+    :param exe_name: The base name of the Apache executable (a string).
+    :returns: A list of :class:`~proc.apache.MaybeApacheWorker` objects
+              (sorted by process ID).
+    :raises: :exc:`~proc.apache.ApacheDaemonNotRunning` when the Apache
+             master process can't be found.
+
+    This works like :func:`proc.apache.find_apache_workers()` (which always
+    scans ``/proc``) except that the master process doesn't have to be a
+    child of init: A top level process (e.g. process one in a container or a
+    process whose parent is missing from a synthetic tree) is accepted as
+    well. Only the process IDs and parent process IDs are used to find the
+    master process, so the executable names are only resolved for top level
+    processes.
+    """
+    processes = {}
+    for entry in os.listdir(proc_root):
+        if entry.isdigit():
+            process = MaybeApacheWorker.from_path(os.path.join(proc_root, entry))
+            if process:
+                processes[process.pid] = process
+    candidates = [
+        p for pid, p in sorted(processes.items())
+        if (p.ppid in (0, 1) or p.ppid not in processes) and p.exe_name == exe_name
+    ]
+    if len(candidates) > 1:
+        # Disregard processes that aren't running with superuser privileges
+        # (the same heuristic as proc.apache.find_apache_workers()).
+        candidates = [p for p in candidates if p.user_ids and p.user_ids.real == 0]
+    if not candidates:
+        raise ApacheDaemonNotRunning("Could not find Apache master process! Is it running?")
+    master = candidates[0]
+    logger.debug("Found Apache master process %i in %s.", master.pid, format_path(proc_root))
+    return [
+        p for pid, p in sorted(processes.items())
+        if p.ppid == master.pid and p.exe_path == master.exe_path
+    ]
+
+
+def interpolate(curve, x):
+    """
+    Linear interpolation along a curve.
+
+    :param curve: A list of tuples with two numbers each (sorted by the first number).
+    :param x: The number to look up.
+    :returns: The interpolated value (a float). Outside of the curve the value
+              of the nearest point is returned.
+    """
+    if x <= curve[0][0]:
+        return float(curve[0][1])
+    for (x1, y1), (x2, y2) in zip(curve, curve[1:]):
+        if x <= x2:
+            return y1 + (y2 - y1) * float(x - x1) / (x2 - x1)
+    return float(curve[-1][1])
+
+
+def outlier_threshold(values, factor, floor=0, ceiling=0):
+    """
+    Compute a threshold for unusually high values using the median absolute deviation.
+
+    :param values: A list of numbers.
+    :param factor: The number of median absolute deviations above the median
+                   that is considered unusual (a number).
+    :param floor: The lower bound of the threshold (a number, zero means no bound).
+    :param ceiling: The upper bound of the threshold (a number, zero means no bound).
+    :returns: The threshold (a number) or :data:`None` when the median
+              absolute deviation is zero.
+
+    The median and median absolute deviation are used instead of the mean and
+    standard deviation because they aren't skewed by the outliers that we're
+    trying to find. When at least half of the values are identical the median
+    absolute deviation is zero, which would make every value above the median
+    an outlier, so no threshold is returned in that case.
+    """
+    median = StatsList(values).median
+    deviation = StatsList(abs(v - median) for v in values).median
+    if not deviation:
+        return None
+    threshold = median + factor * deviation
+    if floor:
+        threshold = max(threshold, floor)
+    if ceiling:
+        threshold = min(threshold, ceiling)
+    return threshold
+
+
+def parse_threshold(option, value):
+    """
+    Parse the value of a threshold configuration option.
+
+    :param option: The name of the configuration option (one of the options
+                   in :data:`THRESHOLD_OPTIONS`).
+    :param value: The value of the configuration option (a string).
+    :returns: The parsed value (a number).
+    """
+    if option == 'max-cpu-percent':
+        return float(value.rstrip('%'))
+    elif option.startswith('max-memory-'):
+        return parse_size(value, binary=True)
+    else:
+        return parse_timespan(value)
+
+
+def parse_memory_budgets(value):
+    """
+    Parse a list of memory budgets.
+
+    :param value: A string with comma separated ``group:size`` pairs, for
+                  example ``native:2G, api:4G`` (the sizes are parsed using
+                  :func:`~humanfriendly.parse_size()`).
+    :returns: A dictionary that maps group names to numbers of bytes.
+    :raises: :exc:`~exceptions.ValueError` when the value can't be parsed.
+    """
+    budgets = {}
+    for item in value.split(','):
+        if item.strip():
+            group, _, size = item.rpartition(':')
+            if not group.strip():
+                raise ValueError("Memory budget doesn't specify a group! (%r)" % item)
+            try:
+                budgets[group.strip()] = parse_size(size.strip(), binary=True)
+            except InvalidSize:
+                raise ValueError("Failed to parse memory budget! (%r)" % item)
+    return budgets
+
+
+def parse_pressure_curve(value):
+    """
+    Parse a pressure curve (see :attr:`ApacheManager.pressure_curve`).
+
+    :param value: A string with comma separated ``percentage:factor`` pairs,
+                  for example ``50:1.5, 80:1, 95:0.5``.
+    :returns: A list of tuples with two floats each (sorted by percentage).
+    :raises: :exc:`~exceptions.ValueError` when the value can't be parsed.
+    """
+    curve = []
+    for item in value.split(','):
+        if item.strip():
+            level, _, scale = item.partition(':')
+            try:
+                curve.append((float(level.strip().rstrip('%')), float(scale)))
+            except ValueError:
+                raise ValueError("Failed to parse point of pressure curve! (%r)" % item)
+    levels = [level for level, scale in curve]
+    if len(set(levels)) != len(levels):
+        raise ValueError("Pressure curve contains duplicate points! (%r)" % value)
+    return sorted(curve)
+
+
+def read_cgroup_stats(directory):
+    """
+    Read the memory and CPU usage of a (version 2) control group.
+
+    :param directory: The pathname of the control group directory (a string).
+    :returns: A dictionary with the following keys, or :data:`None` when the
+              memory controller isn't available:
+
+              ``memory_current``
+                The memory usage in bytes (an integer).
+              ``memory_high``, ``memory_max``
+                The memory limits in bytes (integers or :data:`None` when
+                no limit is set).
+              ``memory_stat``, ``cpu_stat``
+                The key/value pairs in ``memory.stat`` and ``cpu.stat`` (dictionaries
+                with integer values, empty when not available).
+    """
+    def read_file(name):
+        with open(os.path.join(directory, name)) as handle:
+            return handle.read()
+
+    def read_limit(name):
+        try:
+            value = read_file(name).strip()
+            return None if value == 'max' else int(value)
+        except (EnvironmentError, ValueError):
+            return None
+
+    def read_pairs(name):
+        try:
+            return dict((k, int(v)) for k, v in (line.split() for line in read_file(name).splitlines() if line))
+        except (EnvironmentError, ValueError):
+            return {}
+
+    try:
+        memory_current = int(read_file('memory.current'))
+    except (EnvironmentError, ValueError):
+        return None
+    return dict(
+        memory_current=memory_current,
+        memory_high=read_limit('memory.high'),
+        memory_max=read_limit('memory.max'),
+        memory_stat=read_pairs('memory.stat'),
+        cpu_stat=read_pairs('cpu.stat'),
+    )
+
+
+def read_meminfo(filename):
+    """
+    Read the memory usage of the host.
+
+    :param filename: The pathname of the ``meminfo`` file (a string).
+    :returns: A dictionary that maps field names (like ``MemTotal`` and
+              ``MemAvailable``) to numbers of bytes, or :data:`None` when the
+              file can't be read.
+    """
+    try:
+        info = {}
+        with open(filename) as handle:
+            for line in handle:
+                name, _, value = line.partition(':')
+                tokens = value.split()
+                if tokens and tokens[0].isdigit():
+                    multiplier = 1024 if tokens[1:] == ['kB'] else 1
+                    info[name.strip()] = int(tokens[0]) * multiplier
+        return info
+    except EnvironmentError:
+        return None
+
+
+def read_pressure(filename):
+    """
+    Read pressure stall information (see the kernel's ``Documentation/accounting/psi.rst``).
+
+    :param filename: The pathname of the pressure file, for example
+                     ``/proc/pressure/memory`` (a string).
+    :returns: A dictionary with the keys ``some`` and ``full``, whose values
+              are dictionaries with the keys ``avg10``, ``avg60``,
+              ``avg300`` (percentages) and ``total`` (microseconds), or
+              :data:`None` when the file can't be read.
+    """
+    try:
+        pressure = {}
+        with open(filename) as handle:
+            for line in handle:
+                tokens = line.split()
+                if tokens:
+                    pressure[tokens[0]] = dict(
+                        (name, int(value) if name == 'total' else float(value))
+                        for name, _, value in (t.partition('=') for t in tokens[1:])
+                    )
+        # The "full" line was added in Linux 5.2 (memory pressure only).
+        pressure.setdefault('full', dict(avg10=0.0, avg60=0.0, avg300=0.0, total=0))
+        return pressure if 'some' in pressure else None
+    except (EnvironmentError, ValueError):
+        return None
+
+
+def read_memory_info(directory):
+    """
+    Read the memory usage details of a process.
+
+    :param directory: The absolute pathname of the numerical subdirectory of
+                      ``/proc`` that describes the process (a string).
+    :returns: A dictionary with the keys given by :data:`MEMORY_METRICS` and
+              the values in bytes (integers), or :data:`None` when the
+              details can't be read (e.g. because the process disappeared or
+              due to missing privileges).
+
+    Reads ``smaps_rollup`` (available since Linux 4.14) which is cheap
+    because the kernel sums up the memory mappings of the process. On older
+    kernels the (much larger) ``smaps`` file is summed up instead.
+    """
+    fields = dict(Rss=0, Pss=0, Private_Clean=0, Private_Dirty=0, Swap=0)
+    for filename in 'smaps_rollup', 'smaps':
+        try:
+            with open(os.path.join(directory, filename)) as handle:
+                for line in handle:
+                    name, _, value = line.partition(':')
+                    if name in fields:
+                        fields[name] += int(value.split()[0]) * 1024
+            return dict(
+                rss=fields['Rss'],
+                pss=fields['Pss'],
+                uss=fields['Private_Clean'] + fields['Private_Dirty'],
+                swap=fields['Swap'],
+            )
+        except (IOError, OSError) as e:
+            # Try the next file if smaps_rollup doesn't exist.
+            if getattr(e, 'errno', None) != errno.ENOENT or filename == 'smaps':
+                logger.debug("Failed to read %s of %s! (%s)", filename, directory, e)
+                return None
+
+
 def parse_status_table(table):
     """Parse one of the status tables from Apache's HTML status page."""
-    headings = dict((i, generate_slug(coerce_tag(th))) for i, th in enumerate(table.findAll('th')))
+    headings = dict((i, generate_slug(coerce_tag(th))) for i, th in enumerate(table.find_all('th')))
     logger.debug("Parsed table headings: %r", headings)
-    for tr in table.findAll('tr'):
-        values_by_index = [coerce_tag(td) for td in tr.findAll('td')]
+    for tr in table.find_all('tr'):
+        values_by_index = [coerce_tag(td) for td in tr.find_all('td')]
         logger.debug("Parsed values by index: %r", values_by_index)
         if values_by_index:
             # Ignore exceptions during coercion.
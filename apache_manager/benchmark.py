@@ -0,0 +1,425 @@
+# Monitor and control Apache web server workers from Python.
+#
+# Author: Peter Odding <peter@peterodding.com>
+# Last Change: October 18, 2026
+# URL: https://apache-manager.readthedocs.io
+
+"""
+Usage: python -m apache_manager.benchmark [OPTIONS]
+
+Measure the performance of the Apache manager on synthetic status pages and
+``/proc`` trees (from 100 up to 50,000 worker slots) and report the results
+as JSON, so that the results of different releases can be compared.
+
+The following benchmarks are run for each size and layout:
+
+``parse-slots``
+  Parsing the HTML status page (see :attr:`.ApacheManager.slots`).
+
+``server-metrics``
+  Parsing the plain text status page (see :attr:`.ApacheManager.server_metrics`).
+
+``kill-workers``
+  Evaluating the kill policy (see :func:`.ApacheManager.kill_workers()`,
+  which runs in dry run mode on already parsed inputs).
+
+``proc-scan``
+  Finding the workers in a synthetic ``/proc`` tree and reading their memory
+  usage details (see :attr:`.ApacheManager.proc_root` and
+  :func:`scan_proc_tree()`).
+
+``collection``
+  The end-to-end latency of a monitoring cycle: Parsing both status pages,
+  computing memory usage and evaluating the kill policy.
+
+For each benchmark the fastest of several repetitions and the peak memory
+allocated by Python (when :mod:`tracemalloc` is available) are reported.
+
+Supported options:
+
+  -s, --sizes=LIST
+
+    The comma separated numbers of worker slots to benchmark
+    (defaults to 100,1000,10000,50000).
+
+  -l, --layouts=LIST
+
+    The comma separated status page layouts to benchmark, `prefork' (one
+    process per slot) and/or `threaded' (several slots per process, like
+    the worker and event MPMs). Defaults to both.
+
+  -r, --repeat=COUNT
+
+    The number of times each benchmark is repeated (defaults to 3).
+
+  -o, --output=FILE
+
+    Write the results to FILE instead of standard output.
+
+  -h, --help
+
+    Show this message and exit.
+"""
+
+# Standard library modules.
+import getopt
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+# External dependencies.
+import coloredlogs
+from humanfriendly import Timer, format_size, format_timespan
+from humanfriendly.terminal import output, usage, warning
+from verboselogs import VerboseLogger
+
+# Modules included in our package.
+from apache_manager import STATUS_COLUMNS, ApacheManager, __version__
+from apache_manager.replay import ReplayManager
+
+# Optional dependencies (tracemalloc is available on Python 3.4+).
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+# Public identifiers that require documentation.
+__all__ = (
+    'BENCHMARK_LAYOUTS',
+    'BENCHMARK_SIZES',
+    'THREADS_PER_CHILD',
+    'WORKER_STATES',
+    'generate_proc_tree',
+    'generate_snapshot',
+    'generate_status_pages',
+    'logger',
+    'main',
+    'measure',
+    'run_benchmarks',
+    'scan_proc_tree',
+)
+
+BENCHMARK_LAYOUTS = ('prefork', 'threaded')
+"""The default status page layouts to benchmark (a tuple of strings)."""
+
+BENCHMARK_SIZES = (100, 1000, 10000, 50000)
+"""The default numbers of worker slots to benchmark (a tuple of integers)."""
+
+THREADS_PER_CHILD = 25
+"""The number of slots per process in the ``threaded`` layout (an integer, Apache's default)."""
+
+WORKER_STATES = 'WWW___KR.'
+"""
+The default mix of worker states on generated status pages (a string).
+
+Each character is a mode from the scoreboard key of Apache's status page,
+every slot gets a random character from this string (so repeating a character
+makes that mode more likely).
+"""
+
+# Initialize a logger for this module.
+logger = VerboseLogger(__name__)
+
+
+def main():
+    """Command line interface for ``python -m apache_manager.benchmark``."""
+    coloredlogs.install()
+    # Silence the log messages of the code being benchmarked.
+    logging.getLogger('apache_manager').setLevel(logging.WARNING)
+    logger.setLevel(logging.INFO)
+    sizes = BENCHMARK_SIZES
+    layouts = BENCHMARK_LAYOUTS
+    repeat = 3
+    output_file = None
+    try:
+        options, arguments = getopt.getopt(sys.argv[1:], 's:l:r:o:h', [
+            'sizes=', 'layouts=', 'repeat=', 'output=', 'help',
+        ])
+        for option, value in options:
+            if option in ('-s', '--sizes'):
+                sizes = [int(v) for v in value.split(',')]
+            elif option in ('-l', '--layouts'):
+                layouts = [v.strip() for v in value.split(',')]
+                for layout in layouts:
+                    if layout not in BENCHMARK_LAYOUTS:
+                        raise Exception("Unsupported layout %r" % layout)
+            elif option in ('-r', '--repeat'):
+                repeat = int(value)
+            elif option in ('-o', '--output'):
+                output_file = value
+            elif option in ('-h', '--help'):
+                usage(__doc__)
+                return
+        if arguments:
+            raise Exception("This program doesn't support any positional arguments")
+    except Exception as e:
+        warning("Error: %s!", e)
+        sys.exit(1)
+    results = dict(
+        version=__version__,
+        python=platform.python_version(),
+        timestamp=int(time.time()),
+        results=run_benchmarks(sizes, layouts, repeat),
+    )
+    encoded = json.dumps(results, indent=2, sort_keys=True)
+    if output_file:
+        with open(output_file, 'w') as handle:
+            handle.write(encoded + '\n')
+    else:
+        output(encoded)
+
+
+def run_benchmarks(sizes=BENCHMARK_SIZES, layouts=BENCHMARK_LAYOUTS, repeat=3):
+    """
+    Run the benchmarks.
+
+    :param sizes: An iterable of numbers of worker slots (integers).
+    :param layouts: An iterable of status page layouts (see :data:`BENCHMARK_LAYOUTS`).
+    :param repeat: The number of times each benchmark is repeated (an integer).
+    :returns: A list of dictionaries with the keys ``benchmark``, ``layout``,
+              ``slots``, ``seconds`` and ``peak_memory`` (the latter is
+              :data:`None` when :mod:`tracemalloc` isn't available).
+    """
+    results = []
+    for layout in layouts:
+        for size in sizes:
+            snapshot = generate_snapshot(size, layout)
+            proc_root = tempfile.mkdtemp(prefix='apache-manager-benchmark-')
+            try:
+                generate_proc_tree(proc_root, snapshot['processes'])
+
+                def parse_slots():
+                    return ReplayManager(snapshot=snapshot).slots
+
+                def server_metrics():
+                    return ReplayManager(snapshot=snapshot).server_metrics
+
+                def collection():
+                    manager = ReplayManager(snapshot=snapshot)
+                    manager.server_metrics
+                    manager.memory_usage
+                    manager.wsgi_process_groups
+                    return manager.kill_workers(dry_run=True)
+
+                # Evaluate the kill policy on parsed inputs.
+                manager = ReplayManager(snapshot=snapshot, max_memory_idle=1024 * 1024 * 50)
+                manager.slots
+                manager.combined_memory_usage
+
+                def kill_workers():
+                    manager.deferred_kills.clear()
+                    return manager.kill_workers(dry_run=True)
+
+                for name, function in (('parse-slots', parse_slots),
+                                       ('server-metrics', server_metrics),
+                                       ('kill-workers', kill_workers),
+                                       ('proc-scan', lambda: scan_proc_tree(proc_root)),
+                                       ('collection', collection)):
+                    seconds, peak_memory = measure(function, repeat)
+                    logger.info("Benchmark %s (%s, %i slots) took %s (peak memory %s).",
+                                name, layout, size, format_timespan(seconds, detailed=True),
+                                format_size(peak_memory) if peak_memory is not None else 'unknown')
+                    results.append(dict(
+                        benchmark=name,
+                        layout=layout,
+                        slots=size,
+                        seconds=seconds,
+                        peak_memory=peak_memory,
+                    ))
+            finally:
+                shutil.rmtree(proc_root)
+    return results
+
+
+def measure(function, repeat=3):
+    """
+    Measure the time and memory used by a function.
+
+    :param function: The function to call (without arguments).
+    :param repeat: The number of times to call the function (an integer).
+    :returns: A tuple with two values: The lowest number of seconds that a
+              call took (a float) and the peak memory in bytes allocated by
+              Python during the last call (an integer or :data:`None` when
+              :mod:`tracemalloc` isn't available).
+    """
+    timings = []
+    for i in range(repeat):
+        timer = Timer()
+        function()
+        timings.append(timer.elapsed_time)
+    peak_memory = None
+    # Memory is measured in a separate call because tracing allocations
+    # makes them (a lot) slower.
+    if tracemalloc:
+        tracemalloc.start()
+        try:
+            function()
+            peak_memory = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return min(timings), peak_memory
+
+
+def generate_status_pages(slots, layout='prefork', seed=42, states=WORKER_STATES):
+    """
+    Generate synthetic Apache status pages.
+
+    :param slots: The number of worker slots (an integer).
+    :param layout: One of the strings ``prefork`` (one process per slot) or
+                   ``threaded`` (:data:`THREADS_PER_CHILD` slots per process).
+    :param seed: The seed of the random number generator (so that the pages
+                 are the same for every run).
+    :param states: The mix of worker states (a string, defaults to
+                   :data:`WORKER_STATES`).
+    :returns: A tuple with three values: The HTML status page (a string), the
+              plain text status page (a string) and the process IDs of the
+              workers (a sorted list of integers).
+    """
+    rng = random.Random(seed)
+    threads = THREADS_PER_CHILD if layout == 'threaded' else 1
+    rows = []
+    scoreboard = []
+    pids = set()
+    busy = idle = 0
+    for slot in range(slots):
+        child, thread = divmod(slot, threads)
+        pid = 10000 + child
+        mode = rng.choice(states)
+        scoreboard.append(mode)
+        if mode == '.':
+            cells = ['%i-%i' % (child, thread), '-', '0/0/0', '.', '0.00', '0', '0', '0.0', '0.00', '0.00', '', '', '']
+        else:
+            pids.add(pid)
+            if mode == '_':
+                idle += 1
+            else:
+                busy += 1
+            cells = [
+                '%i-%i' % (child, thread), str(pid), '%i/%i/%i' % (rng.randint(0, 9), rng.randint(0, 99), 999),
+                mode, '%.2f' % rng.random(), str(rng.randint(0, 600)), str(rng.randint(0, 5000)),
+                '0.0', '0.01', '0.10', '10.0.%i.%i' % (rng.randint(0, 255), rng.randint(1, 254)),
+                'www%i.example.com' % rng.randint(1, 9), 'GET /page/%i HTTP/1.1' % rng.randint(1, 100000),
+            ]
+        rows.append('<tr>%s</tr>' % ''.join('<td>%s</td>' % c for c in cells))
+    html = '<html><body><table border="0"><tr>%s</tr>\n%s\n</table></body></html>' % (
+        ''.join('<th>%s</th>' % c for c in STATUS_COLUMNS),
+        '\n'.join(rows),
+    )
+    text = '\n'.join([
+        'Total Accesses: %i' % (slots * 1000),
+        'Total kBytes: %i' % (slots * 5000),
+        'CPULoad: .5',
+        'Uptime: 86400',
+        'ReqPerSec: %i' % slots,
+        'BytesPerSec: 1024',
+        'BytesPerReq: 2048',
+        'BusyWorkers: %i' % busy,
+        'IdleWorkers: %i' % idle,
+        'Scoreboard: %s' % ''.join(scoreboard),
+    ])
+    return html, text, sorted(pids)
+
+
+def generate_snapshot(slots, layout='prefork', seed=42):
+    """
+    Generate a synthetic snapshot for :class:`~apache_manager.replay.ReplayManager`.
+
+    :param slots: The number of worker slots (an integer).
+    :param layout: Refer to :func:`generate_status_pages()`.
+    :param seed: Refer to :func:`generate_status_pages()`.
+    :returns: A dictionary in the format of :func:`~apache_manager.replay.capture_snapshot()`.
+
+    Besides the native workers on the status page one WSGI daemon process is
+    added for every hundred slots (divided over four process groups).
+    """
+    rng = random.Random(seed)
+    html, text, pids = generate_status_pages(slots, layout, seed)
+    processes = []
+    for pid in pids:
+        processes.append(dict(
+            pid=pid, ppid=1000, rss=rng.randint(10, 100) * 1024 * 1024, starttime=1583000000.0,
+            cmdline=['/usr/sbin/apache2', '-k', 'start'], wsgi_process_group='',
+            cpu_time=rng.random() * 100, start_ticks=rng.randint(1000, 100000),
+        ))
+    for i in range(max(1, slots // 100)):
+        group = 'app%i' % (i % 4)
+        processes.append(dict(
+            pid=100000 + i, ppid=1000, rss=rng.randint(100, 500) * 1024 * 1024, starttime=1583000000.0,
+            cmdline=['(wsgi:%s)' % group, '-k', 'start'], wsgi_process_group=group,
+            cpu_time=rng.random() * 100, start_ticks=rng.randint(1000, 100000),
+        ))
+    return dict(
+        timestamp=1583020800,
+        listen_addresses=[dict(protocol='http', address='127.0.0.1', port=80)],
+        text_status=text,
+        html_status=html,
+        processes=processes,
+    )
+
+
+def generate_proc_tree(directory, processes):
+    """
+    Generate a synthetic ``/proc`` tree.
+
+    :param directory: The pathname of the directory in which to create the
+                      numerical subdirectories (a string).
+    :param processes: A list of dictionaries like the ``processes`` in
+                      :func:`generate_snapshot()`.
+
+    Each process gets ``stat``, ``cmdline`` and ``smaps_rollup`` files whose
+    contents match the process information. A master process is added for
+    each parent process ID that isn't included in `processes`.
+    """
+    known = set(p['pid'] for p in processes)
+    masters = [
+        dict(pid=ppid, ppid=1, rss=10 * 1024 * 1024, cmdline=['/usr/sbin/apache2', '-k', 'start'],
+             cpu_time=0, start_ticks=0)
+        for ppid in sorted(set(p['ppid'] for p in processes) - known)
+    ]
+    for process in masters + list(processes):
+        subdirectory = os.path.join(directory, str(process['pid']))
+        os.mkdir(subdirectory)
+        ticks = int(process['cpu_time'] * 100)
+        pages = process['rss'] // 4096
+        fields = [str(process['pid']), '(apache2)', 'S', str(process['ppid'])]
+        fields.extend(['0'] * 9)
+        fields.extend([str(ticks // 2), str(ticks - ticks // 2)])
+        fields.extend(['0'] * 6)
+        fields.extend([str(process['start_ticks']), str(process['rss'] * 2), str(pages)])
+        fields.extend(['0'] * 28)
+        with open(os.path.join(subdirectory, 'stat'), 'w') as handle:
+            handle.write(' '.join(fields) + '\n')
+        with open(os.path.join(subdirectory, 'cmdline'), 'w') as handle:
+            handle.write('\0'.join(process['cmdline']) + '\0')
+        kilobytes = process['rss'] // 1024
+        with open(os.path.join(subdirectory, 'smaps_rollup'), 'w') as handle:
+            handle.write('Rss: %i kB\nPss: %i kB\nPrivate_Clean: 0 kB\nPrivate_Dirty: %i kB\nSwap: 0 kB\n' % (
+                kilobytes, kilobytes // 2, kilobytes // 4,
+            ))
+
+
+def scan_proc_tree(directory):
+    """
+    Find the Apache workers in a (synthetic) ``/proc`` tree and compute their memory usage.
+
+    :param directory: The pathname of the ``/proc`` tree (a string).
+    :returns: An :class:`.ApacheManager` object whose
+              :attr:`~.ApacheManager.combined_memory_usage` has been computed.
+
+    The memory usage is measured using the ``pss`` metric so that the
+    ``smaps_rollup`` file of every worker is read (besides the ``stat`` and
+    ``cmdline`` files that are needed to find the workers).
+    """
+    manager = ApacheManager(proc_root=directory, memory_metric='pss')
+    manager.combined_memory_usage
+    return manager
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,219 @@
+# Monitor and control Apache web server workers from Python.
+#
+# Author: Peter Odding <peter@peterodding.com>
+# Last Change: October 18, 2026
+# URL: https://apache-manager.readthedocs.io
+
+"""
+Persistent cache of configuration and discovery results.
+
+When the Apache manager is run from cron (or by a monitoring agent) every
+invocation starts from scratch: The configuration files are loaded and the
+Apache configuration is parsed to discover where Apache is listening. The
+:mod:`~apache_manager.cache` module avoids this work by storing the results
+in a small JSON file (see :class:`DiscoveryCache`).
+
+Each cached value records the files (and directories) it was derived from,
+together with their inode number, size and modification times (see
+:func:`fingerprint_files()`). A cached value is only used when all of these
+are unchanged, so validating the cache takes a handful of :func:`os.stat()`
+calls and changes to the configuration are picked up automatically.
+Directories are included so that adding or removing a file in a
+configuration directory also invalidates the cache.
+"""
+
+# Standard library modules.
+import glob
+import json
+import os
+import tempfile
+
+# External dependencies.
+from humanfriendly import format_path, parse_path, pluralize
+from property_manager import PropertyManager, lazy_property, required_property, writable_property
+from verboselogs import VerboseLogger
+
+# Public identifiers that require documentation.
+__all__ = (
+    'CACHE_FILE',
+    'CACHE_FORMAT',
+    'DiscoveryCache',
+    'find_sources',
+    'fingerprint_files',
+    'get_fingerprint',
+    'logger',
+)
+
+CACHE_FILE = os.path.join(os.environ.get('XDG_CACHE_HOME', '~/.cache'), 'apache-manager', 'discovery.json')
+"""The default pathname of the cache file used by the command line interface (a string)."""
+
+CACHE_FORMAT = 3
+"""
+The version of the layout of cached values (an integer).
+
+Cache files written with another version are ignored, so this needs to be
+incremented whenever the structure of a cached value changes.
+"""
+
+# Initialize a logger for this module.
+logger = VerboseLogger(__name__)
+
+
+class DiscoveryCache(PropertyManager):
+
+    """A JSON file with cached values that are validated by the fingerprints of their source files."""
+
+    @required_property
+    def filename(self):
+        """The pathname of the cache file (a string, ``~`` is expanded)."""
+
+    @writable_property
+    def hits(self):
+        """The number of successful lookups by :func:`get()` (an integer)."""
+        return 0
+
+    @writable_property
+    def misses(self):
+        """The number of failed lookups by :func:`get()` (an integer)."""
+        return 0
+
+    @lazy_property
+    def entries(self):
+        """
+        The cached entries (a dictionary).
+
+        The cache file is loaded on first access. When it doesn't exist, can't
+        be parsed or was written using another :data:`CACHE_FORMAT` an empty
+        dictionary is used.
+        """
+        pathname = parse_path(self.filename)
+        try:
+            with open(pathname) as handle:
+                contents = json.load(handle)
+            if contents.get('format') == CACHE_FORMAT:
+                return contents['entries']
+            logger.debug("Ignoring cache file %s in another format.", format_path(pathname))
+        except Exception as e:
+            if os.path.exists(pathname):
+                logger.warning("Ignoring invalid cache file %s! (%s)", format_path(pathname), e)
+        return {}
+
+    def get(self, name, key=None):
+        """
+        Get a cached value.
+
+        :param name: The name of the entry (a string).
+        :param key: A value that must match the `key` given to :func:`set()`
+                    (e.g. the pathname of a configuration file). Must be
+                    serializable to JSON.
+        :returns: The cached value or :data:`None` when the entry doesn't
+                  exist, was stored with another `key` or any of its source
+                  files has changed.
+        """
+        entry = self.entries.get(name)
+        if entry and entry['key'] == key:
+            if fingerprint_files(entry['sources']) == entry['sources']:
+                logger.debug("Using cached %s (validated %s).", name, pluralize(len(entry['sources']), "source"))
+                self.hits += 1
+                return entry['value']
+            logger.verbose("Discarding cached %s because its sources changed.", name)
+        self.misses += 1
+        return None
+
+    def delete(self, name, value=None):
+        """
+        Remove an entry from the cache (and save the cache file).
+
+        :param name: The name of the entry (a string).
+        :param value: If this is given the entry is only removed when it
+                      contains this value.
+        """
+        entry = self.entries.get(name)
+        if entry and (value is None or entry['value'] == value):
+            logger.verbose("Removing %s from cache.", name)
+            del self.entries[name]
+            self.save()
+
+    def save(self):
+        """
+        Save :attr:`entries` to :attr:`filename`.
+
+        The file is written atomically (a temporary file is renamed) so
+        that concurrent runs never see a partially written cache. Failing to
+        write the cache is logged but doesn't raise an exception.
+        """
+        pathname = parse_path(self.filename)
+        directory = os.path.dirname(pathname) or '.'
+        try:
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            fd, temporary_file = tempfile.mkstemp(dir=directory, prefix='.discovery-')
+            with os.fdopen(fd, 'w') as handle:
+                json.dump(dict(format=CACHE_FORMAT, entries=self.entries), handle)
+            os.rename(temporary_file, pathname)
+            logger.debug("Saved cache file %s.", format_path(pathname))
+        except Exception as e:
+            logger.warning("Failed to save cache file %s! (%s)", format_path(pathname), e)
+
+    def set(self, name, value, sources, key=None):
+        """
+        Store a value in the cache and save the cache file.
+
+        :param name: The name of the entry (a string).
+        :param value: The value to store (must be serializable to JSON).
+        :param sources: The result of :func:`fingerprint_files()` for the
+                        files that `value` was derived from. The fingerprints
+                        should be taken *before* the files are read, so that
+                        concurrent changes invalidate the entry.
+        :param key: Refer to :func:`get()`.
+        """
+        self.entries[name] = dict(key=key, sources=sources, value=value)
+        self.save()
+
+
+def find_sources(patterns):
+    """
+    Find the files and directories that :func:`glob.glob()` depends on.
+
+    :param patterns: An iterable of pathnames and/or filename patterns.
+    :returns: A list of pathnames: Each pathname without wildcards is
+              included as is (whether it exists or not), for patterns the
+              directory that's searched as well as the matching files are
+              included.
+    """
+    sources = []
+    for pattern in patterns:
+        if glob.has_magic(pattern):
+            sources.append(os.path.dirname(pattern))
+            sources.extend(sorted(glob.glob(pattern)))
+        else:
+            sources.append(pattern)
+    return sources
+
+
+def fingerprint_files(pathnames):
+    """
+    Get the fingerprints of files and directories.
+
+    :param pathnames: An iterable of pathnames.
+    :returns: A dictionary that maps pathnames to the results of
+              :func:`get_fingerprint()`.
+    """
+    return dict((pathname, get_fingerprint(pathname)) for pathname in pathnames)
+
+
+def get_fingerprint(pathname):
+    """
+    Get a fingerprint of a file or directory that changes when it's modified.
+
+    :param pathname: The pathname of a file or directory (a string).
+    :returns: A list with the inode number, size, modification time and
+              status change time or :data:`None` when the pathname doesn't
+              exist. A list is used so that fingerprints can be compared to
+              fingerprints that were loaded from JSON.
+    """
+    try:
+        info = os.stat(pathname)
+        return [info.st_ino, info.st_size, info.st_mtime, info.st_ctime]
+    except OSError:
+        return None
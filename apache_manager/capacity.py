@@ -0,0 +1,241 @@
+# Monitor and control Apache web server workers from Python.
+#
+# Author: Peter Odding <peter@peterodding.com>
+# Last Change: October 18, 2026
+# URL: https://apache-manager.readthedocs.io
+
+"""
+Capacity planning for Apache workers and WSGI daemon processes.
+
+The :mod:`~apache_manager.capacity` module helps to size ``MaxRequestWorkers``,
+``ServerLimit`` and the ``processes=`` option of mod_wsgi daemon process
+groups. It combines the following inputs:
+
+- The memory usage of the workers in each group. The 95th percentile is used
+  instead of the average because a few large workers can exhaust the memory of
+  the host while the average still looks reasonable.
+
+- The amount of memory installed in the host (see
+  :attr:`.ApacheManager.system_memory`) and a target amount of headroom that
+  should remain available for the page cache and other processes.
+
+- The number of worker slots on the Apache status page (see
+  :attr:`.ApacheManager.slots`) and the peak number of busy workers, taken
+  from the metric history when it's enabled (see
+  :attr:`.ApacheManager.history`).
+
+For each group the maximum number of processes is calculated that fits in the
+memory budget while the other groups keep their current number of processes.
+"""
+
+# Standard library modules.
+import collections
+import math
+
+# External dependencies.
+from humanfriendly import format_size, pluralize
+from humanfriendly.tables import format_pretty_table
+from property_manager import PropertyManager, required_property
+from verboselogs import VerboseLogger
+
+# Modules included in our package.
+from apache_manager import NATIVE_WORKERS_LABEL
+
+# Public identifiers that require documentation.
+__all__ = (
+    'CAPACITY_HEADROOM',
+    'CAPACITY_PERCENTILE',
+    'CapacityReport',
+    'GroupCapacity',
+    'format_capacity_report',
+    'logger',
+    'percentile',
+    'plan_capacity',
+)
+
+CAPACITY_HEADROOM = 20
+"""The default percentage of host memory that :func:`plan_capacity()` keeps available (a number)."""
+
+CAPACITY_PERCENTILE = 95
+"""The percentile of the memory usage of workers used by :func:`plan_capacity()` (a number)."""
+
+# Initialize a logger for this module.
+logger = VerboseLogger(__name__)
+
+GroupCapacity = collections.namedtuple('GroupCapacity', 'name, count, memory_usage, recommended')
+"""
+The capacity of a group of workers (a named tuple).
+
+The fields are the name of the group, the current number of processes, the
+memory usage per process (according to :data:`CAPACITY_PERCENTILE`) and the
+recommended maximum number of processes.
+"""
+
+
+class CapacityReport(PropertyManager):
+
+    """The outcome of :func:`plan_capacity()`."""
+
+    @required_property
+    def busy_workers(self):
+        """The observed numbers of busy workers (a list of integers, at least one)."""
+
+    @required_property
+    def groups(self):
+        """The capacity of each group of workers (a list of :data:`GroupCapacity` tuples)."""
+
+    @required_property
+    def headroom(self):
+        """The percentage of host memory that should remain available (a number)."""
+
+    @required_property
+    def memory_total(self):
+        """The amount of memory installed in the host in bytes (an integer)."""
+
+    @required_property
+    def slots(self):
+        """The number of worker slots on the Apache status page (an integer)."""
+
+    @required_property
+    def threads_per_process(self):
+        """The number of worker slots per native Apache process (an integer, 1 for the prefork MPM)."""
+
+    @property
+    def max_request_workers(self):
+        """The recommended value of ``MaxRequestWorkers`` (an integer)."""
+        return self.groups[0].recommended * self.threads_per_process
+
+    @property
+    def memory_budget(self):
+        """The amount of memory that the workers are allowed to use in bytes (an integer)."""
+        return int(self.memory_total * (100 - self.headroom) / 100.0)
+
+    @property
+    def memory_required(self):
+        """The memory needed by the current number of processes in bytes (an integer)."""
+        return sum(g.count * g.memory_usage for g in self.groups)
+
+    @property
+    def peak_busy_workers(self):
+        """The highest observed number of busy workers (an integer)."""
+        return max(self.busy_workers)
+
+    @property
+    def slot_utilization(self):
+        """The peak number of busy workers as a percentage of :attr:`slots` (a float)."""
+        return self.peak_busy_workers * 100.0 / self.slots if self.slots else 0.0
+
+
+def percentile(values, percent):
+    """
+    Get a percentile of a list of numbers (using the nearest rank method).
+
+    :param values: A list of numbers.
+    :param percent: The percentile to get (a number between 0 and 100).
+    :returns: The value at the given percentile (a number) or zero when
+              `values` is empty.
+    """
+    if not values:
+        return 0
+    ordered = sorted(values)
+    rank = int(math.ceil(percent / 100.0 * len(ordered)))
+    return ordered[max(0, rank - 1)]
+
+
+def plan_capacity(manager, headroom=CAPACITY_HEADROOM, since=None, until=None):
+    """
+    Recommend the maximum number of processes for each group of workers.
+
+    :param manager: An :class:`.ApacheManager` object.
+    :param headroom: The percentage of host memory that should remain
+                     available (a number, defaults to :data:`CAPACITY_HEADROOM`).
+    :param since: The start of the time range of the metric history used to
+                  find the peak number of busy workers (a number or
+                  :data:`None`).
+    :param until: The end of the time range (a number or :data:`None`). When
+                  this is given the current number of busy workers isn't
+                  included in the peak (because the time range ends in the
+                  past), unless the metric history has no samples in the
+                  time range.
+    :returns: A :class:`CapacityReport` object.
+    :raises: :exc:`~exceptions.Exception` when the amount of memory installed
+             in the host is unknown.
+    """
+    memory_total = (manager.system_memory or {}).get('MemTotal')
+    if not memory_total:
+        raise Exception("Failed to determine the amount of memory installed in the host!")
+    # Find the number of processes and their memory usage per group.
+    usage = dict(manager.wsgi_process_groups)
+    usage[NATIVE_WORKERS_LABEL] = manager.memory_usage
+    names = [NATIVE_WORKERS_LABEL] + sorted(manager.wsgi_process_groups)
+    current = dict((name, (len(usage[name]), percentile(usage[name], CAPACITY_PERCENTILE))) for name in names)
+    # Find the number of processes per group that fits in the budget.
+    budget = int(memory_total * (100 - headroom) / 100.0)
+    groups = []
+    for name in names:
+        count, memory_usage = current[name]
+        others = sum(c * m for n, (c, m) in current.items() if n != name)
+        recommended = max(0, (budget - others) // memory_usage) if memory_usage else 0
+        groups.append(GroupCapacity(name=name, count=count, memory_usage=memory_usage, recommended=recommended))
+    # Threaded MPMs have several slots per process.
+    pids = set(w.pid for w in manager.workers)
+    threads_per_process = max(1, len(manager.workers) // len(pids)) if pids else 1
+    # Find the peak concurrency in the metric history.
+    busy_workers = [manager.server_metrics['busy_workers']] if until is None else []
+    if manager.history:
+        busy_workers.extend(
+            int(value) for timestamp, value in manager.history.query('busy-workers', since, until)
+            if not math.isnan(value)
+        )
+    if not busy_workers:
+        logger.warning("No busy workers recorded in the metric history, using the current number of busy workers.")
+        busy_workers.append(manager.server_metrics['busy_workers'])
+    logger.verbose("Found peak concurrency of %i in %s.",
+                   max(busy_workers), pluralize(len(busy_workers), "sample"))
+    return CapacityReport(
+        busy_workers=busy_workers,
+        groups=groups,
+        headroom=headroom,
+        memory_total=memory_total,
+        slots=len(manager.slots),
+        threads_per_process=threads_per_process,
+    )
+
+
+def format_capacity_report(report):
+    """Render a :class:`CapacityReport` as text (a list of strings)."""
+    lines = [
+        "Host memory: %s, budget for workers: %s (%g%% headroom), currently needed: %s." % (
+            format_size(report.memory_total, binary=True),
+            format_size(report.memory_budget, binary=True),
+            report.headroom,
+            format_size(report.memory_required, binary=True),
+        ),
+        "",
+    ]
+    rows = []
+    for group in report.groups:
+        rows.append([
+            group.name,
+            group.count,
+            format_size(group.memory_usage, binary=True),
+            group.recommended,
+        ])
+    lines.append(format_pretty_table(rows, [
+        'Group', 'Processes', 'Memory (p%i)' % CAPACITY_PERCENTILE, 'Max processes',
+    ]))
+    lines.append("")
+    lines.append("Peak concurrency: %i of %s busy (%.1f%% utilization, %s spare)." % (
+        report.peak_busy_workers,
+        pluralize(report.slots, "slot"),
+        report.slot_utilization,
+        pluralize(max(0, report.slots - report.peak_busy_workers), "slot"),
+    ))
+    if report.max_request_workers < report.slots:
+        lines.append("Warning: The %s can't all be used without exceeding the memory budget "
+                     "(consider lowering MaxRequestWorkers to %i)." % (
+                         pluralize(report.slots, "slot"), report.max_request_workers))
+    if report.peak_busy_workers >= report.slots * 0.9:
+        lines.append("Warning: The peak concurrency is close to the number of slots "
+                     "(consider raising MaxRequestWorkers).")
+    return lines
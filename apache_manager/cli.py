@@ -1,7 +1,7 @@
 # Monitor and control Apache web server workers from Python.
 #
 # Author: Peter Odding <peter@peterodding.com>
-# Last Change: February 27, 2020
+# Last Change: October 18, 2026
 # URL: https://apache-manager.readthedocs.io
 
 """
@@ -22,14 +22,41 @@ Supported options:
 
     Kill Apache workers exceeding the thresholds given by --max-memory-active,
     --max-memory-idle and --max-time. These thresholds can also be defined in
-    configuration files, please refer to the online documentation for details.
-    See also the --dry-run option.
+    configuration files (globally as well as per WSGI process group), please
+    refer to the online documentation for details. The log messages about
+    killed workers include the rule that was applied. See also the --dry-run
+    option.
 
   -w, --watch
 
-    This option causes the Apache manager to redraw the collected metrics once
-    every 10 seconds in a `top' like interface until interrupted using `q' (for
-    quite) or Control-C.
+    This option causes the Apache manager to redraw the collected metrics in a
+    `top' like interface until interrupted using `q' (for quit) or Control-C.
+    Sparklines next to the summary show the recent trend of key metrics.
+    Metrics are collected in the background every 10 seconds (see --interval)
+    or immediately when `r' is pressed. Press `w' to switch to a table of
+    workers that can be sorted (using P, G, T, C, M and R) and scrolled, where
+    the workers targeted by the kill thresholds are highlighted.
+
+  -d, --daemon
+
+    Keep running and repeat the --kill-workers and/or --collect-metrics
+    actions periodically (see --interval) until interrupted. The state that
+    the thresholds and limits depending on successive samples need (like
+    --max-cpu-percent, --recycle-horizon and the kill budget) is kept in
+    memory, so --state-file isn't needed.
+
+  --interval=TIMESPAN
+
+    Change the time between cycles in --daemon mode (or between metric
+    collections in --watch mode) to TIMESPAN (see --max-time for acceptable
+    values of TIMESPAN). Defaults to one minute in --daemon mode and to 10
+    seconds in --watch mode.
+
+  --pressure-interval=TIMESPAN
+
+    Change the time between cycles in --daemon mode while the host is under
+    memory pressure (see --pressure-curve) to TIMESPAN. Defaults to a quarter
+    of --interval.
 
   -a, --max-memory-active=SIZE
 
@@ -42,6 +69,33 @@ Supported options:
     Kill Apache workers that are using more memory than specified by the SIZE
     argument (see --max-memory-active for acceptable values of SIZE).
 
+  --pressure-curve=CURVE
+
+    Scale --max-memory-active and --max-memory-idle according to the memory
+    usage of the host (based on /proc/meminfo and /proc/pressure/memory).
+    CURVE is a comma separated list of PERCENTAGE:FACTOR pairs, for example
+    `50:1.5,80:1,95:0.5' relaxes the thresholds by 50% while at most half of
+    the memory is in use and makes them twice as strict when 95% is in use
+    (factors in between are interpolated). While tasks are stalled waiting for
+    memory the smallest factor is used.
+
+  --memory-budget=GROUP:SIZE
+
+    Limit the combined memory usage of the workers in the WSGI process group
+    GROUP (use `native' for the native Apache workers) to SIZE (see
+    --max-memory-active for acceptable values of SIZE). When a group exceeds
+    its budget the minimum number of workers is killed to bring it below its
+    budget, idle workers before active workers and larger workers before
+    smaller ones. This option can be repeated.
+
+  --cgroup-limit-percent=PERCENTAGE
+
+    Kill the minimum number of idle Apache workers (largest first) when the
+    memory usage of the control group of Apache (excluding the page cache)
+    exceeds PERCENTAGE of its memory limit (memory.high or memory.max). The
+    control group is discovered automatically on systems with a unified
+    (version 2) control group hierarchy, e.g. when Apache is run by systemd.
+
   -t, --max-ss, --max-time=TIMESPAN
 
     Kill Apache workers whose "time since the beginning of the most recent
@@ -49,6 +103,75 @@ Supported options:
     expected to be a human readable timespan like 2s (2 seconds), 3m (3
     minutes), 5h (5 hours), 2d (2 days), etc.
 
+  -m, --memory-metric=NAME
+
+    Change how the memory usage of workers is measured. NAME is one of the
+    strings `rss' (the default), `pss' (proportional set size), `uss' (unique
+    set size, i.e. the memory that is freed when a worker is killed) or `swap'.
+    This affects the memory thresholds as well as the reported metrics.
+
+  -C, --max-cpu-percent=PERCENTAGE
+
+    Kill Apache workers (including non-native workers like WSGI daemon
+    processes) whose CPU utilization exceeded PERCENTAGE (100 equals one CPU
+    core) during several successive samples. Because CPU utilization is
+    measured between samples this only has an effect in --daemon mode or when
+    the samples are remembered between runs using --state-file.
+
+  --recycle-horizon=TIMESPAN
+
+    Proactively recycle idle Apache workers whose memory usage is growing and
+    projected to exceed --max-memory-active (or --max-memory-idle) within
+    TIMESPAN. Because memory growth is measured between samples this only has
+    an effect in --daemon mode or when the samples are remembered between runs
+    using --state-file.
+
+  --outlier-factor=K
+
+    Kill Apache workers whose memory usage (or request duration) is unusual
+    compared to the other workers in the same WSGI process group, i.e. it
+    exceeds the median of the group by more than K times the median absolute
+    deviation. This adapts to the normal footprint of each group without
+    per-group configuration. Active workers are only killed for unusual memory
+    usage when --drain-timeout is given. Bounds (memory thresholds are at
+    least 100 MiB by default) and the minimum group size can be defined in
+    configuration files, please refer to the online documentation.
+
+  --drain-timeout=TIMESPAN
+
+    Don't kill active Apache workers immediately but ask them to exit once
+    they've finished their current request (native workers are sent SIGUSR1,
+    WSGI daemon processes are sent SIGTERM). Workers that are still running
+    after TIMESPAN are killed. All workers are drained at the same time, so
+    a run takes at most TIMESPAN longer regardless of the number of workers.
+
+  --max-kills-per-cycle=COUNT
+
+    Kill at most COUNT workers per WSGI process group (the native Apache
+    workers form a group of their own) in a single run. The remaining workers
+    that exceed a threshold are deferred: They're killed first by the next
+    run. This avoids respawning all workers of an application at the same
+    time (e.g. after a deploy made all of them grow). Workers are killed in
+    order of how far they exceed their threshold.
+
+  --max-kills-per-window=COUNT
+
+    Kill at most COUNT workers per WSGI process group within the time window
+    given by --kill-window (which defaults to one hour).
+
+  --kill-window=TIMESPAN
+
+    Change the time window used by --max-kills-per-window to TIMESPAN.
+
+  --state-file=PATH
+
+    Remember deferred workers and recent kills (see --max-kills-per-cycle and
+    --max-kills-per-window) as well as CPU and memory samples (see
+    --max-cpu-percent and --recycle-horizon) between runs in the file PATH.
+    This is required to enforce the kill budget, the CPU threshold and
+    predictive recycling when the Apache manager is run from cron (in --daemon
+    mode this state is kept in memory).
+
   -T, --hanging-worker-threshold=TIMESPAN
 
     Change the number of seconds before an active worker is considered hanging
@@ -59,6 +182,71 @@ Supported options:
     Change the pathname of the file where the Apache manager stores monitoring
     metrics after every run. Defaults to `/tmp/apache-manager.txt'.
 
+  --cycle-time-budget=TIMESPAN
+
+    Log a warning with the time spent in each phase of a run (address
+    discovery, fetching and parsing the status pages, scanning /proc, deciding
+    which workers to kill, killing them and saving the results) when the run
+    takes longer than TIMESPAN. The time spent in each phase is also included
+    in the metrics written by --collect-metrics.
+
+  --profile=FILE
+
+    Profile the requested actions and save the results to FILE in the format
+    of the Python pstats module (e.g. use `python -m pstats FILE' to analyze
+    them). In --daemon mode each cycle is profiled separately and existing
+    profiles are rotated (the 5 most recent ones are kept as FILE.1, FILE.2,
+    etc). When --cycle-time-budget is given only the profiles of cycles that
+    exceeded the budget are saved.
+
+  --profile-mode=MODE
+
+    Change the profiler used by --profile. MODE is one of the strings
+    `cprofile' (the default, exact but slow) or `sampling' (a statistical
+    profiler with negligible overhead that's safe to leave enabled).
+
+  --profile-every=N
+
+    Only profile every Nth cycle in --daemon mode (defaults to 1).
+
+  --proc-root=PATH
+
+    Read process information from the proc file system mounted at PATH
+    instead of /proc. This makes it possible to monitor Apache running in a
+    container from the host (by bind mounting the proc file system of the
+    container). Workers can't be killed when PATH belongs to another PID
+    namespace because their process IDs are meaningless outside of it.
+
+  --apache-config=FILE
+
+    Discover where Apache is listening and where its status page is served by
+    parsing the Apache configuration file FILE (following Include directives)
+    instead of the first of /etc/apache2/apache2.conf, /etc/httpd/conf/httpd.conf,
+    etc. that exists. When this finds several candidate locations of the status
+    page they are probed concurrently and the fastest one that works is used.
+
+  --status-url=URL
+
+    Fetch Apache's HTML status page from URL instead of the URL derived from
+    the addresses that Apache listens on (the plain text status page is
+    fetched from URL?auto). This is useful when the status page is served on
+    a non-standard location or by apache-manager-fake-server (a bundled
+    server that serves synthetic status pages for local testing).
+
+  --status-timeout=TIMESPAN
+
+    Give up on fetching the status page when Apache doesn't respond within
+    TIMESPAN (defaults to 10 seconds).
+
+  --cache-file=PATH
+
+    Change the pathname of the file where the configuration of the Apache
+    manager and the addresses that Apache listens on are cached between runs.
+    Cached values are validated using the modification times of the files
+    they were derived from, so changes are picked up automatically. Defaults
+    to `~/.cache/apache-manager/discovery.json', an empty PATH disables the
+    cache.
+
   -z, --zabbix-discovery
 
     Generate a JSON fragment that's compatible with the low-level discovery
@@ -67,6 +255,68 @@ Supported options:
     groups that are active on any given server. This makes it possible to
     collect and analyze the memory usage of specific WSGI process groups.
 
+  --history=METRIC
+
+    Print the recorded values of the monitoring metric METRIC from the metric
+    history (see --history-dir). METRIC is the name of a metric written by
+    --collect-metrics with the tokens that precede its value joined by dots,
+    for example `busy-workers' or `memory-usage.native.max'. See also the
+    --since and --until options.
+
+  --since=TIMESTAMP, --until=TIMESTAMP
+
+    Limit the output of --history (and the metric history used by
+    --capacity-report) to the given time range. TIMESTAMP can be a
+    date and time in the format `YYYY-MM-DD HH:MM' (in UTC) or a timespan like
+    30m or 2d that is interpreted as that amount of time ago.
+
+  --history-dir=PATH
+
+    Change the pathname of the directory where the metric history is stored.
+    When this is set --collect-metrics appends the collected metrics to a
+    compact binary history file (one file per day). This can also be defined
+    in configuration files using the `history-directory' option.
+
+  --record=FILE
+
+    Append the raw inputs of this run (the status pages, the discovered listen
+    addresses and the relevant process information from /proc) to the gzip
+    compressed capture file FILE. See also the --replay option.
+
+  --replay=FILE
+
+    Feed the snapshots recorded in the capture file FILE through the parsing
+    and policy code (without touching the network or /proc and without
+    killing any processes) as fast as possible and report the throughput.
+    The thresholds given by the other options are applied as usual.
+
+  --simulate-policies=FILE
+
+    Evaluate combinations of the --max-memory-active, --max-memory-idle and
+    --max-time thresholds over the snapshots recorded in the capture file FILE
+    (see --record) and report for each combination how many workers would
+    have been killed, how much memory would have been reclaimed and how many
+    in-flight requests would have been interrupted. In this mode each of the
+    threshold options accepts a comma separated list of values (0 means the
+    threshold is disabled), all combinations of the given values are evaluated.
+    A worker that's killed by a policy is counted only once, even when it
+    appears in later snapshots. This option can't be combined with
+    --kill-workers.
+
+  --capacity-report
+
+    Recommend the maximum number of processes for the native Apache workers
+    and each WSGI process group (i.e. MaxRequestWorkers and the processes=
+    option of mod_wsgi) based on the 95th percentile of their memory usage,
+    the memory installed in the host and the headroom given by --headroom.
+    Also reports how close the server is to running out of worker slots at
+    the peak concurrency found in the metric history (see --history-dir).
+
+  --headroom=PERCENTAGE
+
+    Change the percentage of host memory that --capacity-report keeps
+    available for the page cache and other processes. Defaults to 20%.
+
   -n, --dry-run, --simulate
 
     Don't actually kill any Apache workers.
@@ -85,14 +335,18 @@ Supported options:
 """
 
 # Standard library modules.
+import contextlib
 import getopt
 import json
 import logging
 import sys
+import time
 
 # External dependencies.
 import coloredlogs
 from humanfriendly import (
+    Timer,
+    concatenate,
     format_size,
     format_timespan,
     parse_size,
@@ -102,12 +356,27 @@ from humanfriendly import (
 from humanfriendly.terminal import HIGHLIGHT_COLOR, ansi_wrap, output, usage, warning
 
 # Modules included in our package.
-from apache_manager import ApacheManager, NATIVE_WORKERS_LABEL
-from apache_manager.interactive import watch_metrics
+from apache_manager import (
+    MEMORY_METRICS,
+    NATIVE_WORKERS_LABEL,
+    ApacheManager,
+    parse_memory_budgets,
+    parse_pressure_curve,
+)
+from apache_manager.cache import CACHE_FILE
+from apache_manager.capacity import CAPACITY_HEADROOM, format_capacity_report, plan_capacity
+from apache_manager.history import parse_timestamp
+from apache_manager.profiling import PROFILE_MODES
+from apache_manager.replay import record_snapshot, replay_capture
+from apache_manager.simulation import format_outcomes, simulate_policies
+from apache_manager.interactive import WATCH_INTERVAL, watch_metrics
 
 # Initialize a logger for this program.
 logger = logging.getLogger(__name__)
 
+DAEMON_INTERVAL = 60
+"""The default number of seconds between cycles in ``--daemon`` mode (a number)."""
+
 
 def main():
     """Command line interface for the ``apache-manager`` program."""
@@ -115,16 +384,36 @@ def main():
     coloredlogs.install(syslog='notice')
     # Command line option defaults.
     actions = set()
-    kw = dict()
+    kw = dict(cache_file=CACHE_FILE)
+    thresholds = dict()
     data_file = '/tmp/apache-manager.txt'
     dry_run = False
+    history_metric = None
+    record_file = None
+    replay_file = None
+    capture_file = None
+    since = None
+    until = None
+    interval = None
+    headroom = CAPACITY_HEADROOM
+    pressure_interval = None
     # Parse the command line options.
     try:
-        options, arguments = getopt.getopt(sys.argv[1:], 'ckwa:i:t:T:f:znvqh', [
-            'collect-metrics', 'kill-workers', 'watch', 'max-memory-active=',
-            'max-memory-idle=', 'max-ss=', 'max-time=',
-            'hanging-worker-threshold=', 'data-file=', 'zabbix-discovery',
-            'dry-run', 'simulate', 'verbose', 'quiet', 'help',
+        options, arguments = getopt.getopt(sys.argv[1:], 'ckwda:i:t:m:C:T:f:znvqh', [
+            'collect-metrics', 'kill-workers', 'watch', 'daemon', 'interval=',
+            'pressure-interval=',
+            'max-memory-active=', 'max-memory-idle=', 'pressure-curve=', 'memory-budget=',
+            'cgroup-limit-percent=',
+            'max-ss=', 'max-time=',
+            'memory-metric=', 'max-cpu-percent=', 'recycle-horizon=',
+            'outlier-factor=', 'drain-timeout=', 'max-kills-per-cycle=', 'max-kills-per-window=', 'kill-window=',
+            'state-file=',
+            'hanging-worker-threshold=', 'data-file=', 'cycle-time-budget=', 'proc-root=', 'apache-config=',
+            'status-url=', 'status-timeout=', 'cache-file=', 'profile=',
+            'profile-mode=', 'profile-every=', 'zabbix-discovery',
+            'history=', 'since=', 'until=', 'history-dir=', 'record=',
+            'replay=', 'simulate-policies=', 'capacity-report', 'headroom=', 'dry-run', 'simulate', 'verbose',
+            'quiet', 'help',
         ])
         for option, value in options:
             if option in ('-c', '--collect-metrics'):
@@ -133,18 +422,95 @@ def main():
                 actions.add('kill')
             elif option in ('-w', '--watch'):
                 actions.add('watch')
+            elif option in ('-d', '--daemon'):
+                actions.add('daemon')
+            elif option == '--interval':
+                interval = parse_timespan(value)
+            elif option == '--pressure-interval':
+                pressure_interval = parse_timespan(value)
             elif option in ('-a', '--max-memory-active'):
-                kw['max_memory_active'] = parse_size(value, binary=True)
+                thresholds['max_memory_active'] = [parse_size(v, binary=True) for v in value.split(',')]
             elif option in ('-i', '--max-memory-idle'):
-                kw['max_memory_idle'] = parse_size(value, binary=True)
+                thresholds['max_memory_idle'] = [parse_size(v, binary=True) for v in value.split(',')]
+            elif option == '--pressure-curve':
+                kw['pressure_curve'] = parse_pressure_curve(value)
+            elif option == '--memory-budget':
+                kw.setdefault('memory_budgets', {}).update(parse_memory_budgets(value))
+            elif option == '--cgroup-limit-percent':
+                kw['cgroup_limit_percent'] = float(value.rstrip('%'))
             elif option in ('-t', '--max-ss', '--max-time'):
-                kw['worker_timeout'] = parse_timespan(value)
+                thresholds['worker_timeout'] = [parse_timespan(v) for v in value.split(',')]
+            elif option in ('-m', '--memory-metric'):
+                value = value.lower()
+                if value not in MEMORY_METRICS:
+                    msg = "Unsupported memory metric %r (supported values are %s)"
+                    raise Exception(msg % (value, concatenate(map(repr, MEMORY_METRICS))))
+                kw['memory_metric'] = value
+            elif option in ('-C', '--max-cpu-percent'):
+                kw['max_cpu_percent'] = float(value.rstrip('%'))
+            elif option == '--recycle-horizon':
+                kw['recycle_horizon'] = parse_timespan(value)
+            elif option == '--outlier-factor':
+                kw['outlier_factor'] = float(value)
+            elif option == '--drain-timeout':
+                kw['drain_timeout'] = parse_timespan(value)
+            elif option == '--max-kills-per-cycle':
+                kw['max_kills_per_cycle'] = int(value)
+            elif option == '--max-kills-per-window':
+                kw['max_kills_per_window'] = int(value)
+            elif option == '--kill-window':
+                kw['kill_window'] = parse_timespan(value)
+            elif option == '--state-file':
+                kw['state_file'] = value
             elif option in ('-T', '--hanging-worker-threshold'):
                 kw['hanging_worker_threshold'] = parse_timespan(value)
             elif option in ('-f', '--data-file'):
                 data_file = value
+            elif option == '--cycle-time-budget':
+                kw['cycle_time_budget'] = parse_timespan(value)
+            elif option == '--profile':
+                kw['profile_file'] = value
+            elif option == '--profile-mode':
+                value = value.lower()
+                if value not in PROFILE_MODES:
+                    msg = "Unsupported profile mode %r (supported values are %s)"
+                    raise Exception(msg % (value, concatenate(map(repr, PROFILE_MODES))))
+                kw['profile_mode'] = value
+            elif option == '--profile-every':
+                kw['profile_every'] = int(value)
+            elif option == '--proc-root':
+                kw['proc_root'] = value
+            elif option == '--apache-config':
+                kw['apache_config'] = value
+            elif option == '--status-url':
+                kw['status_url'] = value
+            elif option == '--status-timeout':
+                kw['status_timeout'] = parse_timespan(value)
+            elif option == '--cache-file':
+                kw['cache_file'] = value or None
             elif option in ('-z', '--zabbix-discovery'):
                 actions.add('discovery')
+            elif option == '--history':
+                actions.add('history')
+                history_metric = value
+            elif option == '--since':
+                since = parse_timestamp(value)
+            elif option == '--until':
+                until = parse_timestamp(value)
+            elif option == '--history-dir':
+                kw['history_directory'] = value
+            elif option == '--record':
+                record_file = value
+            elif option == '--replay':
+                actions.add('replay')
+                replay_file = value
+            elif option == '--simulate-policies':
+                actions.add('simulate-policies')
+                capture_file = value
+            elif option == '--capacity-report':
+                actions.add('capacity-report')
+            elif option == '--headroom':
+                headroom = float(value.rstrip('%'))
             elif option in ('-n', '--dry-run', '--simulate'):
                 logger.info("Performing a dry run ..")
                 dry_run = True
@@ -157,30 +523,129 @@ def main():
                 return
         if arguments:
             raise Exception("This program doesn't support any positional arguments")
+        if 'simulate-policies' in actions and 'kill' in actions:
+            raise Exception("The --simulate-policies option can't be combined with --kill-workers")
+        if 'simulate-policies' not in actions:
+            for name, values in thresholds.items():
+                if len(values) > 1:
+                    raise Exception("Lists of thresholds are only supported by --simulate-policies")
+                kw[name] = values[0]
+        if 'daemon' in actions and not actions & set(['collect', 'kill']):
+            raise Exception("The --daemon option requires --collect-metrics and/or --kill-workers")
     except Exception as e:
         warning("Error: %s!", e)
         sys.exit(1)
+    timer = Timer()
     manager = ApacheManager(**kw)
+    if 'daemon' in actions:
+        interval = interval or DAEMON_INTERVAL
+        if pressure_interval is None:
+            pressure_interval = interval / 4.0
+        run_daemon(manager, interval, actions, data_file, dry_run, record_file, pressure_interval)
+        return
+    with profile_actions(manager, actions):
+        try:
+            # Execute the requested action(s).
+            if 'kill' in actions:
+                manager.kill_workers(dry_run=dry_run)
+            if 'watch' in actions:
+                watch_metrics(manager, interval or WATCH_INTERVAL)
+            if 'discovery' in actions:
+                report_zabbix_discovery(manager)
+            if 'history' in actions:
+                report_history(manager, history_metric, since, until)
+            if 'replay' in actions:
+                report_replay(replay_file, **kw)
+            if 'simulate-policies' in actions:
+                report_simulation(manager, capture_file, thresholds)
+            if 'capacity-report' in actions:
+                report_capacity(manager, headroom, since, until)
+            # Render a summary of monitoring metrics when no action was requested.
+            if not actions and data_file != '-':
+                for line in report_metrics(manager):
+                    if line_is_heading(line):
+                        line = ansi_wrap(line, color=HIGHLIGHT_COLOR)
+                    output(line)
+        except Exception:
+            logger.exception("Encountered unexpected exception, aborting!")
+            sys.exit(1)
+        finally:
+            save_results(manager, actions, data_file, dry_run, record_file)
+            if actions & set(['collect', 'kill']):
+                manager.check_cycle_time(timer.elapsed_time)
+
+
+def run_daemon(manager, interval, actions, data_file, dry_run, record_file, pressure_interval=None):
+    """
+    Periodically kill workers and/or collect metrics until interrupted.
+
+    While the host is under memory pressure (see
+    :attr:`.ApacheManager.under_pressure`) or the memory thresholds are
+    tightened (see :attr:`.ApacheManager.threshold_scale`) the time between
+    cycles is shortened to `pressure_interval`.
+    """
+    logger.info("Running in daemon mode (interval is %s) ..", format_timespan(interval))
     try:
-        # Execute the requested action(s).
-        if 'kill' in actions:
-            manager.kill_workers(dry_run=dry_run)
-        if 'watch' in actions:
-            watch_metrics(manager)
-        if 'discovery' in actions:
-            report_zabbix_discovery(manager)
-        # Render a summary of monitoring metrics when no action was requested.
-        if not actions and data_file != '-':
-            for line in report_metrics(manager):
-                if line_is_heading(line):
-                    line = ansi_wrap(line, color=HIGHLIGHT_COLOR)
-                output(line)
-    except Exception:
-        logger.exception("Encountered unexpected exception, aborting!")
-        sys.exit(1)
-    finally:
-        if 'collect' in actions and (data_file == '-' or not dry_run):
-            manager.save_metrics(data_file)
+        while True:
+            timer = Timer()
+            # Make sure each cycle works with fresh information (the state
+            # needed by the kill budget and CPU / memory growth sampling
+            # survives this refresh).
+            manager.refresh()
+            with manager.profile_cycle():
+                try:
+                    if 'kill' in actions:
+                        manager.kill_workers(dry_run=dry_run)
+                except Exception:
+                    logger.exception("Encountered unexpected exception, continuing in next cycle ..")
+                finally:
+                    try:
+                        save_results(manager, actions, data_file, dry_run, record_file)
+                    except Exception:
+                        logger.exception("Failed to save results, continuing in next cycle ..")
+            manager.check_cycle_time(timer.elapsed_time)
+            delay = interval
+            if pressure_interval and (manager.under_pressure or manager.threshold_scale < 1):
+                logger.verbose("Host is under memory pressure, next cycle starts in %s.",
+                               format_timespan(pressure_interval))
+                delay = min(interval, pressure_interval)
+            time.sleep(max(0, delay - timer.elapsed_time))
+    except KeyboardInterrupt:
+        logger.info("Interrupted by user, stopping ..")
+
+
+@contextlib.contextmanager
+def profile_actions(manager, actions):
+    """
+    Profile the requested actions when --profile is given (a context manager).
+
+    In --watch mode the background thread profiles each collection of
+    metrics instead (see :class:`.MetricsCollector`).
+    """
+    if 'watch' in actions:
+        yield
+    else:
+        with manager.profile_cycle():
+            yield
+
+
+def save_results(manager, actions, data_file, dry_run, record_file):
+    """
+    Save monitoring metrics, the metric history and/or a snapshot (depending on the requested actions).
+
+    Because this is called from a ``finally`` clause a failure to record the
+    snapshot is logged instead of raised, so that it doesn't mask the
+    original exception (if any).
+    """
+    if 'collect' in actions and (data_file == '-' or not dry_run):
+        manager.save_metrics(data_file)
+    if 'collect' in actions and not dry_run:
+        manager.save_history()
+    if record_file:
+        try:
+            record_snapshot(manager, record_file)
+        except Exception:
+            logger.exception("Failed to record snapshot in %s!", record_file)
 
 
 def report_metrics(manager):
@@ -219,6 +684,43 @@ def report_zabbix_discovery(manager):
     output(json.dumps({'data': [{'{#NAME}': name} for name in worker_groups]}))
 
 
+def report_history(manager, metric, since=None, until=None):
+    """Print the recorded values of a monitoring metric from the metric history."""
+    if not manager.history:
+        raise Exception("The metric history is disabled! (see the --history-dir option)")
+    for timestamp, value in manager.history.query(metric, since, until):
+        output("%s\t%s", time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(timestamp)), value)
+
+
+def report_replay(filename, **options):
+    """Replay a capture file and report the throughput of the parsing and policy code."""
+    totals = replay_capture(filename, **options)
+    elapsed = max(totals['elapsed'], 0.000001)
+    output("Replayed %s (%s, %s selected for killing) in %s (%.1f cycles/second).",
+           pluralize(totals['cycles'], "cycle"),
+           pluralize(totals['workers'], "worker"),
+           pluralize(totals['killed'], "worker"),
+           format_timespan(elapsed),
+           totals['cycles'] / elapsed)
+
+
+def report_simulation(manager, filename, thresholds):
+    """Evaluate combinations of kill thresholds over a capture file and report the outcomes."""
+    simulator = simulate_policies(
+        filename,
+        max_memory_active=thresholds.get('max_memory_active', [manager.max_memory_active]),
+        max_memory_idle=thresholds.get('max_memory_idle', [manager.max_memory_idle]),
+        worker_timeout=thresholds.get('worker_timeout', [manager.worker_timeout]),
+    )
+    output(format_outcomes(simulator))
+
+
+def report_capacity(manager, headroom, since=None, until=None):
+    """Recommend the maximum number of processes per group of workers and report the slot utilization."""
+    for line in format_capacity_report(plan_capacity(manager, headroom, since, until)):
+        output(line)
+
+
 def line_is_heading(line):
     """Check whether a line of output generated by :func:`report_metrics()` should be highlighted as a heading."""
     return line.endswith(':')
@@ -0,0 +1,367 @@
+# Monitor and control Apache web server workers from Python.
+#
+# Author: Peter Odding <peter@peterodding.com>
+# Last Change: October 18, 2026
+# URL: https://apache-manager.readthedocs.io
+
+"""
+Discovery of Apache's status page.
+
+The :mod:`~apache_manager.discovery` module finds the URL of Apache's status
+page in two steps:
+
+1. The Apache configuration is parsed (see :class:`ApacheConfig`) to find the
+   addresses that Apache listens on (``Listen`` directives) and the locations
+   where the status page is served (``<Location>`` sections containing
+   ``SetHandler server-status``). ``Include`` and ``IncludeOptional``
+   directives are followed, so this works for the configuration layouts of
+   Debian (``/etc/apache2/apache2.conf``), Red Hat (``/etc/httpd``) and
+   FreeBSD alike.
+
+2. When this results in several candidate URLs they're all probed at the
+   same time (see :func:`probe_status_urls()`) and the URL that returns a
+   valid status page the fastest is used.
+"""
+
+# Standard library modules.
+import glob
+import os
+import re
+import shlex
+import threading
+
+# External dependencies.
+from humanfriendly import Timer, format_path, format_timespan, pluralize
+from property_manager import PropertyManager, lazy_property, mutable_property, required_property
+from six.moves import queue
+from six.moves.urllib.request import urlopen
+from verboselogs import VerboseLogger
+
+# Modules included in our package.
+from apache_manager.cache import get_fingerprint
+
+# Public identifiers that require documentation.
+__all__ = (
+    'APACHE_CONFIG_FILES',
+    'PROBE_TIMEOUT',
+    'STATUS_PATH',
+    'ApacheConfig',
+    'iterate_lines',
+    'logger',
+    'parse_listen_directive',
+    'probe_status_urls',
+)
+
+APACHE_CONFIG_FILES = (
+    '/etc/apache2/apache2.conf',
+    '/etc/httpd/conf/httpd.conf',
+    '/etc/apache2/httpd.conf',
+    '/usr/local/etc/apache24/httpd.conf',
+    '/usr/local/apache2/conf/httpd.conf',
+)
+"""
+The locations of the main Apache configuration file on various platforms (a tuple of strings).
+
+The first file that exists is the default value of
+:attr:`.ApacheManager.apache_config`. The locations are (in this order) those
+used by Debian and Ubuntu, Red Hat and derivatives, SUSE, FreeBSD and the
+official Docker images.
+"""
+
+PROBE_TIMEOUT = 2
+"""The default number of seconds that :func:`probe_status_urls()` waits for candidate URLs (a number)."""
+
+STATUS_PATH = '/server-status'
+"""The location of the status page when the configuration doesn't define one (a string)."""
+
+# Initialize a logger for this module.
+logger = VerboseLogger(__name__)
+
+
+class ApacheConfig(PropertyManager):
+
+    """
+    Parser for the Apache configuration that finds the addresses and locations of the status page.
+
+    The following directives are supported:
+
+    - ``Include`` and ``IncludeOptional`` are followed, including wildcards
+      and directories (whose files are included in alphabetical order).
+      Relative pathnames are resolved against :attr:`server_root`. Files
+      that were already included are skipped, which also protects against
+      include cycles.
+
+    - ``ServerRoot`` changes :attr:`server_root` (like it does for Apache).
+
+    - ``Define`` defines variables that can be referenced as ``${NAME}``
+      (environment variables can be referenced as well).
+
+    - ``Listen`` directives are parsed by :func:`parse_listen_directive()`.
+
+    - ``<Location PATH>`` sections containing ``SetHandler server-status``
+      define the location of the status page.
+
+    Call :func:`load()` to parse the configuration.
+    """
+
+    @required_property
+    def filename(self):
+        """The pathname of the main configuration file (a string)."""
+
+    @lazy_property
+    def defines(self):
+        """Variables defined using ``Define`` directives (a dictionary of strings)."""
+        return {}
+
+    @lazy_property
+    def listen_addresses(self):
+        """The parsed ``Listen`` directives (a list of dictionaries, see :func:`parse_listen_directive()`)."""
+        return []
+
+    @mutable_property
+    def server_root(self):
+        """
+        The directory that relative pathnames are resolved against (a string).
+
+        Defaults to the directory that contains :attr:`filename`, changed by
+        ``ServerRoot`` directives.
+        """
+        return os.path.dirname(os.path.abspath(self.filename))
+
+    @lazy_property
+    def sources(self):
+        """
+        The fingerprints of the files and directories that were read (a dictionary).
+
+        This can be used to validate cached results (see
+        :func:`~apache_manager.cache.fingerprint_files()`). The fingerprints
+        are taken before the files are read.
+        """
+        return {}
+
+    @lazy_property
+    def status_paths(self):
+        """The locations where the status page is served (a list of strings)."""
+        return []
+
+    def expand_variables(self, text):
+        """
+        Expand references to variables (``${NAME}``) in a string.
+
+        :param text: The string to expand (a string).
+        :returns: The expanded string. References to undefined variables are
+                  left alone (like Apache does, although it does log a
+                  warning).
+        """
+        def replace(match):
+            name = match.group(1)
+            return self.defines.get(name, os.environ.get(name, match.group(0)))
+        return re.sub(r'\$\{(\w+)\}', replace, text)
+
+    def include(self, pattern, optional=False, stack=()):
+        """
+        Handle an ``Include`` or ``IncludeOptional`` directive.
+
+        :param pattern: A pathname, directory or wildcard pattern (a string).
+        :param optional: :data:`True` for ``IncludeOptional``, :data:`False`
+                         for ``Include`` (the difference is only in the
+                         severity of the log message when nothing matches).
+        :param stack: The files that are currently being parsed (a tuple of
+                      strings).
+        """
+        pattern = os.path.join(self.server_root, pattern)
+        if glob.has_magic(pattern):
+            self.sources[os.path.dirname(pattern)] = get_fingerprint(os.path.dirname(pattern))
+            matches = sorted(glob.glob(pattern))
+        else:
+            matches = [pattern]
+        for pathname in matches:
+            if os.path.isdir(pathname):
+                self.sources[pathname] = get_fingerprint(pathname)
+                for root, directories, files in os.walk(pathname):
+                    directories.sort()
+                    for directory in directories:
+                        self.sources[os.path.join(root, directory)] = get_fingerprint(os.path.join(root, directory))
+                    for filename in sorted(files):
+                        self.parse_file(os.path.join(root, filename), stack)
+            elif os.path.isfile(pathname):
+                self.parse_file(pathname, stack)
+            else:
+                self.sources[pathname] = None
+                log_level = logger.debug if optional else logger.warning
+                log_level("Included configuration file %s doesn't exist.", format_path(pathname))
+
+    def load(self):
+        """
+        Parse the configuration, starting with :attr:`filename`.
+
+        :returns: The :class:`ApacheConfig` object (for chaining).
+        """
+        timer = Timer()
+        self.parse_file(os.path.abspath(self.filename))
+        logger.debug("Parsed Apache configuration in %s (found %s and %s).", timer,
+                     pluralize(len(self.listen_addresses), "listen address", "listen addresses"),
+                     pluralize(len(self.status_paths), "status page location"))
+        return self
+
+    def parse_file(self, filename, stack=()):
+        """
+        Parse a single configuration file (following its includes).
+
+        :param filename: The pathname of the configuration file (a string).
+        :param stack: The files that are currently being parsed (a tuple of strings).
+        """
+        realpath = os.path.realpath(filename)
+        if realpath in stack:
+            logger.warning("Ignoring include cycle in Apache configuration! (%s)",
+                           " -> ".join(map(format_path, stack + (realpath,))))
+            return
+        if realpath in self.sources:
+            logger.debug("Skipping configuration file %s (already included).", format_path(filename))
+            return
+        self.sources[realpath] = get_fingerprint(realpath)
+        stack = stack + (realpath,)
+        logger.debug("Parsing Apache configuration file %s ..", format_path(filename))
+        sections = []
+        with open(filename) as handle:
+            for lnum, line in iterate_lines(handle):
+                try:
+                    tokens = shlex.split(self.expand_variables(line))
+                except ValueError:
+                    tokens = line.split()
+                if not tokens:
+                    continue
+                directive = tokens[0].lower()
+                arguments = tokens[1:]
+                if directive.startswith('</'):
+                    if sections:
+                        sections.pop()
+                elif directive.startswith('<'):
+                    arguments[-1:] = [arguments[-1].rstrip('>')] if arguments else []
+                    sections.append((directive[1:].rstrip('>'), arguments))
+                elif directive in ('include', 'includeoptional') and arguments:
+                    self.include(arguments[0], optional=(directive == 'includeoptional'), stack=stack)
+                elif directive == 'serverroot' and arguments:
+                    self.server_root = arguments[0]
+                elif directive == 'define' and arguments:
+                    self.defines[arguments[0]] = arguments[1] if len(arguments) > 1 else ''
+                elif directive == 'listen' and arguments:
+                    address = parse_listen_directive(*arguments[:2])
+                    if address:
+                        logger.debug("Parsed listen directive on line %i of %s: %s",
+                                     lnum, format_path(filename), ' '.join(arguments))
+                        if address not in self.listen_addresses:
+                            self.listen_addresses.append(address)
+                    else:
+                        logger.warning("Failed to parse listen directive on line %i of %s: %s",
+                                       lnum, format_path(filename), line.strip())
+                elif directive == 'sethandler' and arguments and arguments[0].lower() == 'server-status':
+                    for name, section_arguments in reversed(sections):
+                        if name == 'location' and section_arguments:
+                            if section_arguments[0] not in self.status_paths:
+                                self.status_paths.append(section_arguments[0])
+                            break
+
+
+def iterate_lines(handle):
+    """
+    Iterate over the logical lines of an Apache configuration file.
+
+    :param handle: A file like object.
+    :returns: A generator of tuples with two values each: The line number
+              where the logical line starts (an integer) and the logical line
+              (a string). Comments are skipped and lines ending in a
+              backslash are joined with the following line.
+    """
+    buffer = []
+    start = None
+    for lnum, line in enumerate(handle, start=1):
+        line = line.rstrip('\r\n')
+        if not buffer and line.lstrip().startswith('#'):
+            continue
+        if start is None:
+            start = lnum
+        if line.endswith('\\'):
+            buffer.append(line[:-1])
+            continue
+        buffer.append(line)
+        yield start, ' '.join(buffer)
+        buffer = []
+        start = None
+    if buffer:
+        yield start, ' '.join(buffer)
+
+
+def parse_listen_directive(value, protocol=None):
+    """
+    Parse the arguments of a ``Listen`` directive.
+
+    :param value: The address and/or port (a string like ``80``,
+                  ``192.0.2.1:8080`` or ``[::1]:8080``).
+    :param protocol: The protocol given in the directive (a string or :data:`None`).
+    :returns: A dictionary with the keys ``protocol``, ``address`` and
+              ``port`` or :data:`None` when `value` can't be parsed.
+
+    Wildcard addresses (``0.0.0.0``, ``*`` and ``[::]``) are replaced by the
+    corresponding loopback address. When `protocol` isn't given ``https`` is
+    assumed for port 443 and ``http`` otherwise (like Apache does).
+    """
+    match = re.match(r'^(?:(\[[0-9A-Fa-f:.]+\]|[^:\[\]]+):)?(\d+)$', value)
+    if not match:
+        return None
+    address = (match.group(1) or '127.0.0.1').strip('[]')
+    if address in ('0.0.0.0', '*'):
+        address = '127.0.0.1'
+    elif address == '::':
+        address = '::1'
+    port = int(match.group(2))
+    return dict(
+        protocol=protocol.lower() if protocol else ('https' if port == 443 else 'http'),
+        address=address,
+        port=port,
+    )
+
+
+def probe_status_urls(urls, timeout=PROBE_TIMEOUT):
+    """
+    Find the candidate status page URL that responds the fastest.
+
+    :param urls: The candidate URLs of the HTML status page (a list of strings).
+    :param timeout: The maximum number of seconds to wait (a number, defaults
+                    to :data:`PROBE_TIMEOUT`).
+    :returns: The first URL whose plain text status page (the URL followed by
+              ``?auto``) was fetched successfully and contains a scoreboard,
+              or :data:`None` when none of the URLs responded with a valid
+              status page within `timeout`.
+
+    The URLs are probed concurrently (each in a separate thread), so the time
+    spent is bounded by `timeout` regardless of the number of URLs. Probes
+    that are still running when a URL has been selected are abandoned.
+    """
+    timer = Timer()
+    results = queue.Queue()
+
+    def probe(url):
+        try:
+            response = urlopen('%s?auto' % url, timeout=timeout)
+            valid = response.getcode() == 200 and b'Scoreboard:' in response.read()
+        except Exception as e:
+            logger.debug("Failed to probe %s! (%s)", url, e)
+            valid = False
+        results.put((url, valid))
+    logger.verbose("Probing %s ..", pluralize(len(urls), "candidate status page URL"))
+    for url in urls:
+        thread = threading.Thread(target=probe, args=(url,), name='apache-manager-probe')
+        thread.daemon = True
+        thread.start()
+    for i in range(len(urls)):
+        try:
+            url, valid = results.get(timeout=max(0, timeout - timer.elapsed_time))
+        except queue.Empty:
+            break
+        if valid:
+            logger.verbose("Selected status page %s (responded in %s).", url, timer)
+            return url
+    logger.warning("None of the %s returned a valid status page within %s!",
+                   pluralize(len(urls), "candidate URL"), format_timespan(timeout))
+    return None
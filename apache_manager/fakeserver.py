@@ -0,0 +1,412 @@
+# Monitor and control Apache web server workers from Python.
+#
+# Author: Peter Odding <peter@peterodding.com>
+# Last Change: October 18, 2026
+# URL: https://apache-manager.readthedocs.io
+
+"""
+Usage: apache-manager-fake-server [OPTIONS]
+
+Serve synthetic Apache status pages over HTTP, so that the Apache manager can
+be soak tested locally without an Apache installation. The HTML status page
+is served on /server-status and the plain text status page on
+/server-status?auto (both are generated by
+:func:`~apache_manager.benchmark.generate_status_pages()`). Slow, stalled and
+failing responses can be simulated using the options below. Point the
+Apache manager at the server using its --status-url option.
+
+Supported options:
+
+  -b, --bind=ADDRESS
+
+    Listen on ADDRESS (defaults to 127.0.0.1).
+
+  -p, --port=PORT
+
+    Listen on PORT (defaults to 8080, 0 picks a free port).
+
+  -s, --slots=COUNT
+
+    The number of worker slots on the status pages (defaults to 100). Large
+    numbers result in huge status pages (50,000 slots take about 10 MB).
+
+  -l, --layout=NAME
+
+    The layout of the status pages, `prefork' (one process per slot) or
+    `threaded' (several slots per process, like the worker and event MPMs).
+
+  --states=MODES
+
+    The mix of worker states as a string of modes from the scoreboard key of
+    Apache's status page (each slot gets a random character from MODES).
+    Defaults to `WWW___KR.'.
+
+  --seed=NUMBER
+
+    The seed of the random number generator used to generate the status
+    pages (defaults to 42, the same as the benchmark suite).
+
+  --delay=TIMESPAN
+
+    Wait for TIMESPAN before responding to each request.
+
+  --stall=TIMESPAN
+
+    Send half of each response, wait for TIMESPAN and then send the rest.
+
+  --error-code=CODE
+
+    Respond with the HTTP status CODE instead of the status pages.
+
+  --error-rate=FRACTION
+
+    Only respond with --error-code to the given fraction of the requests
+    (a number between 0 and 1, defaults to 1).
+
+  -v, --verbose
+
+    Increase verbosity (can be repeated).
+
+  -q, --quiet
+
+    Decrease verbosity (can be repeated).
+
+  -h, --help
+
+    Show this message and exit.
+"""
+
+# Standard library modules.
+import getopt
+import socket
+import sys
+import threading
+import time
+
+# External dependencies.
+import coloredlogs
+from humanfriendly import format_size, parse_timespan, pluralize
+from humanfriendly.terminal import usage, warning
+from property_manager import PropertyManager, cached_property, lazy_property, mutable_property, writable_property
+from six.moves import BaseHTTPServer, socketserver
+from verboselogs import VerboseLogger
+
+# Modules included in our package.
+from apache_manager.benchmark import BENCHMARK_LAYOUTS, WORKER_STATES, generate_status_pages
+
+# Public identifiers that require documentation.
+__all__ = (
+    'StatusRequestHandler',
+    'StatusScenario',
+    'StatusServer',
+    'ThreadingHTTPServer',
+    'logger',
+    'main',
+)
+
+# Initialize a logger for this module.
+logger = VerboseLogger(__name__)
+
+
+def main():
+    """Command line interface for the ``apache-manager-fake-server`` program."""
+    coloredlogs.install()
+    address = '127.0.0.1'
+    port = 8080
+    kw = dict()
+    try:
+        options, arguments = getopt.getopt(sys.argv[1:], 'b:p:s:l:vqh', [
+            'bind=', 'port=', 'slots=', 'layout=', 'states=', 'seed=', 'delay=',
+            'stall=', 'error-code=', 'error-rate=', 'verbose', 'quiet', 'help',
+        ])
+        for option, value in options:
+            if option in ('-b', '--bind'):
+                address = value
+            elif option in ('-p', '--port'):
+                port = int(value)
+            elif option in ('-s', '--slots'):
+                kw['slots'] = int(value)
+            elif option in ('-l', '--layout'):
+                if value not in BENCHMARK_LAYOUTS:
+                    raise Exception("Unsupported layout %r" % value)
+                kw['layout'] = value
+            elif option == '--states':
+                kw['states'] = value
+            elif option == '--seed':
+                kw['seed'] = int(value)
+            elif option == '--delay':
+                kw['delay'] = parse_timespan(value)
+            elif option == '--stall':
+                kw['stall'] = parse_timespan(value)
+            elif option == '--error-code':
+                kw['error_code'] = int(value)
+            elif option == '--error-rate':
+                kw['error_rate'] = float(value)
+            elif option in ('-v', '--verbose'):
+                coloredlogs.increase_verbosity()
+            elif option in ('-q', '--quiet'):
+                coloredlogs.decrease_verbosity()
+            elif option in ('-h', '--help'):
+                usage(__doc__)
+                return
+        if arguments:
+            raise Exception("This program doesn't support any positional arguments")
+    except Exception as e:
+        warning("Error: %s!", e)
+        sys.exit(1)
+    server = StatusServer(address=address, port=port, scenario=StatusScenario(**kw))
+    logger.info("Serving %s on %s (press Control-C to stop) ..",
+                pluralize(server.scenario.slots, "worker slot"), server.url)
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Interrupted by user, stopping ..")
+    finally:
+        server.server.server_close()
+        logger.info("Served %s.", pluralize(server.requests, "request"))
+
+
+class StatusScenario(PropertyManager):
+
+    """The status pages served by :class:`StatusServer` and the way they're served."""
+
+    @mutable_property
+    def delay(self):
+        """The number of seconds to wait before responding (a number, defaults to 0)."""
+        return 0
+
+    @mutable_property
+    def error_code(self):
+        """The HTTP status code to respond with instead of the status pages (an integer or :data:`None`)."""
+
+    @mutable_property
+    def error_rate(self):
+        """
+        The fraction of requests that get :attr:`error_code` (a number between 0 and 1, defaults to 1).
+
+        Errors are spread evenly over the requests (e.g. a rate of 0.25
+        results in an error for every fourth request) so that the outcome of
+        a soak test doesn't depend on chance.
+        """
+        return 1
+
+    @mutable_property
+    def layout(self):
+        """The status page layout (refer to :func:`~apache_manager.benchmark.generate_status_pages()`)."""
+        return 'prefork'
+
+    @mutable_property
+    def seed(self):
+        """The seed of the random number generator used to generate the status pages (an integer)."""
+        return 42
+
+    @mutable_property
+    def slots(self):
+        """The number of worker slots on the status pages (an integer, defaults to 100)."""
+        return 100
+
+    @mutable_property
+    def stall(self):
+        """The number of seconds to pause halfway through a response (a number, defaults to 0)."""
+        return 0
+
+    @mutable_property
+    def states(self):
+        """The mix of worker states (a string, defaults to :data:`~apache_manager.benchmark.WORKER_STATES`)."""
+        return WORKER_STATES
+
+    @cached_property
+    def pages(self):
+        """The result of :func:`~apache_manager.benchmark.generate_status_pages()` (a tuple)."""
+        return generate_status_pages(self.slots, self.layout, self.seed, self.states)
+
+    @property
+    def html_page(self):
+        """The HTML status page (a byte string)."""
+        return self.pages[0].encode('UTF-8')
+
+    @property
+    def pids(self):
+        """The process IDs of the workers on the status pages (a sorted list of integers)."""
+        return self.pages[2]
+
+    @property
+    def text_page(self):
+        """The plain text status page (a byte string)."""
+        return self.pages[1].encode('UTF-8')
+
+    def is_error(self, number):
+        """
+        Check whether a request should get :attr:`error_code`.
+
+        :param number: The number of the request (an integer, starting at 1).
+        :returns: :data:`True` if the request should fail, :data:`False` otherwise.
+        """
+        if not self.error_code:
+            return False
+        return int(number * self.error_rate) != int((number - 1) * self.error_rate)
+
+
+class StatusServer(PropertyManager):
+
+    """
+    A multi-threaded HTTP server that serves the pages of a :class:`StatusScenario`.
+
+    The server can be used as a context manager, in which case it's started
+    in a background thread on entry and stopped on exit:
+
+    >>> from apache_manager import ApacheManager
+    >>> from apache_manager.fakeserver import StatusServer
+    >>> with StatusServer() as server:
+    ...     manager = ApacheManager(status_url=server.url)
+    ...     print(len(manager.slots))
+    100
+    """
+
+    @mutable_property
+    def address(self):
+        """The address to listen on (a string, defaults to ``127.0.0.1``)."""
+        return '127.0.0.1'
+
+    @mutable_property
+    def port(self):
+        """The port to listen on (an integer, defaults to 0 which picks a free port)."""
+        return 0
+
+    @writable_property
+    def requests(self):
+        """The number of requests received so far (an integer)."""
+        return 0
+
+    @lazy_property
+    def lock(self):
+        """A :class:`threading.Lock` object that protects :attr:`requests`."""
+        return threading.Lock()
+
+    @lazy_property(writable=True)
+    def scenario(self):
+        """The :class:`StatusScenario` to serve (defaults to the default scenario)."""
+        return StatusScenario()
+
+    @lazy_property
+    def server(self):
+        """The underlying HTTP server (created and bound on first access)."""
+        server = ThreadingHTTPServer((self.address, self.port), StatusRequestHandler)
+        server.status_server = self
+        return server
+
+    @lazy_property
+    def thread(self):
+        """The background thread started by :func:`start()` (a :class:`threading.Thread` object)."""
+        thread = threading.Thread(target=self.server.serve_forever, name='apache-manager-fake-server')
+        thread.daemon = True
+        return thread
+
+    @property
+    def url(self):
+        """The URL of the HTML status page (a string)."""
+        address, port = self.server.server_address[:2]
+        if ':' in address:
+            address = '[%s]' % address
+        return 'http://%s:%i/server-status' % (address, port)
+
+    def count_request(self):
+        """Increment :attr:`requests` (a thread safe operation) and return the new value."""
+        with self.lock:
+            self.requests += 1
+            return self.requests
+
+    def start(self):
+        """Start serving requests in a background thread."""
+        self.thread.start()
+        logger.verbose("Started fake status server on %s.", self.url)
+
+    def stop(self):
+        """Stop serving requests and close the listening socket."""
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        logger.verbose("Stopped fake status server after %s.", pluralize(self.requests, "request"))
+
+    def __enter__(self):
+        """Start the server when entering a :keyword:`with` block."""
+        self.start()
+        return self
+
+    def __exit__(self, exc_type=None, exc_value=None, traceback=None):
+        """Stop the server when leaving a :keyword:`with` block."""
+        self.stop()
+
+
+class StatusRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    """Handler for the requests received by :class:`StatusServer`."""
+
+    def do_GET(self):
+        """Respond to a GET request according to the :class:`StatusScenario`."""
+        status_server = self.server.status_server
+        scenario = status_server.scenario
+        number = status_server.count_request()
+        path, _, query = self.path.partition('?')
+        if scenario.delay:
+            time.sleep(scenario.delay)
+        if path.rstrip('/') != '/server-status':
+            self.send_body(404, b'Not Found\n', 'text/plain')
+        elif scenario.is_error(number):
+            self.send_body(scenario.error_code, b'Simulated error\n', 'text/plain')
+        elif query == 'auto':
+            self.send_body(200, scenario.text_page, 'text/plain; charset=ISO-8859-1')
+        else:
+            self.send_body(200, scenario.html_page, 'text/html; charset=ISO-8859-1')
+
+    def log_message(self, format, *args):
+        """Log requests using :data:`logger` instead of writing them to standard error."""
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+    def send_body(self, code, body, content_type):
+        """
+        Send a response, pausing halfway through when :attr:`StatusScenario.stall` is set.
+
+        :param code: The HTTP status code (an integer).
+        :param body: The response body (a byte string).
+        :param content_type: The value of the ``Content-Type`` header (a string).
+        """
+        scenario = self.server.status_server.scenario
+        try:
+            self.send_response(code)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            if scenario.stall:
+                middle = len(body) // 2
+                self.wfile.write(body[:middle])
+                self.wfile.flush()
+                time.sleep(scenario.stall)
+                self.wfile.write(body[middle:])
+            else:
+                self.wfile.write(body)
+            logger.debug("Sent %s with status %i.", format_size(len(body)), code)
+        except socket.error as e:
+            # The client gave up (e.g. because it timed out).
+            logger.debug("Client disconnected before the response was sent! (%s)", e)
+
+
+class ThreadingHTTPServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+
+    """HTTP server that handles each request in a separate (daemon) thread."""
+
+    daemon_threads = True
+
+    def __init__(self, server_address, handler_class):
+        """Initialize the server, using IPv6 when `server_address` contains an IPv6 address."""
+        if ':' in server_address[0]:
+            self.address_family = socket.AF_INET6
+        BaseHTTPServer.HTTPServer.__init__(self, server_address, handler_class)
+
+    def handle_error(self, request, client_address):
+        """Log errors during request handling instead of printing a traceback to standard error."""
+        logger.debug("Failed to handle request from %s!", client_address, exc_info=True)
+
+
+if __name__ == '__main__':
+    main()
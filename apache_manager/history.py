@@ -0,0 +1,377 @@
+# Monitor and control Apache web server workers from Python.
+#
+# Author: Peter Odding <peter@peterodding.com>
+# Last Change: October 18, 2026
+# URL: https://apache-manager.readthedocs.io
+
+"""
+Compact on-disk history of monitoring metrics.
+
+The :mod:`~apache_manager.history` module implements an append-only binary
+file format that stores the metrics written by
+:func:`~apache_manager.ApacheManager.save_metrics()` so that they can be
+queried after the fact (for example during a post-mortem).
+
+The history directory contains one file per day (in UTC). Each file starts with
+a header that lists the names of the metrics stored in the file, followed by
+fixed-width records consisting of a timestamp and one value per metric. Because
+records have a fixed width and are appended in chronological order a query can
+locate the start of a time range using a binary search instead of scanning the
+whole file, and appending a record is a single small write regardless of how
+much history has been accumulated.
+
+When the set of metric names changes (for example because a new WSGI process
+group appeared) a new segment is started for the same day. Metrics whose value
+is unknown (:data:`None`) are stored as NaN.
+"""
+
+# Standard library modules.
+import calendar
+import datetime
+import errno
+import os
+import re
+import struct
+import time
+
+# External dependencies.
+from humanfriendly import InvalidTimespan, format_path, parse_timespan
+from property_manager import (
+    PropertyManager,
+    lazy_property,
+    mutable_property,
+    required_property,
+    writable_property,
+)
+from verboselogs import VerboseLogger
+
+# Public identifiers that require documentation.
+__all__ = (
+    'HISTORY_MAGIC',
+    'HISTORY_RETENTION',
+    'HistoryFile',
+    'MetricHistory',
+    'logger',
+    'parse_timestamp',
+)
+
+HISTORY_MAGIC = b'AMH1'
+"""The magic bytes at the start of every history file (a byte string)."""
+
+HISTORY_RETENTION = 60 * 60 * 24 * 30
+"""The default number of seconds that history files are retained (a number)."""
+
+FILENAME_PATTERN = re.compile(r'^apache-manager-(\d{8})(?:-(\d+))?\.history$')
+"""Regular expression that matches the names of history files."""
+
+HEADER_FORMAT = struct.Struct('<4sH')
+"""The fixed size part of the file header: magic bytes and number of metrics."""
+
+NAME_FORMAT = struct.Struct('<H')
+"""The length prefix of each metric name in the file header."""
+
+# Initialize a logger for this module.
+logger = VerboseLogger(__name__)
+
+
+class MetricHistory(PropertyManager):
+
+    """Append-only history of monitoring metrics stored in a directory of daily files."""
+
+    @writable_property
+    def current(self):
+        """
+        The :class:`HistoryFile` that the previous record was appended to (or :data:`None`).
+
+        As long as the date and the names of the metrics don't change
+        :func:`append()` keeps writing to this file without scanning
+        :attr:`directory` or parsing file headers.
+        """
+
+    @required_property
+    def directory(self):
+        """The pathname of the directory where history files are stored (a string)."""
+
+    @mutable_property
+    def retention(self):
+        """
+        The number of seconds that history files are retained (a number).
+
+        Files that only contain records older than this are removed when a new
+        daily file is created. Defaults to :data:`HISTORY_RETENTION`, the value
+        zero disables the removal of old files.
+        """
+        return HISTORY_RETENTION
+
+    @property
+    def files(self):
+        """
+        The history files in :attr:`directory` (a list of :class:`HistoryFile` objects).
+
+        The files are sorted chronologically (by date and segment number).
+        """
+        files = []
+        if os.path.isdir(self.directory):
+            for entry in os.listdir(self.directory):
+                match = FILENAME_PATTERN.match(entry)
+                if match:
+                    files.append(HistoryFile(
+                        date=match.group(1),
+                        segment=int(match.group(2) or 0),
+                        pathname=os.path.join(self.directory, entry),
+                    ))
+        return sorted(files, key=lambda f: (f.date, f.segment))
+
+    def append(self, metrics, timestamp=None):
+        """
+        Append a record to the history.
+
+        :param metrics: A list of tuples with two values each: The name of a
+                        metric (a string) and its numeric value.
+        :param timestamp: The number of seconds since the Unix epoch (a number,
+                          defaults to the current time).
+        :returns: The :class:`HistoryFile` that the record was appended to.
+        """
+        timestamp = int(time.time() if timestamp is None else timestamp)
+        names = tuple(name for name, value in metrics)
+        date = time.strftime('%Y%m%d', time.gmtime(timestamp))
+        current = self.current
+        if current is None or current.date != date or current.names != names:
+            if current is not None:
+                current.close()
+            current = self.find_segment(date, names, timestamp)
+            self.current = current
+        current.append(timestamp, [value for name, value in metrics])
+        return current
+
+    def find_segment(self, date, names, timestamp):
+        """
+        Find or create the history file for the given date and metric names.
+
+        :param date: The date of the record (a string in the format ``YYYYMMDD``).
+        :param names: The names of the metrics (a tuple of strings).
+        :param timestamp: The timestamp of the record (a number).
+        :returns: A :class:`HistoryFile` object.
+
+        The most recent segment for the given date is used when it contains
+        the same metrics, otherwise a new segment is created. When another
+        process creates the same segment concurrently its file is used (if
+        the metrics match) or the next segment is tried.
+        """
+        candidates = [f for f in self.files if f.date == date]
+        if candidates and candidates[-1].names == names:
+            return candidates[-1]
+        if not candidates:
+            self.remove_expired(timestamp)
+        segment = candidates[-1].segment + 1 if candidates else 0
+        while True:
+            history_file = HistoryFile(date=date, segment=segment, names=names)
+            history_file.pathname = os.path.join(self.directory, history_file.filename)
+            if history_file.create() or HistoryFile(date=date, pathname=history_file.pathname).names == names:
+                return history_file
+            segment += 1
+
+    def query(self, name, since=None, until=None):
+        """
+        Get the recorded values of a metric.
+
+        :param name: The name of a metric (a string).
+        :param since: The first timestamp to include (a number or :data:`None`).
+        :param until: The last timestamp to include (a number or :data:`None`).
+        :returns: A generator of tuples with two values each: A timestamp (an
+                  integer) and the value of the metric (a float).
+        """
+        first_date = time.strftime('%Y%m%d', time.gmtime(since)) if since is not None else None
+        last_date = time.strftime('%Y%m%d', time.gmtime(until)) if until is not None else None
+        for history_file in self.files:
+            if first_date and history_file.date < first_date:
+                continue
+            if last_date and history_file.date > last_date:
+                break
+            for record in history_file.query(name, since, until):
+                yield record
+
+    def remove_expired(self, timestamp=None):
+        """
+        Remove history files that are older than :attr:`retention`.
+
+        :param timestamp: The current time (a number, defaults to the current time).
+        """
+        if self.retention:
+            cutoff = (time.time() if timestamp is None else timestamp) - self.retention
+            cutoff_date = time.strftime('%Y%m%d', time.gmtime(cutoff))
+            for history_file in self.files:
+                if history_file.date < cutoff_date:
+                    logger.verbose("Removing expired history file %s ..", format_path(history_file.pathname))
+                    os.unlink(history_file.pathname)
+
+
+class HistoryFile(PropertyManager):
+
+    """A single file in the history directory."""
+
+    @required_property
+    def date(self):
+        """The date that the file contains records for (a string in the format ``YYYYMMDD``)."""
+
+    @mutable_property
+    def segment(self):
+        """The segment number (an integer, starts at zero for each day)."""
+        return 0
+
+    @lazy_property
+    def fd(self):
+        """A file descriptor that's opened in append mode (an integer)."""
+        return os.open(self.pathname, os.O_WRONLY | os.O_APPEND)
+
+    @lazy_property
+    def filename(self):
+        """The base name of the file (a string)."""
+        suffix = '-%i' % self.segment if self.segment else ''
+        return 'apache-manager-%s%s.history' % (self.date, suffix)
+
+    @mutable_property
+    def pathname(self):
+        """The absolute pathname of the file (a string)."""
+
+    @lazy_property
+    def header(self):
+        """
+        The parsed header of the file (a tuple with two values).
+
+        The first value is the tuple of metric names and the second value is
+        the size of the header in bytes.
+        """
+        with open(self.pathname, 'rb') as handle:
+            magic, count = HEADER_FORMAT.unpack(handle.read(HEADER_FORMAT.size))
+            if magic != HISTORY_MAGIC:
+                raise ValueError("Not a history file: %s" % self.pathname)
+            names = []
+            for i in range(count):
+                length, = NAME_FORMAT.unpack(handle.read(NAME_FORMAT.size))
+                names.append(handle.read(length).decode('UTF-8'))
+            return tuple(names), handle.tell()
+
+    @mutable_property(cached=True)
+    def names(self):
+        """The names of the metrics stored in the file (a tuple of strings)."""
+        return self.header[0]
+
+    @lazy_property
+    def record_format(self):
+        """A :class:`struct.Struct` object that describes a single record."""
+        return struct.Struct('<I%id' % len(self.names))
+
+    @property
+    def record_count(self):
+        """The number of complete records in the file (an integer)."""
+        size = os.path.getsize(self.pathname) - self.header[1]
+        return max(0, size) // self.record_format.size
+
+    def close(self):
+        """Close :attr:`fd` (if it was opened)."""
+        if 'fd' in self.__dict__:
+            os.close(self.fd)
+            del self.__dict__['fd']
+
+    def create(self):
+        """
+        Create the file and write the header.
+
+        :returns: :data:`True` if the file was created, :data:`False` if it
+                  already existed (for example because another process
+                  created it concurrently), in which case it's left untouched.
+        """
+        directory = os.path.dirname(self.pathname)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        header = [HEADER_FORMAT.pack(HISTORY_MAGIC, len(self.names))]
+        for name in self.names:
+            encoded = name.encode('UTF-8')
+            header.append(NAME_FORMAT.pack(len(encoded)) + encoded)
+        # O_EXCL makes sure that concurrent runs never truncate each other's file.
+        try:
+            fd = os.open(self.pathname, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+        except OSError as e:
+            if e.errno == errno.EEXIST:
+                logger.debug("History file %s already exists.", format_path(self.pathname))
+                return False
+            raise
+        logger.verbose("Creating history file %s ..", format_path(self.pathname))
+        try:
+            os.write(fd, b''.join(header))
+        finally:
+            os.close(fd)
+        return True
+
+    def append(self, timestamp, values):
+        """
+        Append a record to the file.
+
+        :param timestamp: The number of seconds since the Unix epoch (an integer).
+        :param values: A list of numbers (one for each metric in :attr:`names`,
+                       :data:`None` is stored as NaN).
+        """
+        record = self.record_format.pack(timestamp, *[float('nan') if v is None else float(v) for v in values])
+        # We use a single write() on a file descriptor opened in append mode
+        # so that concurrent writers can't interleave partial records.
+        os.write(self.fd, record)
+
+    def query(self, name, since=None, until=None):
+        """
+        Get the recorded values of a metric (see :func:`MetricHistory.query()`).
+
+        The first record in the time range is located using a binary search on
+        the (fixed width) records in the file.
+        """
+        if name not in self.names:
+            return
+        index = self.names.index(name)
+        header_size = self.header[1]
+        record_size = self.record_format.size
+        with open(self.pathname, 'rb') as handle:
+            def read_record(n):
+                handle.seek(header_size + n * record_size)
+                return self.record_format.unpack(handle.read(record_size))
+            low, high = 0, self.record_count
+            if since is not None:
+                while low < high:
+                    middle = (low + high) // 2
+                    if read_record(middle)[0] < since:
+                        low = middle + 1
+                    else:
+                        high = middle
+            handle.seek(header_size + low * record_size)
+            for n in range(low, self.record_count):
+                record = self.record_format.unpack(handle.read(record_size))
+                if until is not None and record[0] > until:
+                    break
+                yield record[0], record[index + 1]
+
+
+def parse_timestamp(value, now=None):
+    """
+    Parse a timestamp given on the command line.
+
+    :param value: One of the following (a string):
+
+                  - A date and optional time in the format ``YYYY-MM-DD [HH:MM[:SS]]``
+                    (interpreted as UTC).
+                  - A timespan like ``90m`` or ``2d`` which is interpreted as
+                    that amount of time ago (see
+                    :func:`~humanfriendly.parse_timespan()`).
+    :param now: The current time (a number, defaults to :func:`time.time()`).
+    :returns: The number of seconds since the Unix epoch (an integer).
+    :raises: :exc:`~exceptions.ValueError` when the value can't be parsed.
+    """
+    value = value.strip()
+    for fmt in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d'):
+        try:
+            parsed = datetime.datetime.strptime(value, fmt)
+            return calendar.timegm(parsed.utctimetuple())
+        except ValueError:
+            pass
+    try:
+        return int((time.time() if now is None else now) - parse_timespan(value))
+    except InvalidTimespan:
+        raise ValueError("Failed to parse timestamp! (%r)" % value)
@@ -1,7 +1,7 @@
 # Monitor and control Apache web server workers from Python.
 #
 # Author: Peter Odding <peter@peterodding.com>
-# Last Change: November 27, 2019
+# Last Change: October 18, 2026
 # URL: https://apache-manager.readthedocs.io
 
 """
@@ -11,8 +11,28 @@ The :mod:`~apache_manager.interactive` module implements a ``top`` like
 interactive viewer for Apache web server metrics using curses_. It can be
 invoked from the command line using ``apache-manager --watch``.
 
-Please note that the functions in this module are not included in the test
-suite and are excluded from coverage calculations because:
+Collecting metrics (fetching the status page and walking ``/proc``) can take a
+while on busy servers, so it's done by a :class:`MetricsCollector` running in a
+background thread. The collector publishes immutable :data:`MetricsSnapshot`
+tuples which the user interface renders at its own frame rate, so that it stays
+responsive to keyboard input while metrics are being collected.
+
+Pressing ``w`` switches between the summary and a table of workers (see
+:class:`WorkerTable`) that can be sorted and scrolled, where the workers that
+:func:`~.ApacheManager.kill_workers()` would currently target are highlighted.
+Screen updates go through a :class:`ScreenBuffer` so that only the cells that
+changed are written to the terminal.
+
+Next to the summary the recent trend of a few key metrics is drawn as
+sparklines (see :class:`TrendTracker`). The recent values are kept in
+:class:`RingBuffer` objects whose size is fixed up front, so the memory usage
+of the interface stays constant during multi-day sessions.
+
+Please note that the curses interface in this module is not included in the
+test suite (only the data structures that don't depend on a terminal, like
+:class:`RingBuffer`, :class:`TrendTracker`, :class:`WorkerTable` and
+:func:`sparkline()`, are tested) and the module is excluded from coverage
+calculations because:
 
 1. For now this module is just an interesting experiment. It might disappear
    completely or I might change it significantly, it all depends on time and
@@ -31,21 +51,588 @@ suite and are excluded from coverage calculations because:
 """
 
 # Standard library modules.
+import array
+import collections
 import curses
+import locale
 import logging
 import sys
+import threading
 import time
 
 # External dependencies.
 import coloredlogs
+from humanfriendly import Timer, format_size, format_timespan, pluralize
 from humanfriendly.terminal import connected_to_terminal, warning
+from property_manager import PropertyManager, lazy_property, mutable_property, required_property
+from verboselogs import VerboseLogger
+
+FRAME_INTERVAL = 0.1
+"""The number of seconds between redraws of the user interface (a number)."""
+
+SPARK_CHARACTERS = u'\u2581\u2582\u2583\u2584\u2585\u2586\u2587\u2588'
+"""The characters used by :func:`sparkline()` on terminals that support Unicode (a string)."""
+
+SPARK_FALLBACK = ' .:-=+*#'
+"""The characters used by :func:`sparkline()` on terminals that don't support Unicode (a string)."""
+
+TREND_WINDOW = 60
+"""The default number of samples retained by :class:`TrendTracker` (an integer)."""
+
+WATCH_INTERVAL = 10
+"""The default number of seconds between metric collections (a number)."""
+
+MetricsSnapshot = collections.namedtuple('MetricsSnapshot', 'lines, workers, trends, timestamp, elapsed, error')
+"""
+The outcome of a single metric collection by :class:`MetricsCollector` (a named tuple).
+
+The fields are the rendered lines (a tuple of strings), the workers (a tuple of
+:data:`WorkerRow` tuples), the trends (a tuple of :data:`Trend` tuples), the
+time at which the collection finished (a number), the number of seconds the
+collection took and the error message of a failed collection (a string or
+:data:`None`).
+"""
+
+Trend = collections.namedtuple('Trend', 'label, values, current')
+"""
+The recent values of a metric (a named tuple).
+
+The fields are a description of the metric (a string), the recent values from
+oldest to newest (a tuple of floats) and the most recent value formatted for
+humans (a string).
+"""
+
+WorkerRow = collections.namedtuple('WorkerRow', 'pid, group, mode, ss, req, cpu, memory, vhost, request, rule')
+"""
+A single row in the worker table (a named tuple).
+
+The ``rule`` field contains the :attr:`~.KillCandidate.rule` of a worker that
+:func:`~.ApacheManager.kill_workers()` would currently target (:data:`None`
+for other workers). The other fields are taken from the
+:class:`~apache_manager.KillableWorker` object and may be :data:`None` (for
+example non-native workers don't have a mode or request).
+"""
+
+SORT_KEYS = {
+    'C': ('cpu', True),
+    'G': ('group', False),
+    'M': ('memory', True),
+    'P': ('pid', False),
+    'T': ('ss', True),
+}
+"""
+The keys that change the sort order of the worker table (a dictionary).
+
+The values are tuples with the name of a :data:`WorkerRow` field and a boolean
+that indicates whether the field is sorted in descending order by default.
+"""
+
+TABLE_COLUMNS = (
+    ('pid', 'PID', 7),
+    ('group', 'GROUP', 12),
+    ('mode', 'M', 1),
+    ('ss', 'SS', 6),
+    ('req', 'REQ', 6),
+    ('cpu', 'CPU%', 6),
+    ('memory', 'MEMORY', 10),
+    ('vhost', 'VHOST', 20),
+    ('request', 'REQUEST', 0),
+)
+"""
+The columns of the worker table (a tuple of tuples).
+
+Each tuple contains the name of a :data:`WorkerRow` field, the column header
+and the width of the column (zero means the column uses the remaining width).
+"""
+
+# Initialize a logger for this module.
+logger = VerboseLogger(__name__)
+
+
+class MetricsCollector(PropertyManager):
+
+    """
+    Collect Apache web server metrics in a background thread.
+
+    The :class:`.ApacheManager` object is only ever used by the background
+    thread, other threads should only access :attr:`snapshot`.
+    """
+
+    @mutable_property
+    def interval(self):
+        """The number of seconds between collections (a number, defaults to :data:`WATCH_INTERVAL`)."""
+        return WATCH_INTERVAL
+
+    @required_property
+    def manager(self):
+        """The :class:`.ApacheManager` object used to collect metrics."""
+
+    @required_property
+    def render(self):
+        """A callable that takes an :class:`.ApacheManager` object and returns a list of lines."""
+
+    @mutable_property
+    def snapshot(self):
+        """The most recent :data:`MetricsSnapshot` (:data:`None` until the first collection finishes)."""
+
+    @lazy_property
+    def stopped(self):
+        """A :class:`threading.Event` that's set when the collector should stop."""
+        return threading.Event()
+
+    @lazy_property
+    def trends(self):
+        """The :class:`TrendTracker` that's updated after every collection."""
+        return TrendTracker()
+
+    @lazy_property
+    def thread(self):
+        """The background thread (a :class:`threading.Thread` object)."""
+        thread = threading.Thread(target=self.run, name='apache-manager-collector')
+        # Don't keep the process alive while a slow collection is running.
+        thread.daemon = True
+        return thread
+
+    @lazy_property
+    def wakeup(self):
+        """A :class:`threading.Event` that's set to request an immediate collection."""
+        return threading.Event()
+
+    def collect(self):
+        """Collect metrics once and publish a new :attr:`snapshot`."""
+        timer = Timer()
+        lines, workers, trends, error = (), (), (), None
+        try:
+            self.manager.refresh()
+            with self.manager.profile_cycle():
+                lines = tuple(self.render(self.manager))
+                workers = collect_workers(self.manager)
+            self.trends.update(self.manager, workers)
+            trends = self.trends.export()
+        except Exception as e:
+            logger.debug("Failed to collect metrics!", exc_info=True)
+            # Keep showing the previous metrics together with the error.
+            if self.snapshot:
+                lines, workers, trends = self.snapshot.lines, self.snapshot.workers, self.snapshot.trends
+            error = str(e) or e.__class__.__name__
+        # Assigning a single attribute is atomic, so readers never observe a
+        # partially updated snapshot.
+        self.snapshot = MetricsSnapshot(
+            lines=lines,
+            workers=workers,
+            trends=trends,
+            timestamp=time.time(),
+            elapsed=timer.elapsed_time,
+            error=error,
+        )
+
+    def refresh(self):
+        """Ask the background thread to collect metrics as soon as possible."""
+        self.wakeup.set()
+
+    def run(self):
+        """Collect metrics every :attr:`interval` seconds until :func:`stop()` is called."""
+        while not self.stopped.is_set():
+            timer = Timer()
+            self.collect()
+            self.wakeup.wait(max(0, self.interval - timer.elapsed_time))
+            self.wakeup.clear()
+
+    def start(self):
+        """Start the background thread."""
+        self.thread.start()
+
+    def stop(self):
+        """Ask the background thread to stop (an ongoing collection is not interrupted)."""
+        self.stopped.set()
+        self.wakeup.set()
+
+
+class RingBuffer(PropertyManager):
+
+    """
+    A fixed size buffer of the most recent values of a metric.
+
+    The storage is allocated when the buffer is created and never grows,
+    appending a value overwrites the oldest value once the buffer is full.
+    """
+
+    @mutable_property
+    def count(self):
+        """The number of values in the buffer (an integer, at most :attr:`size`)."""
+        return 0
+
+    @mutable_property
+    def index(self):
+        """The position where the next value will be stored (an integer)."""
+        return 0
+
+    @required_property
+    def size(self):
+        """The maximum number of values (an integer)."""
+
+    @lazy_property
+    def storage(self):
+        """The preallocated storage (an :class:`array.array` of floats)."""
+        return array.array('d', [0.0] * self.size)
+
+    @property
+    def values(self):
+        """The values in the buffer from oldest to newest (a tuple of floats)."""
+        if self.count < self.size:
+            return tuple(self.storage[:self.count])
+        return tuple(self.storage[self.index:]) + tuple(self.storage[:self.index])
+
+    def append(self, value):
+        """Add a value to the buffer (overwriting the oldest value when the buffer is full)."""
+        self.storage[self.index] = value
+        self.index = (self.index + 1) % self.size
+        self.count = min(self.count + 1, self.size)
 
 
-def watch_metrics(manager):
-    """Watch Apache web server metrics in a ``top`` like interface."""
+class ScreenBuffer(PropertyManager):
+
+    """
+    Only write the cells of a curses screen that changed since the previous frame.
+
+    Every frame the cells are given to :func:`put()` after which :func:`flush()`
+    writes the cells whose text or attributes changed and blanks the cells
+    that weren't given again. Curses already avoids redundant terminal output,
+    but this also avoids redundant calls into curses (which matters when a
+    large table is redrawn ten times per second).
+    """
+
+    @required_property
+    def screen(self):
+        """The curses window to draw on."""
+
+    @mutable_property(cached=True)
+    def current(self):
+        """The cells on the screen (a dictionary that maps ``(y, x)`` tuples to ``(text, attributes)`` tuples)."""
+        return {}
+
+    @mutable_property(cached=True)
+    def pending(self):
+        """The cells of the frame that's being prepared (a dictionary like :attr:`current`)."""
+        return {}
+
+    def flush(self):
+        """Write the changed cells to the screen and refresh it."""
+        height, width = self.screen.getmaxyx()
+        for (y, x), (text, attributes) in self.current.items():
+            if (y, x) not in self.pending:
+                self.write(y, x, ' ' * len(text), 0, width)
+        for (y, x), (text, attributes) in self.pending.items():
+            previous = self.current.get((y, x))
+            if previous != (text, attributes):
+                # Pad the text to erase the remainder of the previous text.
+                if previous and len(previous[0]) > len(text):
+                    text = text.ljust(len(previous[0]))
+                self.write(y, x, text, attributes, width)
+        self.current = self.pending
+        self.pending = {}
+        self.screen.refresh()
+
+    def put(self, y, x, text, attributes=0):
+        """Add a cell to the frame that's being prepared."""
+        self.pending[(y, x)] = (text, attributes)
+
+    def reset(self):
+        """Clear the screen and forget its contents (e.g. after the terminal was resized)."""
+        self.screen.erase()
+        self.current = {}
+
+    def write(self, y, x, text, attributes, width):
+        """Write text to the screen, clipped to the width of the screen."""
+        # Writing to the last column of the screen raises an error.
+        if x < width - 1:
+            self.screen.addnstr(y, x, text, width - 1 - x, attributes)
+
+
+class WorkerTable(PropertyManager):
+
+    """The sortable and scrollable table of workers."""
+
+    @mutable_property
+    def offset(self):
+        """The index of the first visible row (an integer)."""
+        return 0
+
+    @mutable_property
+    def reverse(self):
+        """:data:`True` to sort in descending order, :data:`False` otherwise."""
+        return True
+
+    @mutable_property
+    def sort_key(self):
+        """The name of the :data:`WorkerRow` field used to sort the table (a string)."""
+        return 'memory'
+
+    @mutable_property
+    def sorted_rows(self):
+        """A tuple with the cache key and the sorted rows (see :func:`get_rows()`)."""
+
+    def get_rows(self, snapshot):
+        """
+        Get the sorted rows of a snapshot.
+
+        :param snapshot: A :data:`MetricsSnapshot` tuple.
+        :returns: A list of :data:`WorkerRow` tuples.
+
+        The rows are only sorted when the snapshot or the sort order changes.
+        """
+        key = (id(snapshot), self.sort_key, self.reverse)
+        if not self.sorted_rows or self.sorted_rows[0] != key:
+            field = WorkerRow._fields.index(self.sort_key)
+            # Rows without a value are sorted last regardless of the direction.
+            with_value = [r for r in snapshot.workers if r[field] is not None]
+            without_value = [r for r in snapshot.workers if r[field] is None]
+            with_value.sort(key=lambda r: (r[field], r.pid), reverse=self.reverse)
+            self.sorted_rows = (key, with_value + without_value)
+        return self.sorted_rows[1]
+
+    def handle_key(self, key, page_size):
+        """
+        Handle a key press.
+
+        :param key: The key code returned by :func:`curses.window.getch()`.
+        :param page_size: The number of visible rows (an integer).
+        :returns: :data:`True` if the key was handled, :data:`False` otherwise.
+        """
+        name = chr(key) if 0 <= key < 256 else ''
+        if name in SORT_KEYS:
+            field, descending = SORT_KEYS[name]
+            if field != self.sort_key:
+                self.sort_key = field
+                self.reverse = descending
+            self.offset = 0
+        elif name == 'R':
+            self.reverse = not self.reverse
+        elif key in (curses.KEY_DOWN, ord('j')):
+            self.offset += 1
+        elif key in (curses.KEY_UP, ord('k')):
+            self.offset -= 1
+        elif key in (curses.KEY_NPAGE, ord(' ')):
+            self.offset += page_size
+        elif key == curses.KEY_PPAGE:
+            self.offset -= page_size
+        elif key == curses.KEY_HOME:
+            self.offset = 0
+        elif key == curses.KEY_END:
+            self.offset = sys.maxsize
+        else:
+            return False
+        return True
+
+    def render(self, buffer, snapshot, height, width):
+        """
+        Render the visible part of the table.
+
+        :param buffer: A :class:`ScreenBuffer` object.
+        :param snapshot: A :data:`MetricsSnapshot` tuple.
+        :param height: The number of lines available to the table (an integer).
+        :param width: The width of the screen (an integer).
+
+        Only the visible rows are formatted, so the cost of rendering a frame
+        doesn't depend on the number of workers.
+        """
+        rows = self.get_rows(snapshot)
+        page_size = max(1, height - 2)
+        self.offset = max(0, min(self.offset, len(rows) - page_size))
+        targeted = sum(1 for r in rows if r.rule)
+        buffer.put(0, 0, "%s (%i targeted by the kill policy), sorted by %s (%s), rows %i-%i" % (
+            pluralize(len(rows), "worker"), targeted, self.sort_key,
+            'descending' if self.reverse else 'ascending',
+            min(len(rows), self.offset + 1), min(len(rows), self.offset + page_size),
+        ), curses.A_BOLD)
+        x = 0
+        for field, header, size in TABLE_COLUMNS:
+            buffer.put(1, x, header.rjust(size) + ' ' if size else header.ljust(width), curses.A_REVERSE)
+            x += size + 1
+        for lnum, row in enumerate(rows[self.offset:self.offset + page_size], start=2):
+            attributes = curses.A_STANDOUT if row.rule else 0
+            x = 0
+            for field, header, size in TABLE_COLUMNS:
+                text = format_cell(field, getattr(row, field))
+                # The trailing space keeps highlighted rows contiguous.
+                buffer.put(lnum, x, text[:size].rjust(size) + ' ' if size else text, attributes)
+                x += size + 1
+
+
+class TrendTracker(PropertyManager):
+
+    """
+    Track the recent values of key metrics in :class:`RingBuffer` objects.
+
+    The following metrics are tracked:
+
+    - The number of requests per second (computed from the difference in
+      ``Total Accesses`` between successive collections).
+    - The number of busy workers.
+    - The average and maximum memory usage of each group of workers.
+    - The number of workers targeted by the kill thresholds (in the ``--watch``
+      interface workers aren't actually killed).
+
+    Buffers of groups that disappear are discarded, so the memory usage only
+    depends on :attr:`window` and the number of groups.
+    """
+
+    @lazy_property
+    def buffers(self):
+        """The tracked metrics (an ordered dictionary that maps labels to :class:`RingBuffer` objects)."""
+        return collections.OrderedDict()
+
+    @mutable_property
+    def previous(self):
+        """The ``(timestamp, total_accesses)`` tuple of the previous collection (or :data:`None`)."""
+
+    @mutable_property
+    def window(self):
+        """The number of samples retained per metric (an integer, defaults to :data:`TREND_WINDOW`)."""
+        return TREND_WINDOW
+
+    def add_value(self, label, value):
+        """Add a value to the :class:`RingBuffer` with the given label (creating it when needed)."""
+        if label not in self.buffers:
+            self.buffers[label] = RingBuffer(size=self.window)
+        self.buffers[label].append(value)
+
+    def export(self):
+        """Get the tracked metrics as immutable data (a tuple of :data:`Trend` tuples)."""
+        trends = []
+        for label, buffer in self.buffers.items():
+            values = buffer.values
+            if 'memory' in label:
+                current = format_size(values[-1], binary=True)
+            else:
+                current = '%g' % round(values[-1], 2)
+            trends.append(Trend(label=label, values=values, current=current))
+        return tuple(trends)
+
+    def update(self, manager, workers):
+        """
+        Add a sample of the tracked metrics.
+
+        :param manager: An :class:`.ApacheManager` object.
+        :param workers: The result of :func:`collect_workers()`.
+        """
+        metrics = manager.server_metrics
+        timestamp = time.time()
+        if self.previous:
+            elapsed = timestamp - self.previous[0]
+            delta = metrics['total_accesses'] - self.previous[1]
+            # Apache restarts reset the counter, we ignore those intervals.
+            if elapsed > 0 and delta >= 0:
+                self.add_value("Requests/s", delta / elapsed)
+        self.previous = (timestamp, metrics['total_accesses'])
+        self.add_value("Busy workers", metrics['busy_workers'])
+        memory = collections.defaultdict(list)
+        for row in workers:
+            if row.memory is not None:
+                memory[row.group].append(row.memory)
+        labels = set()
+        for group, values in sorted(memory.items()):
+            for label, value in (("%s avg memory" % group, sum(values) / float(len(values))),
+                                 ("%s max memory" % group, max(values))):
+                self.add_value(label, value)
+                labels.add(label)
+        self.add_value("Targeted workers", sum(1 for r in workers if r.rule))
+        for label in list(self.buffers):
+            if 'memory' in label and label not in labels:
+                del self.buffers[label]
+
+
+def collect_workers(manager):
+    """
+    Get the workers known to an :class:`.ApacheManager` object.
+
+    :param manager: An :class:`.ApacheManager` object.
+    :returns: A tuple of :data:`WorkerRow` tuples.
+    """
+    rules = dict((c.worker.pid, c.rule) for c in manager.find_kill_candidates())
+    rows = []
+    for worker in manager.killable_workers:
+        rows.append(WorkerRow(
+            pid=worker.pid,
+            group=worker.group_name,
+            mode=getattr(worker, 'm', None),
+            ss=getattr(worker, 'ss', None),
+            req=getattr(worker, 'req', None),
+            cpu=worker.cpu_percent,
+            memory=worker.memory_usage,
+            vhost=getattr(worker, 'vhost', None),
+            request=getattr(worker, 'request', None),
+            rule=rules.get(worker.pid),
+        ))
+    return tuple(rows)
+
+
+def sparkline(values, width, characters=SPARK_CHARACTERS):
+    """
+    Render values as a sparkline.
+
+    :param values: A sequence of numbers (from oldest to newest).
+    :param width: The maximum number of characters (an integer). When there
+                  are more values than characters the most recent values
+                  are used.
+    :param characters: The characters that represent increasing values (a
+                       string, defaults to :data:`SPARK_CHARACTERS`).
+    :returns: The sparkline (a string).
+    """
+    values = values[-width:] if width > 0 else ()
+    if not values:
+        return ''
+    low, high = min(values), max(values)
+    scale = (len(characters) - 1) / float(high - low) if high > low else 0
+    return ''.join(characters[int((v - low) * scale)] for v in values)
+
+
+def render_trends(buffer, trends, y, x, height, width, characters=SPARK_CHARACTERS):
+    """
+    Render the recent trend of metrics as sparklines.
+
+    :param buffer: A :class:`ScreenBuffer` object.
+    :param trends: A tuple of :data:`Trend` tuples.
+    :param y: The first line of the panel (an integer).
+    :param x: The first column of the panel (an integer).
+    :param height: The number of lines available (an integer).
+    :param width: The number of columns available (an integer).
+    :param characters: Refer to :func:`sparkline()`.
+    """
+    if height < 2 or width < 30 or not trends:
+        return
+    buffer.put(y, x, "Trends:", curses.A_BOLD)
+    label_width = min(max(len(t.label) for t in trends), width // 3)
+    spark_width = width - label_width - 12
+    for lnum, trend in enumerate(trends[:height - 1], start=y + 1):
+        buffer.put(lnum, x, trend.label[:label_width].ljust(label_width + 1))
+        buffer.put(lnum, x + label_width + 1, sparkline(trend.values, spark_width, characters).ljust(spark_width + 1))
+        buffer.put(lnum, x + label_width + spark_width + 2, trend.current)
+
+
+def format_cell(field, value):
+    """Format the value of a :data:`WorkerRow` field for the worker table (a string)."""
+    if value is None:
+        return '-'
+    elif field == 'memory':
+        return format_size(value, binary=True)
+    elif field == 'cpu':
+        return '%.1f' % value
+    return str(value)
+
+
+def watch_metrics(manager, interval=WATCH_INTERVAL):
+    """
+    Watch Apache web server metrics in a ``top`` like interface.
+
+    :param manager: An :class:`.ApacheManager` object.
+    :param interval: The number of seconds between metric collections (a number).
+    """
     if connected_to_terminal(sys.stdout):
+        # Enable curses to output the characters used by sparklines.
+        locale.setlocale(locale.LC_ALL, '')
         try:
-            curses.wrapper(redraw_loop, manager)
+            curses.wrapper(redraw_loop, manager, interval)
         except KeyboardInterrupt:
             pass
     else:
@@ -53,8 +640,16 @@ def watch_metrics(manager):
         sys.exit(1)
 
 
-def redraw_loop(screen, manager):
-    """The main loop that continuously redraws Apache web server metrics."""
+def redraw_loop(screen, manager, interval=WATCH_INTERVAL):
+    """
+    The main loop that continuously redraws Apache web server metrics.
+
+    Metrics are collected by a :class:`MetricsCollector` while this loop
+    redraws the screen every :data:`FRAME_INTERVAL` seconds. Press ``q`` to
+    quit, ``r`` to collect metrics immediately and ``w`` to switch between
+    the summary and the worker table (see :class:`WorkerTable` for the keys
+    that sort and scroll the table).
+    """
     # Ugly workaround to avoid circular import errors due to interdependencies
     # between the apache_manager.cli and apache_manager.interactive modules.
     from apache_manager.cli import report_metrics, line_is_heading
@@ -66,31 +661,70 @@ def redraw_loop(screen, manager):
     curses.noraw()
     # Enable non-blocking getch().
     screen.nodelay(True)
+    buffer = ScreenBuffer(screen=screen)
+    table = WorkerTable()
+    show_table = False
+    encoding = (locale.getpreferredencoding() or '').lower().replace('-', '')
+    characters = SPARK_CHARACTERS if encoding == 'utf8' else SPARK_FALLBACK
+    collector = MetricsCollector(manager=manager, render=report_metrics, interval=interval)
+    collector.start()
     try:
         # Repeat until the user aborts.
         while True:
-            lnum = 0
-            for line in report_metrics(manager):
-                attributes = 0
-                if line_is_heading(line):
-                    attributes |= curses.A_BOLD
-                screen.addstr(lnum, 0, line, attributes)
-                lnum += 1
-            # Redraw screen.
-            screen.refresh()
-            # Wait a while before refreshing the screen, but enable the user to
-            # quit in the mean time.
-            for i in range(10):
-                if screen.getch() == ord('q'):
+            height, width = screen.getmaxyx()
+            # Handle all keys pressed since the previous frame.
+            key = screen.getch()
+            while key != -1:
+                if key == ord('q'):
                     return
-                # Don't burn through CPU like crazy :-).
-                time.sleep(0.1)
-            # Update metrics in next iteration.
-            manager.refresh()
-            # Clear screen for next iteration.
-            screen.erase()
+                elif key == ord('r'):
+                    collector.refresh()
+                elif key == ord('w'):
+                    show_table = not show_table
+                elif key == curses.KEY_RESIZE:
+                    buffer.reset()
+                elif show_table:
+                    table.handle_key(key, height - 3)
+                key = screen.getch()
+            snapshot = collector.snapshot
+            if snapshot and show_table:
+                table.render(buffer, snapshot, height - 1, width)
+            elif snapshot:
+                for lnum, line in enumerate(snapshot.lines[:height - 1]):
+                    buffer.put(lnum, 0, line, curses.A_BOLD if line_is_heading(line) else 0)
+                # Draw the trends next to the summary when there's room,
+                # otherwise below the summary.
+                offset = max([len(line) for line in snapshot.lines] + [0]) + 3
+                if width - offset >= 40:
+                    render_trends(buffer, snapshot.trends, 0, offset, height - 1, width - offset, characters)
+                else:
+                    lnum = len(snapshot.lines) + 1
+                    render_trends(buffer, snapshot.trends, lnum, 0, height - 1 - lnum, width, characters)
+            buffer.put(height - 1, 0, format_status_line(snapshot, show_table), curses.A_REVERSE)
+            buffer.flush()
+            # Don't burn through CPU like crazy :-).
+            time.sleep(FRAME_INTERVAL)
     finally:
+        collector.stop()
         # Restore cursor mode.
         curses.curs_set(cursor_mode)
         # Clean up the screen after we're done.
         screen.erase()
+
+
+def format_status_line(snapshot, show_table=False):
+    """Format the "last updated" indicator shown on the bottom line of the screen (a string)."""
+    if snapshot:
+        status = "Last updated %s ago, collection took %i ms" % (
+            format_timespan(max(0, int(time.time() - snapshot.timestamp))),
+            snapshot.elapsed * 1000,
+        )
+        if snapshot.error:
+            status += " (failed: %s)" % snapshot.error
+    else:
+        status = "Collecting metrics .."
+    if show_table:
+        status += " | %s: sort, R: reverse, w: summary, q: quit" % '/'.join(sorted(SORT_KEYS))
+    else:
+        status += " | r: refresh, w: workers, q: quit"
+    return status
@@ -0,0 +1,205 @@
+# Monitor and control Apache web server workers from Python.
+#
+# Author: Peter Odding <peter@peterodding.com>
+# Last Change: October 18, 2026
+# URL: https://apache-manager.readthedocs.io
+
+"""
+Race free signaling of worker processes.
+
+Between the moment that the Apache manager inspects a worker process and the
+moment that it decides to kill the worker, the worker may have exited and its
+process ID may have been reused by an unrelated process. The
+:mod:`~apache_manager.processes` module avoids this race condition using
+process file descriptors (see :manpage:`pidfd_open(2)`):
+
+1. A process file descriptor is opened using :func:`open_process()`, after
+   which the start time of the process is compared to the start time that was
+   recorded when the worker was inspected. If they differ the process ID was
+   reused and the process is left alone.
+
+2. Signals are sent through the file descriptor (see
+   :func:`ProcessHandle.send_signal()`), so they can't reach another process
+   even if the process ID is reused in the mean time.
+
+3. Process file descriptors become readable when the process exits, so
+   :func:`wait_for_exit()` can wait for any number of processes at once using a
+   single :func:`select.poll()` object.
+
+On systems without process file descriptors (Python < 3.9 or Linux < 5.3)
+signals are sent using :func:`os.kill()` and ``/proc`` is polled instead.
+"""
+
+# Standard library modules.
+import errno
+import os
+import select
+import signal
+
+# External dependencies.
+from humanfriendly import Timer
+from proc.core import parse_process_status
+from property_manager import PropertyManager, mutable_property, required_property
+from verboselogs import VerboseLogger
+
+# Public identifiers that require documentation.
+__all__ = (
+    'EXIT_POLL_INTERVAL',
+    'HAVE_PIDFD',
+    'PROC_ROOT',
+    'ProcessHandle',
+    'logger',
+    'open_process',
+    'wait_for_exit',
+)
+
+EXIT_POLL_INTERVAL = 0.1
+"""The number of seconds between checks of ``/proc`` when process file descriptors aren't available (a number)."""
+
+PROC_ROOT = '/proc'
+"""
+The default mount point of the ``proc`` file system (a string).
+
+This is the default value of :attr:`.ApacheManager.proc_root`.
+"""
+
+HAVE_PIDFD = hasattr(os, 'pidfd_open') and hasattr(signal, 'pidfd_send_signal')
+"""
+:data:`True` if Python supports process file descriptors, :data:`False` otherwise.
+
+Even when this is :data:`True` the kernel may not support process file
+descriptors, in which case :func:`open_process()` falls back to process IDs.
+"""
+
+# Initialize a logger for this module.
+logger = VerboseLogger(__name__)
+
+
+class ProcessHandle(PropertyManager):
+
+    """A handle for a process that was verified to be the expected process (see :func:`open_process()`)."""
+
+    @required_property
+    def pid(self):
+        """The process ID (an integer)."""
+
+    @mutable_property
+    def pidfd(self):
+        """The process file descriptor (an integer or :data:`None` when not available)."""
+
+    @mutable_property
+    def proc_root(self):
+        """The mount point of the ``proc`` file system (a string, defaults to :data:`PROC_ROOT`)."""
+        return PROC_ROOT
+
+    @property
+    def is_alive(self):
+        """:data:`True` if the process hasn't exited yet, :data:`False` otherwise."""
+        if self.pidfd is not None:
+            poller = select.poll()
+            poller.register(self.pidfd, select.POLLIN)
+            return not poller.poll(0)
+        stat_fields = parse_process_status(os.path.join(self.proc_root, str(self.pid)), silent=True)
+        return bool(stat_fields and stat_fields[2] != 'Z')
+
+    def close(self):
+        """Close the process file descriptor (if any)."""
+        if self.pidfd is not None:
+            os.close(self.pidfd)
+            self.pidfd = None
+
+    def send_signal(self, signal_number):
+        """
+        Send a signal to the process.
+
+        :param signal_number: The signal to send (an integer).
+        :returns: :data:`True` if the signal was sent, :data:`False` if the
+                  process had already exited.
+        :raises: :exc:`~exceptions.OSError` when the signal can't be sent for
+                 another reason (e.g. insufficient privileges).
+        """
+        try:
+            if self.pidfd is not None:
+                signal.pidfd_send_signal(self.pidfd, signal_number)
+            else:
+                os.kill(self.pid, signal_number)
+            return True
+        except OSError as e:
+            if e.errno == errno.ESRCH:
+                return False
+            raise
+
+
+def open_process(pid, start_ticks=None, use_pidfd=HAVE_PIDFD, proc_root=PROC_ROOT):
+    """
+    Open a handle for a process, making sure it's still the expected process.
+
+    :param pid: The process ID (an integer).
+    :param start_ticks: The expected start time of the process (see
+                        :func:`.ApacheManager.get_start_ticks()`) or
+                        :data:`None` to skip this check.
+    :param use_pidfd: :data:`False` to use process IDs instead of process file
+                      descriptors (defaults to :data:`HAVE_PIDFD`).
+    :param proc_root: The mount point of the ``proc`` file system (a string,
+                      defaults to :data:`PROC_ROOT`).
+    :returns: A :class:`ProcessHandle` object or :data:`None` when the process
+              has exited (or its process ID has been reused).
+    """
+    pidfd = None
+    if use_pidfd:
+        try:
+            pidfd = os.pidfd_open(pid)
+        except OSError as e:
+            if e.errno == errno.ESRCH:
+                return None
+            # The kernel doesn't support process file descriptors (or the
+            # system call is blocked) so we fall back to process IDs.
+            logger.debug("Failed to open process file descriptor for %i, falling back to process ID! (%s)", pid, e)
+    # The start time is checked after opening the process file descriptor,
+    # because from then on the file descriptor refers to a single process.
+    if start_ticks is not None:
+        stat_fields = parse_process_status(os.path.join(proc_root, str(pid)), silent=True)
+        if not stat_fields or int(stat_fields[21]) != start_ticks:
+            logger.verbose("Process %i has exited or its process ID was reused.", pid)
+            if pidfd is not None:
+                os.close(pidfd)
+            return None
+    return ProcessHandle(pid=pid, pidfd=pidfd, proc_root=proc_root)
+
+
+def wait_for_exit(handles, timeout):
+    """
+    Wait for processes to exit.
+
+    :param handles: An iterable of :class:`ProcessHandle` objects.
+    :param timeout: The maximum number of seconds to wait (a number).
+    :returns: A set with the process IDs of the processes that exited.
+
+    All processes are waited for at the same time, so the time spent is
+    bounded by `timeout` regardless of the number of processes.
+    """
+    timer = Timer()
+    remaining = dict((h.pid, h) for h in handles)
+    exited = set()
+    poller = select.poll()
+    by_fd = {}
+    for handle in remaining.values():
+        if handle.pidfd is not None:
+            poller.register(handle.pidfd, select.POLLIN)
+            by_fd[handle.pidfd] = handle
+    while remaining:
+        # Check the processes that don't have a file descriptor using /proc.
+        for handle in list(remaining.values()):
+            if handle.pidfd is None and not handle.is_alive:
+                exited.add(remaining.pop(handle.pid).pid)
+        if not remaining:
+            break
+        time_left = timeout - timer.elapsed_time
+        if time_left <= 0:
+            break
+        if any(h.pidfd is None for h in remaining.values()):
+            time_left = min(time_left, EXIT_POLL_INTERVAL)
+        for fd, events in poller.poll(int(time_left * 1000)):
+            poller.unregister(fd)
+            exited.add(remaining.pop(by_fd[fd].pid).pid)
+    return exited
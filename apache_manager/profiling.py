@@ -0,0 +1,326 @@
+# Monitor and control Apache web server workers from Python.
+#
+# Author: Peter Odding <peter@peterodding.com>
+# Last Change: October 18, 2026
+# URL: https://apache-manager.readthedocs.io
+
+"""
+Profiling of monitoring cycles.
+
+The :mod:`~apache_manager.profiling` module makes it possible to find hot
+paths on production servers by profiling the cycles of the Apache manager
+(see :func:`.ApacheManager.profile_cycle()`). Two profilers are supported:
+
+``cprofile``
+  The deterministic profiler in the Python standard library
+  (:mod:`cProfile`). It reports exact call counts but slows down the profiled
+  code considerably.
+
+``sampling``
+  A statistical profiler (see :class:`SamplingProfiler`) that records the
+  call stack of the profiled thread at a fixed interval from a background
+  thread. Because the profiled code isn't instrumented its overhead is
+  negligible, so it can be left enabled in production.
+
+Both profilers save their results in the format of the :mod:`pstats` module,
+so the usual tools (``python -m pstats``, SnakeViz, gprof2dot, etc.) can be
+used to analyze them. To limit the overhead and the disk space used a
+:class:`CycleProfiler` can profile only every Nth cycle, save only the
+profiles of cycles that exceeded a latency budget and keep a limited number
+of old profiles.
+"""
+
+# Standard library modules.
+import collections
+import contextlib
+import cProfile
+import marshal
+import os
+import sys
+import threading
+import time
+
+# External dependencies.
+from humanfriendly import Timer, concatenate, format_path, format_timespan
+from property_manager import PropertyManager, lazy_property, mutable_property, required_property, writable_property
+from verboselogs import VerboseLogger
+
+# Public identifiers that require documentation.
+__all__ = (
+    'PROFILE_MODES',
+    'PROFILE_ROTATE',
+    'SAMPLE_INTERVAL',
+    'CycleProfiler',
+    'SamplingProfiler',
+    'logger',
+)
+
+PROFILE_MODES = ('cprofile', 'sampling')
+"""The supported values of :attr:`CycleProfiler.mode` (a tuple of strings)."""
+
+PROFILE_ROTATE = 5
+"""The default value of :attr:`CycleProfiler.rotate` (an integer)."""
+
+SAMPLE_INTERVAL = 0.01
+"""The default number of seconds between samples taken by :class:`SamplingProfiler` (a number)."""
+
+# Initialize a logger for this module.
+logger = VerboseLogger(__name__)
+
+
+class CycleProfiler(PropertyManager):
+
+    """Profile (a selection of) the cycles of the Apache manager and save the results."""
+
+    @required_property
+    def filename(self):
+        """
+        The pathname of the file where profiles are saved (a string).
+
+        When a profile is saved an existing file is rotated, i.e. it's renamed
+        to ``FILENAME.1`` (after ``FILENAME.1`` was renamed to ``FILENAME.2``
+        and so on, see :attr:`rotate`).
+        """
+
+    @mutable_property
+    def every(self):
+        """Profile every Nth cycle (an integer, defaults to 1 which means every cycle is profiled)."""
+        return 1
+
+    @mutable_property
+    def latency_budget(self):
+        """
+        Only save profiles of cycles that took longer than this (a number of seconds).
+
+        The duration of a cycle isn't known until it has finished, so every
+        selected cycle is profiled, but the profiles of cycles that finished
+        within the budget are discarded. The default is zero, which means
+        the profiles of all selected cycles are saved.
+        """
+        return 0
+
+    @mutable_property
+    def mode(self):
+        """
+        The profiler to use (one of the strings in :data:`PROFILE_MODES`).
+
+        Defaults to ``cprofile``.
+
+        Unsupported values are reported by :func:`create_profiler()`, in
+        which case :func:`profile_cycle()` logs a warning and runs the cycle
+        without a profiler.
+        """
+        return 'cprofile'
+
+    @writable_property
+    def num_cycles(self):
+        """The number of cycles seen by :func:`profile_cycle()` (an integer)."""
+        return 0
+
+    @mutable_property
+    def rotate(self):
+        """The number of old profiles to keep (an integer, defaults to :data:`PROFILE_ROTATE`)."""
+        return PROFILE_ROTATE
+
+    @mutable_property
+    def sample_interval(self):
+        """The number of seconds between samples in ``sampling`` mode (a number, see :data:`SAMPLE_INTERVAL`)."""
+        return SAMPLE_INTERVAL
+
+    def create_profiler(self):
+        """
+        Create a profiler according to :attr:`mode`.
+
+        :returns: A :class:`cProfile.Profile` or :class:`SamplingProfiler` object.
+        :raises: :exc:`~exceptions.ValueError` when :attr:`mode` isn't supported.
+        """
+        if self.mode == 'cprofile':
+            return cProfile.Profile()
+        elif self.mode == 'sampling':
+            return SamplingProfiler(interval=self.sample_interval)
+        msg = "Unsupported profile mode %r! (supported values are %s)"
+        raise ValueError(msg % (self.mode, concatenate(map(repr, PROFILE_MODES))))
+
+    @contextlib.contextmanager
+    def profile_cycle(self):
+        """
+        Profile a single cycle (a context manager).
+
+        Cycles that aren't selected by :attr:`every` run without a profiler.
+        Profiles are saved using :func:`save_profile()` unless the cycle
+        finished within :attr:`latency_budget`. Failing to start the profiler
+        (for example because :attr:`mode` isn't supported) or to save a
+        profile is logged but doesn't interrupt the cycle.
+        """
+        self.num_cycles += 1
+        if (self.num_cycles - 1) % max(1, self.every) != 0:
+            yield
+            return
+        try:
+            profiler = self.create_profiler()
+            # Python 3.12+ refuses to run two profilers at the same time.
+            profiler.enable()
+        except ValueError as e:
+            logger.warning("Failed to start profiler, not profiling this cycle! (%s)", e)
+            yield
+            return
+        timer = Timer()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            elapsed = timer.elapsed_time
+            if self.latency_budget and elapsed <= self.latency_budget:
+                logger.debug("Discarding profile of cycle that took %s (within budget of %s).",
+                             format_timespan(elapsed), format_timespan(self.latency_budget))
+            else:
+                try:
+                    self.save_profile(profiler)
+                    logger.info("Saved profile of cycle that took %s to %s.",
+                                format_timespan(elapsed), format_path(self.filename))
+                except Exception as e:
+                    logger.warning("Failed to save profile to %s! (%s)", format_path(self.filename), e)
+
+    def save_profile(self, profiler):
+        """
+        Save a profile to :attr:`filename`, rotating the existing profiles.
+
+        :param profiler: A :class:`cProfile.Profile` or :class:`SamplingProfiler` object.
+        """
+        temporary_file = '%s.tmp' % self.filename
+        profiler.dump_stats(temporary_file)
+        if os.path.exists(self.filename):
+            if self.rotate > 0:
+                for number in range(self.rotate - 1, 0, -1):
+                    older = '%s.%i' % (self.filename, number)
+                    if os.path.exists(older):
+                        os.rename(older, '%s.%i' % (self.filename, number + 1))
+                os.rename(self.filename, '%s.1' % self.filename)
+        os.rename(temporary_file, self.filename)
+
+
+class SamplingProfiler(PropertyManager):
+
+    """
+    Statistical profiler that samples the call stack of a thread.
+
+    The interface of this class mimics :class:`cProfile.Profile`: Call
+    :func:`enable()` in the thread to profile, :func:`disable()` when done and
+    :func:`dump_stats()` to save the results. The statistics are estimated
+    from the samples, so the "number of calls" of a function is the number of
+    samples in which the function was running. Each sample accounts for the
+    time that passed since the previous sample, because the background
+    thread may take longer than :attr:`interval` to acquire the global
+    interpreter lock.
+    """
+
+    @mutable_property
+    def interval(self):
+        """The number of seconds between samples (a number, defaults to :data:`SAMPLE_INTERVAL`)."""
+        return SAMPLE_INTERVAL
+
+    @lazy_property
+    def samples(self):
+        """The number of times each call stack was sampled (a :class:`collections.Counter` object)."""
+        return collections.Counter()
+
+    @lazy_property
+    def seconds(self):
+        """The time accounted to each call stack (a :class:`collections.Counter` object)."""
+        return collections.Counter()
+
+    @lazy_property
+    def stopped(self):
+        """A :class:`threading.Event` object that's set by :func:`disable()`."""
+        return threading.Event()
+
+    @mutable_property
+    def target(self):
+        """The identifier of the thread being profiled (an integer or :data:`None`)."""
+
+    @mutable_property
+    def thread(self):
+        """The background thread that takes the samples (a :class:`threading.Thread` object or :data:`None`)."""
+
+    def disable(self):
+        """Stop taking samples."""
+        if self.thread:
+            self.stopped.set()
+            self.thread.join()
+            self.thread = None
+
+    def dump_stats(self, filename):
+        """
+        Save the statistics in the format of the :mod:`pstats` module.
+
+        :param filename: The pathname of the file to write (a string).
+        """
+        with open(filename, 'wb') as handle:
+            marshal.dump(self.get_stats(), handle)
+
+    def enable(self):
+        """Start taking samples of the current thread."""
+        self.target = threading.current_thread().ident
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.run, name='apache-manager-sampler')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def get_stats(self):
+        """
+        Convert the samples to statistics (a dictionary).
+
+        :returns: A dictionary in the format used by :mod:`pstats`: The keys
+                  are tuples with a filename, line number and function name
+                  and the values are tuples with the primitive call count, the
+                  call count, the internal time, the cumulative time and a
+                  dictionary with the statistics per caller.
+        """
+        stats = {}
+        for stack, count in self.samples.items():
+            elapsed = self.seconds[stack]
+            seen = set()
+            # The first function in the stack is the one that was running.
+            for depth, function in enumerate(stack):
+                cc, nc, tt, ct, callers = stats.get(function, (0, 0, 0.0, 0.0, {}))
+                if depth == 0:
+                    tt += elapsed
+                # Recursive functions are only counted once per sample.
+                if function not in seen:
+                    seen.add(function)
+                    cc += count
+                    nc += count
+                    ct += elapsed
+                    if depth + 1 < len(stack):
+                        caller = stack[depth + 1]
+                        c_cc, c_nc, c_tt, c_ct = callers.get(caller, (0, 0, 0.0, 0.0))
+                        callers[caller] = (c_cc + count, c_nc + count,
+                                           c_tt + (elapsed if depth == 0 else 0.0), c_ct + elapsed)
+                stats[function] = (cc, nc, tt, ct, callers)
+        return stats
+
+    def run(self):
+        """Take samples until :func:`disable()` is called (runs in :attr:`thread`)."""
+        last_sample = time.time()
+        while not self.stopped.wait(self.interval):
+            now = time.time()
+            self.take_sample(now - last_sample)
+            last_sample = now
+
+    def take_sample(self, elapsed=None):
+        """
+        Record the current call stack of the profiled thread in :attr:`samples`.
+
+        :param elapsed: The time since the previous sample (a number,
+                        defaults to :attr:`interval`).
+        """
+        frame = sys._current_frames().get(self.target)
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+            frame = frame.f_back
+        if stack:
+            stack = tuple(stack)
+            self.samples[stack] += 1
+            self.seconds[stack] += self.interval if elapsed is None else elapsed
@@ -0,0 +1,301 @@
+# Monitor and control Apache web server workers from Python.
+#
+# Author: Peter Odding <peter@peterodding.com>
+# Last Change: October 18, 2026
+# URL: https://apache-manager.readthedocs.io
+
+"""
+Record and replay the raw inputs of the Apache manager.
+
+The :mod:`~apache_manager.replay` module makes it possible to capture the
+exact inputs that a run of the Apache manager saw (the status pages, the
+discovered listen addresses and the relevant process information from
+``/proc``) and to feed those inputs back into :class:`.ApacheManager` later on
+(without touching the network or ``/proc``). This is useful to reproduce
+incidents and to benchmark the parsing and policy code on real world data.
+
+Captures are stored as gzip compressed files containing one JSON document per
+line, one for each recorded cycle. Because concatenated gzip streams form a
+valid gzip file, cycles can be appended by separate invocations of the
+Apache manager (e.g. from a cron job).
+"""
+
+# Standard library modules.
+import gzip
+import json
+import time
+
+# External dependencies.
+from humanfriendly import Timer, format_path, pluralize
+from property_manager import PropertyManager, cached_property, mutable_property, required_property
+from verboselogs import VerboseLogger
+
+# Modules included in our package.
+from apache_manager import ApacheManager, NetworkAddress, WorkerStatus
+
+# Public identifiers that require documentation.
+__all__ = (
+    'RecordedProcess',
+    'ReplayManager',
+    'capture_snapshot',
+    'logger',
+    'read_capture',
+    'record_snapshot',
+    'replay_capture',
+)
+
+# Initialize a logger for this module.
+logger = VerboseLogger(__name__)
+
+
+def capture_snapshot(manager):
+    """
+    Capture the raw inputs of an :class:`.ApacheManager` object.
+
+    :param manager: An :class:`.ApacheManager` object.
+    :returns: A dictionary that can be serialized to JSON.
+    """
+    return dict(
+        timestamp=time.time(),
+        listen_addresses=[
+            dict(protocol=a.protocol, address=a.address, port=a.port)
+            for a in manager.listen_addresses
+        ],
+        text_status=manager.text_status,
+        memory_pressure=manager.memory_pressure,
+        cgroup_path=manager.cgroup_path,
+        cgroup_stats=manager.cgroup_stats,
+        system_memory=manager.system_memory,
+        # The HTML status page is a byte string, Latin-1 provides a lossless
+        # mapping from bytes to text that can be stored in JSON documents.
+        html_status=manager.html_status.decode('latin-1'),
+        processes=[
+            dict(
+                pid=process.pid,
+                ppid=process.ppid,
+                rss=process.rss,
+                starttime=process.starttime,
+                cmdline=process.cmdline,
+                wsgi_process_group=process.wsgi_process_group,
+                memory_info=manager.memory_info.get(process.pid),
+                cpu_time=manager.get_cpu_time(process),
+                start_ticks=manager.get_start_ticks(process),
+            ) for process in manager.apache_workers
+        ],
+    )
+
+
+def record_snapshot(manager, filename):
+    """
+    Append the raw inputs of an :class:`.ApacheManager` object to a capture file.
+
+    :param manager: An :class:`.ApacheManager` object.
+    :param filename: The pathname of the capture file (a string).
+    """
+    snapshot = capture_snapshot(manager)
+    logger.verbose("Recording snapshot of %s in %s ..",
+                   pluralize(len(snapshot['processes']), "process", "processes"),
+                   format_path(filename))
+    with gzip.open(filename, 'ab') as handle:
+        handle.write(json.dumps(snapshot).encode('UTF-8') + b'\n')
+
+
+def read_capture(filename):
+    """
+    Read the snapshots in a capture file.
+
+    :param filename: The pathname of the capture file (a string).
+    :returns: A generator of dictionaries (see :func:`capture_snapshot()`).
+    """
+    with gzip.open(filename, 'rb') as handle:
+        for line in handle:
+            if line.strip():
+                yield json.loads(line.decode('UTF-8'))
+
+
+def replay_capture(filename, **options):
+    """
+    Feed the snapshots in a capture file through the parsing and policy code.
+
+    :param filename: The pathname of the capture file (a string).
+    :param options: Any keyword arguments are passed on to the
+                    :class:`ReplayManager` constructor.
+    :returns: A dictionary with the number of replayed ``cycles``, the
+              number of ``workers`` and ``killed`` workers and the
+              ``elapsed`` time in seconds.
+
+    For every snapshot the server metrics, worker status and memory usage are
+    computed and :func:`~.ApacheManager.kill_workers()` is run (the
+    :class:`RecordedProcess` objects used during replay can't be killed).
+    """
+    timer = Timer()
+    totals = dict(cycles=0, workers=0, killed=0)
+    manager = None
+    for snapshot in read_capture(filename):
+        # We reuse a single manager (like a long running process would) so
+        # that state like the CPU utilization history carries over.
+        if manager is None:
+            manager = ReplayManager(snapshot=snapshot, **options)
+        else:
+            manager.snapshot = snapshot
+            manager.refresh()
+        manager.server_metrics
+        manager.memory_usage
+        manager.wsgi_process_groups
+        totals['workers'] += len(manager.killable_workers)
+        totals['killed'] += len(manager.kill_workers())
+        totals['cycles'] += 1
+    totals['elapsed'] = timer.elapsed_time
+    logger.info("Replayed %s in %s.", pluralize(totals['cycles'], "cycle"), timer)
+    return totals
+
+
+class ReplayManager(ApacheManager):
+
+    """
+    :class:`.ApacheManager` subclass that takes its inputs from a recorded snapshot.
+
+    The status pages, listen addresses and process information are taken from
+    :attr:`snapshot` instead of the network and ``/proc``. To replay a series
+    of snapshots using a single object change :attr:`snapshot` and call
+    :func:`~.ApacheManager.refresh()`.
+    """
+
+    @required_property
+    def snapshot(self):
+        """A dictionary with recorded inputs (see :func:`capture_snapshot()`)."""
+
+    @cached_property
+    def cgroup_path(self):
+        """The recorded pathname of the control group of Apache (a string or :data:`None`)."""
+        return self.snapshot.get('cgroup_path')
+
+    @cached_property
+    def cgroup_stats(self):
+        """The recorded resource usage of the control group of Apache (a dictionary or :data:`None`)."""
+        return self.snapshot.get('cgroup_stats')
+
+    @cached_property
+    def processes(self):
+        """A dictionary that maps process IDs to :class:`RecordedProcess` objects."""
+        return dict((p['pid'], RecordedProcess(**p)) for p in self.snapshot['processes'])
+
+    @cached_property
+    def apache_workers(self):
+        """The recorded Apache worker processes (a list of :class:`RecordedProcess` objects)."""
+        return sorted(self.processes.values(), key=lambda p: p.pid)
+
+    @cached_property
+    def html_status(self):
+        """The recorded HTML status page (a byte string)."""
+        return self.snapshot['html_status'].encode('latin-1')
+
+    @cached_property
+    def listen_addresses(self):
+        """The recorded listen addresses (a list of :class:`.NetworkAddress` objects)."""
+        return [NetworkAddress(**a) for a in self.snapshot['listen_addresses']]
+
+    @cached_property
+    def memory_pressure(self):
+        """The recorded memory pressure stall information (a dictionary or :data:`None`)."""
+        return self.snapshot.get('memory_pressure')
+
+    @cached_property
+    def slots(self):
+        """The parsed status page where each worker uses a :class:`RecordedProcess` object."""
+        slots = []
+        for slot in super(ReplayManager, self).slots:
+            slots.append(WorkerStatus(
+                status_fields=slot.status_fields,
+                process=self.processes.get(slot.pid),
+                manager=self,
+            ))
+        return slots
+
+    @cached_property
+    def sample_time(self):
+        """The time at which the snapshot was recorded (a number)."""
+        return self.snapshot['timestamp']
+
+    @cached_property
+    def system_memory(self):
+        """The recorded memory usage of the host (a dictionary or :data:`None`)."""
+        return self.snapshot.get('system_memory')
+
+    @cached_property
+    def text_status(self):
+        """The recorded plain text status page (a string)."""
+        return self.snapshot['text_status']
+
+    def get_cpu_time(self, process):
+        """Get the recorded CPU time of a process (a float or :data:`None`)."""
+        return process.cpu_time
+
+    def get_start_ticks(self, process):
+        """Get the recorded start time of a process (an integer or :data:`None`)."""
+        return process.start_ticks
+
+    def get_memory_usage(self, process):
+        """
+        Get the recorded memory usage of a process according to :attr:`~.ApacheManager.memory_metric`.
+
+        When the snapshot doesn't contain the memory usage details of the
+        process the recorded resident set size is used.
+        """
+        if self.memory_metric != 'rss' and process.memory_info:
+            return process.memory_info[self.memory_metric]
+        return process.rss
+
+    def stop_workers(self, candidates, drain_timeout=0):
+        """Ignore the request to stop workers (recorded processes can't be killed)."""
+        logger.debug("Ignoring request to stop %s.", pluralize(len(candidates), "recorded worker"))
+
+
+class RecordedProcess(PropertyManager):
+
+    """Process information recorded by :func:`capture_snapshot()`."""
+
+    @required_property
+    def pid(self):
+        """The process ID (an integer)."""
+
+    @required_property
+    def ppid(self):
+        """The process ID of the parent process (an integer)."""
+
+    @required_property
+    def rss(self):
+        """The resident set size of the process in bytes (an integer)."""
+
+    @required_property
+    def starttime(self):
+        """The time at which the process was started (a float)."""
+
+    @required_property
+    def cmdline(self):
+        """The complete command line for the process (a list of strings)."""
+
+    @required_property
+    def wsgi_process_group(self):
+        """The name of the mod_wsgi process group (a string, may be empty)."""
+
+    @mutable_property
+    def memory_info(self):
+        """The recorded result of :func:`.read_memory_info()` (a dictionary or :data:`None`)."""
+
+    @mutable_property
+    def cpu_time(self):
+        """The recorded result of :func:`.ApacheManager.get_cpu_time()` (a float or :data:`None`)."""
+
+    @mutable_property
+    def start_ticks(self):
+        """The recorded result of :func:`.ApacheManager.get_start_ticks()` (an integer or :data:`None`)."""
+
+    @property
+    def is_alive(self):
+        """:data:`True` because recorded processes are considered to be alive."""
+        return True
+
+    def kill(self):
+        """Pretend to kill the recorded process (recorded processes can't be killed)."""
+        logger.debug("Ignoring request to kill recorded process %i.", self.pid)
@@ -0,0 +1,255 @@
+# Monitor and control Apache web server workers from Python.
+#
+# Author: Peter Odding <peter@peterodding.com>
+# Last Change: October 18, 2026
+# URL: https://apache-manager.readthedocs.io
+
+"""
+What-if simulation of kill policies over recorded snapshots.
+
+The :mod:`~apache_manager.simulation` module evaluates many combinations of
+the :attr:`~.ApacheManager.max_memory_active`,
+:attr:`~.ApacheManager.max_memory_idle` and
+:attr:`~.ApacheManager.worker_timeout` thresholds in a single pass over the
+snapshots in a capture file (see :mod:`apache_manager.replay`). For each
+combination it reports how many workers would have been killed, how much
+memory would have been reclaimed and how many in-flight requests would have
+been interrupted.
+
+Rather than running :func:`~.ApacheManager.kill_workers()` once per policy
+and snapshot, the workers in each snapshot are sorted by memory usage once and
+prefix sums are used to evaluate all thresholds at the same time:
+
+- Idle workers are only subject to :attr:`~.ApacheManager.max_memory_idle`,
+  so the outcome for every idle threshold is found with a binary search.
+
+- Active workers are killed when they exceed
+  :attr:`~.ApacheManager.max_memory_active` *or*
+  :attr:`~.ApacheManager.worker_timeout`. For each timeout the cumulative
+  number (and memory usage) of timed out workers is computed along the memory
+  axis, after which the outcome for every memory threshold is again found with
+  a binary search.
+
+This yields the workers that each threshold (or combination of active
+thresholds) would kill, after which the candidates for each policy are the
+union of an idle and an active result. A worker that's killed by a policy is
+gone for that policy in later snapshots, so each policy remembers the
+workers it killed (by process ID and start time) and doesn't count them
+again. The expensive part of the evaluation (sorting and searching) grows with
+the number of workers and thresholds, only the bookkeeping of killed workers
+is done per policy.
+"""
+
+# Standard library modules.
+import bisect
+import collections
+import itertools
+
+# External dependencies.
+from humanfriendly import Timer, format_size, format_timespan, pluralize
+from humanfriendly.tables import format_pretty_table
+from property_manager import PropertyManager, lazy_property, required_property
+from verboselogs import VerboseLogger
+
+# Modules included in our package.
+from apache_manager.replay import ReplayManager, read_capture
+
+# Public identifiers that require documentation.
+__all__ = (
+    'Policy',
+    'PolicyOutcome',
+    'PolicySimulator',
+    'cumulative_sums',
+    'format_outcomes',
+    'logger',
+    'simulate_policies',
+)
+
+# Initialize a logger for this module.
+logger = VerboseLogger(__name__)
+
+Policy = collections.namedtuple('Policy', 'max_memory_active, max_memory_idle, worker_timeout')
+"""A combination of thresholds evaluated by :class:`PolicySimulator` (a named tuple)."""
+
+PolicyOutcome = collections.namedtuple('PolicyOutcome', 'killed, reclaimed, interrupted')
+"""The accumulated outcome of a :data:`Policy` (a named tuple of three integers)."""
+
+
+class PolicySimulator(PropertyManager):
+
+    """Evaluate combinations of kill thresholds over a series of snapshots."""
+
+    @required_property
+    def max_memory_active(self):
+        """The values of :attr:`.ApacheManager.max_memory_active` to evaluate (a list of integers)."""
+
+    @required_property
+    def max_memory_idle(self):
+        """The values of :attr:`.ApacheManager.max_memory_idle` to evaluate (a list of integers)."""
+
+    @required_property
+    def worker_timeout(self):
+        """The values of :attr:`.ApacheManager.worker_timeout` to evaluate (a list of numbers)."""
+
+    @lazy_property
+    def killed_workers(self):
+        """
+        The workers killed by each policy (a dictionary).
+
+        The keys of the dictionary are :data:`Policy` tuples and the values
+        are sets of ``(pid, start_ticks)`` tuples (see
+        :func:`.ApacheManager.get_start_ticks()`).
+        """
+        return dict((policy, set()) for policy in self.policies)
+
+    @property
+    def outcomes(self):
+        """
+        The accumulated outcome of every policy (a dictionary).
+
+        The keys of the dictionary are :data:`Policy` tuples and the values
+        are :data:`PolicyOutcome` tuples.
+        """
+        return dict((policy, PolicyOutcome(*totals)) for policy, totals in self.totals.items())
+
+    @lazy_property
+    def policies(self):
+        """All combinations of the given thresholds (a list of :data:`Policy` tuples)."""
+        return [
+            Policy(active, idle, timeout) for active, idle, timeout in itertools.product(
+                sorted(set(self.max_memory_active)),
+                sorted(set(self.max_memory_idle)),
+                sorted(set(self.worker_timeout)),
+            )
+        ]
+
+    @lazy_property
+    def totals(self):
+        """Accumulated ``[killed, reclaimed, interrupted]`` values of each :data:`Policy` (a dictionary)."""
+        return dict((policy, [0, 0, 0]) for policy in self.policies)
+
+    def add_snapshot(self, manager):
+        """
+        Evaluate all policies against the workers known to an :class:`.ApacheManager` object.
+
+        :param manager: An :class:`.ApacheManager` object (usually a
+                        :class:`~apache_manager.replay.ReplayManager`).
+        """
+        active = []
+        idle = []
+        seen = set()
+        for worker in manager.killable_workers:
+            # Like kill_workers() we consider each OS process only once.
+            if worker.pid in seen:
+                continue
+            seen.add(worker.pid)
+            memory = worker.memory_usage or 0
+            identity = (worker.pid, manager.get_start_ticks(worker.process))
+            if worker.is_active:
+                active.append((memory, getattr(worker, 'ss', 0) or 0, identity))
+            else:
+                idle.append((memory, identity))
+        idle_kills = self.evaluate_idle(sorted(idle))
+        active_kills = self.evaluate_active(sorted(active))
+        for policy in self.policies:
+            killed = self.killed_workers[policy]
+            totals = self.totals[policy]
+            for candidates, is_active in ((idle_kills[policy.max_memory_idle], False),
+                                          (active_kills[(policy.max_memory_active, policy.worker_timeout)], True)):
+                for memory, identity in candidates:
+                    if identity not in killed:
+                        killed.add(identity)
+                        totals[0] += 1
+                        totals[1] += memory
+                        totals[2] += int(is_active)
+
+    def evaluate_idle(self, workers):
+        """
+        Evaluate the idle memory thresholds.
+
+        :param workers: A list of ``(memory, identity)`` tuples sorted by memory.
+        :returns: A dictionary that maps each idle threshold to a list of
+                  ``(memory, identity)`` tuples of the workers it would kill.
+        """
+        memory = [m for m, identity in workers]
+        results = {}
+        for threshold in set(self.max_memory_idle):
+            index = bisect.bisect_right(memory, threshold) if threshold else len(memory)
+            results[threshold] = workers[index:]
+        return results
+
+    def evaluate_active(self, workers):
+        """
+        Evaluate the active memory and timeout thresholds.
+
+        :param workers: A list of ``(memory, ss, identity)`` tuples sorted by memory.
+        :returns: A dictionary that maps each ``(max_memory_active,
+                  worker_timeout)`` tuple to a list of ``(memory, identity)``
+                  tuples of the workers it would kill.
+        """
+        memory = [m for m, ss, identity in workers]
+        results = {}
+        for timeout in set(self.worker_timeout):
+            timed_out = [(m, identity) for m, ss, identity in workers if timeout and ss > timeout]
+            # Prefix counts of timed out workers, ordered by memory usage.
+            prefix_counts = cumulative_sums(int(bool(timeout) and ss > timeout) for m, ss, identity in workers)
+            for threshold in set(self.max_memory_active):
+                # Workers above the index exceed the memory threshold, workers
+                # below the index are only killed when they've timed out.
+                index = bisect.bisect_right(memory, threshold) if threshold else len(memory)
+                results[(threshold, timeout)] = timed_out[:prefix_counts[index]] + [
+                    (m, identity) for m, ss, identity in workers[index:]
+                ]
+        return results
+
+
+def cumulative_sums(values):
+    """Get the cumulative sums of an iterable of numbers (a list that starts with zero)."""
+    sums = [0]
+    for value in values:
+        sums.append(sums[-1] + value)
+    return sums
+
+
+def simulate_policies(filename, max_memory_active, max_memory_idle, worker_timeout):
+    """
+    Evaluate combinations of kill thresholds over the snapshots in a capture file.
+
+    :param filename: The pathname of a capture file (see :mod:`apache_manager.replay`).
+    :param max_memory_active: A list of memory thresholds for active workers.
+    :param max_memory_idle: A list of memory thresholds for idle workers.
+    :param worker_timeout: A list of timeouts for active workers.
+    :returns: A :class:`PolicySimulator` object.
+    """
+    timer = Timer()
+    simulator = PolicySimulator(
+        max_memory_active=max_memory_active,
+        max_memory_idle=max_memory_idle,
+        worker_timeout=worker_timeout,
+    )
+    num_snapshots = 0
+    for snapshot in read_capture(filename):
+        simulator.add_snapshot(ReplayManager(snapshot=snapshot))
+        num_snapshots += 1
+    logger.info("Evaluated %s over %s in %s.",
+                pluralize(len(simulator.outcomes), "policy", "policies"),
+                pluralize(num_snapshots, "snapshot"), timer)
+    return simulator
+
+
+def format_outcomes(simulator):
+    """Render the outcomes of a :class:`PolicySimulator` as a table (a string)."""
+    rows = []
+    for policy, outcome in sorted(simulator.outcomes.items()):
+        rows.append([
+            format_size(policy.max_memory_active, binary=True) if policy.max_memory_active else '-',
+            format_size(policy.max_memory_idle, binary=True) if policy.max_memory_idle else '-',
+            format_timespan(policy.worker_timeout) if policy.worker_timeout else '-',
+            outcome.killed,
+            format_size(outcome.reclaimed, binary=True),
+            outcome.interrupted,
+        ])
+    return format_pretty_table(rows, [
+        'Max memory active', 'Max memory idle', 'Worker timeout',
+        'Killed', 'Reclaimed', 'Interrupted',
+    ])
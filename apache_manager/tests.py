@@ -1,19 +1,26 @@
 # Monitor and control Apache web server workers from Python.
 #
 # Author: Peter Odding <peter@peterodding.com>
-# Last Change: February 29, 2020
+# Last Change: October 18, 2026
 # URL: https://apache-manager.readthedocs.io
 
 """Test suite for the `apache-manager` project."""
 
 # Standard library modules.
+import calendar
 import itertools
 import logging
+import math
 import multiprocessing
 import os
+import pstats
 import re
+import shutil
+import signal
+import subprocess
 import sys
 import tempfile
+import threading
 import time
 import unittest
 
@@ -21,20 +28,102 @@ import unittest
 import coloredlogs
 from capturer import CaptureOutput
 from executor import execute
-from humanfriendly import compact, dedent
+from humanfriendly import Timer, compact, dedent
 from natsort import NaturalOrderKey
+from proc.core import Process
 from property_manager import set_property
 from six import text_type
 from six.moves.urllib.request import Request, urlopen
+from update_dotdee import ConfigLoader
 
 # Modules included in our package.
-from apache_manager import ApacheManager, coerce_value
-from apache_manager.cli import main
+from apache_manager import (
+    MEMORY_METRICS,
+    ApacheManager,
+    KillCandidate,
+    NetworkAddress,
+    NonNativeWorker,
+    WorkerStatus,
+    coerce_value,
+    find_cgroup,
+    find_worker_processes,
+    outlier_threshold,
+    parse_memory_budgets,
+    parse_pressure_curve,
+    read_cgroup_stats,
+    read_meminfo,
+    read_memory_info,
+    read_pressure,
+)
+from apache_manager.benchmark import generate_proc_tree, generate_snapshot, run_benchmarks, scan_proc_tree
+from apache_manager.capacity import format_capacity_report, percentile, plan_capacity
+from apache_manager.cli import main, save_results
+from apache_manager.discovery import ApacheConfig, parse_listen_directive
 from apache_manager.exceptions import AddressDiscoveryError, StatusPageError
+from apache_manager.fakeserver import StatusScenario, StatusServer
+from apache_manager.history import MetricHistory, parse_timestamp
+from apache_manager.interactive import (
+    MetricsSnapshot,
+    RingBuffer,
+    TrendTracker,
+    WorkerRow,
+    WorkerTable,
+    collect_workers,
+    sparkline,
+)
+from apache_manager.processes import HAVE_PIDFD, open_process, wait_for_exit
+from apache_manager.profiling import CycleProfiler
+from apache_manager.replay import ReplayManager, read_capture, record_snapshot, replay_capture
+from apache_manager.simulation import PolicySimulator
 
 # Initialize a logger for this module.
 logger = logging.getLogger(__name__)
 
+EXAMPLE_SNAPSHOT = dict(
+    timestamp=1583020800,
+    listen_addresses=[dict(protocol='http', address='127.0.0.1', port=80)],
+    text_status=dedent('''
+        Total Accesses: 100
+        Total kBytes: 275
+        CPULoad: .000203794
+        Uptime: 181556
+        ReqPerSec: .000550794
+        BytesPerSec: 1.55104
+        BytesPerReq: 2816
+        BusyWorkers: 1
+        IdleWorkers: 1
+        Scoreboard: W_..
+    '''),
+    html_status=dedent('''
+        <html><body>
+        <table border="0">
+        <tr><th>Srv</th><th>PID</th><th>Acc</th><th>M</th><th>CPU</th><th>SS</th><th>Req</th>
+        <th>Conn</th><th>Child</th><th>Slot</th><th>Client</th><th>VHost</th><th>Request</th></tr>
+        <tr><td><b>0-0</b></td><td>1001</td><td>1/5/50</td><td><b>W</b></td><td>0.10</td><td>3</td>
+        <td>0</td><td>0.0</td><td>0.01</td><td>0.10</td><td>127.0.0.1</td><td>localhost</td>
+        <td>GET /server-status HTTP/1.1</td></tr>
+        <tr><td><b>1-0</b></td><td>1002</td><td>0/7/70</td><td>_</td><td>0.20</td><td>42</td>
+        <td>1</td><td>0.0</td><td>0.02</td><td>0.20</td><td>127.0.0.1</td><td>localhost</td>
+        <td>GET / HTTP/1.1</td></tr>
+        <tr><td><b>2-0</b></td><td>-</td><td>0/0/0</td><td>.</td><td>0.00</td><td>0</td>
+        <td>0</td><td>0.0</td><td>0.00</td><td>0.00</td><td></td><td></td><td></td></tr>
+        </table>
+        </body></html>
+    '''),
+    processes=[
+        dict(pid=1001, ppid=1000, rss=1024 * 1024 * 10, starttime=1583000000.0,
+             cmdline=['/usr/sbin/apache2', '-k', 'start'], wsgi_process_group=''),
+        dict(pid=1002, ppid=1000, rss=1024 * 1024 * 20, starttime=1583000000.0,
+             cmdline=['/usr/sbin/apache2', '-k', 'start'], wsgi_process_group=''),
+        dict(pid=1003, ppid=1000, rss=1024 * 1024 * 100, starttime=1583000000.0,
+             cmdline=['(wsgi:example)', '-k', 'start'], wsgi_process_group='example'),
+    ],
+)
+"""
+A recorded snapshot (see :func:`apache_manager.replay.capture_snapshot()`)
+that's used to test the parsing and policy code without Apache.
+"""
+
 
 def setUpModule():
     """
@@ -437,6 +526,966 @@ class ApacheManagerTestCase(unittest.TestCase):
         assert manager.max_memory_active == 524288000
         assert manager.max_memory_idle == 262144000
 
+    def test_metric_history(self):
+        """Test the compact on-disk metric history."""
+        directory = tempfile.mkdtemp()
+        try:
+            history = MetricHistory(directory=directory, retention=60 * 60 * 24 * 2)
+            start = calendar.timegm((2020, 3, 1, 23, 0, 0))
+            # Record two hours of minute resolution metrics spanning midnight.
+            for i in range(120):
+                history.append([('busy-workers', i), ('idle-workers', 120 - i)], start + i * 60)
+            # A change in the set of metrics starts a new segment.
+            history.append([('busy-workers', 42), ('memory-usage.native.max', 1024)], start + 120 * 60)
+            assert len(history.files) == 3
+            # Concurrent writers (separate objects) don't truncate each other's files.
+            other = MetricHistory(directory=directory, retention=0)
+            other.append([('busy-workers', 43), ('memory-usage.native.max', None)], start + 121 * 60)
+            assert len(history.files) == 3
+            values = [v for t, v in history.query('memory-usage.native.max')]
+            assert values[0] == 1024 and math.isnan(values[1])
+            other.current.close()
+            # Check that range queries return the right records.
+            values = [v for t, v in history.query('busy-workers', start + 30 * 60, start + 90 * 60)]
+            assert values == list(range(30, 91))
+            assert list(history.query('no-such-metric')) == []
+            # Check that expired files are removed.
+            history.remove_expired(start + 60 * 60 * 24 * 3)
+            assert len(history.files) == 2
+            # Check that the metrics written by the manager are recorded.
+            manager = ApacheManager(history_directory=directory)
+            set_property(manager, 'export_metrics', lambda: [('Example.', [('busy-workers', 5)])])
+            assert manager.save_history()
+            assert [v for t, v in manager.history.query('busy-workers', time.time() - 60)] == [5]
+        finally:
+            shutil.rmtree(directory)
+
+    def test_parse_timestamp(self):
+        """Test parsing of timestamps given on the command line."""
+        assert parse_timestamp('2020-03-01') == calendar.timegm((2020, 3, 1, 0, 0, 0))
+        assert parse_timestamp('2020-03-01 12:30') == calendar.timegm((2020, 3, 1, 12, 30, 0))
+        assert parse_timestamp('1h', now=7200) == 3600
+        self.assertRaises(ValueError, parse_timestamp, 'not a timestamp')
+
+    def test_record_and_replay(self):
+        """Test that recorded inputs can be replayed without touching the network or ``/proc``."""
+        fd, capture_file = tempfile.mkstemp(suffix='.json.gz')
+        os.close(fd)
+        os.unlink(capture_file)
+        try:
+            manager = ReplayManager(snapshot=EXAMPLE_SNAPSHOT)
+            # Record the same snapshot twice (like two cron runs would do).
+            for i in range(2):
+                record_snapshot(manager, capture_file)
+            snapshots = list(read_capture(capture_file))
+            assert len(snapshots) == 2
+            assert snapshots[0]['html_status'] == EXAMPLE_SNAPSHOT['html_status']
+            # Check that the replayed inputs are parsed as usual.
+            manager = ReplayManager(snapshot=snapshots[0])
+            assert manager.server_metrics['busy_workers'] == 1
+            assert [w.pid for w in manager.workers] == [1001, 1002]
+            assert [w.pid for w in manager.foreign_workers] == [1003]
+            assert sorted(manager.memory_usage) == [1024 * 1024 * 10, 1024 * 1024 * 20]
+            assert manager.wsgi_process_groups['example'] == [1024 * 1024 * 100]
+            # Check that replaying runs the kill policy.
+            totals = replay_capture(capture_file, max_memory_idle=1024 * 1024 * 15)
+            assert totals['cycles'] == 2
+            assert totals['killed'] == 2
+            # Failing to record a snapshot doesn't raise an exception.
+            save_results(manager, set(), None, False, os.path.join(capture_file, 'not-a-directory.json'))
+        finally:
+            os.unlink(capture_file)
+
+    def test_policy_simulation(self):
+        """Test that the policy simulator agrees with :func:`~apache_manager.ApacheManager.kill_workers()`."""
+        grid = dict(
+            max_memory_active=[0, 1024 * 1024 * 5, 1024 * 1024 * 15],
+            max_memory_idle=[0, 1024 * 1024 * 15, 1024 * 1024 * 25],
+            worker_timeout=[0, 2, 5],
+        )
+        simulator = PolicySimulator(**grid)
+        # Workers that are killed by a policy are only counted once.
+        for i in range(2):
+            simulator.add_snapshot(ReplayManager(snapshot=EXAMPLE_SNAPSHOT))
+        # Workers that were restarted (same PID, different start time) are counted again.
+        simulator.add_snapshot(ReplayManager(snapshot=dict(EXAMPLE_SNAPSHOT, processes=[
+            dict(p, start_ticks=42) for p in EXAMPLE_SNAPSHOT['processes']
+        ])))
+        outcomes = simulator.outcomes
+        assert len(outcomes) == 27
+        for policy, outcome in outcomes.items():
+            manager = ReplayManager(snapshot=EXAMPLE_SNAPSHOT)
+            killed = manager.kill_workers(
+                max_memory_active=policy.max_memory_active,
+                max_memory_idle=policy.max_memory_idle,
+                timeout=policy.worker_timeout,
+            )
+            reclaimed = sum(w.memory_usage for w in manager.killable_workers if w.pid in killed)
+            assert outcome.killed == len(killed) * 2
+            assert outcome.reclaimed == reclaimed * 2
+            assert outcome.interrupted == manager.num_killed_active * 2
+        # The simulator doesn't silently ignore --kill-workers.
+        exit_code, output = run_cli(['--simulate-policies=capture.json.gz', '--kill-workers'])
+        assert exit_code == 1
+
+    def test_memory_metrics(self):
+        """Test the configurable memory metric."""
+        # Check that memory usage details can be read from /proc.
+        info = read_memory_info('/proc/self')
+        assert all(info[name] >= 0 for name in MEMORY_METRICS)
+        assert info['rss'] >= info['pss'] >= info['uss'] > 0
+        assert read_memory_info('/proc/this-process-does-not-exist') is None
+        # Check that the memory metric is validated.
+        manager = ApacheManager()
+        manager.config['memory-metric'] = 'vsize'
+        self.assertRaises(ValueError, getattr, manager, 'memory_metric')
+        exit_code, output = run_cli(['--memory-metric=vsize'])
+        assert exit_code == 1
+        assert "'rss', 'pss', 'uss' and 'swap'" in output
+        # Check that the memory metric is applied consistently.
+        snapshot = dict(EXAMPLE_SNAPSHOT, processes=[
+            dict(p, memory_info=dict(rss=p['rss'], pss=p['rss'] // 2, uss=p['rss'] // 4, swap=0))
+            for p in EXAMPLE_SNAPSHOT['processes']
+        ])
+        manager = ReplayManager(snapshot=snapshot, memory_metric='uss')
+        assert manager.wsgi_process_groups['example'] == [1024 * 1024 * 25]
+        assert [w.memory_usage for w in manager.killable_workers] == [
+            1024 * 1024 * 10 // 4,
+            1024 * 1024 * 20 // 4,
+            1024 * 1024 * 100 // 4,
+        ]
+        assert manager.kill_workers(max_memory_idle=1024 * 1024 * 15) == []
+
+    def test_cpu_utilization(self):
+        """Test CPU utilization sampling and the CPU spinning threshold."""
+        def make_snapshot(i):
+            # The WSGI daemon process spins at 100% CPU, the native workers use 10%.
+            processes = []
+            for p in EXAMPLE_SNAPSHOT['processes']:
+                rate = 1.0 if p['wsgi_process_group'] else 0.1
+                processes.append(dict(p, cpu_time=i * 10 * rate, start_ticks=42))
+            return dict(EXAMPLE_SNAPSHOT, timestamp=EXAMPLE_SNAPSHOT['timestamp'] + i * 10, processes=processes)
+        manager = ReplayManager(snapshot=make_snapshot(0), max_cpu_percent=90, cpu_sample_count=2)
+        assert all(w.cpu_percent is None for w in manager.killable_workers)
+        assert manager.kill_workers(dry_run=True) == []
+        manager.snapshot = make_snapshot(1)
+        manager.refresh()
+        assert [round(w.cpu_percent) for w in manager.killable_workers] == [10, 10, 100]
+        # One sample above the threshold isn't enough.
+        assert manager.kill_workers(dry_run=True) == []
+        manager.snapshot = make_snapshot(2)
+        manager.refresh()
+        assert manager.kill_workers(dry_run=True) == [1003]
+        # Check that the CPU utilization per group is exported.
+        metrics = dict((row[:-1], row[-1]) for heading, rows in manager.export_metrics() for row in rows)
+        assert metrics[('cpu-usage', 'example', 'max')] == 100
+        assert metrics[('cpu-usage', 'native', 'average')] == 10
+        # The samples are remembered between runs (e.g. from cron).
+        fd, state_file = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        os.unlink(state_file)
+        try:
+            for i in range(3):
+                manager = ReplayManager(
+                    snapshot=make_snapshot(i),
+                    max_cpu_percent=90,
+                    cpu_sample_count=2,
+                    state_file=state_file,
+                )
+                killed = manager.kill_workers()
+            assert killed == [1003]
+        finally:
+            os.unlink(state_file)
+
+    def test_predictive_recycling(self):
+        """Test memory growth tracking and predictive recycling of leaking workers."""
+        def make_snapshot(i):
+            # The idle native worker leaks 1 MB per minute.
+            processes = []
+            for p in EXAMPLE_SNAPSHOT['processes']:
+                growth = 1024 * 1024 * i if p['pid'] == 1002 else 0
+                processes.append(dict(p, rss=p['rss'] + growth, start_ticks=42))
+            return dict(EXAMPLE_SNAPSHOT, timestamp=EXAMPLE_SNAPSHOT['timestamp'] + i * 60, processes=processes)
+        manager = ReplayManager(
+            snapshot=make_snapshot(0),
+            max_memory_idle=1024 * 1024 * 30,
+            recycle_horizon=60 * 10,
+        )
+        # Growth rates are only estimated once three samples are available.
+        for i in range(1, 3):
+            assert manager.kill_workers(dry_run=True) == []
+            manager.snapshot = make_snapshot(i)
+            manager.refresh()
+        # The worker now uses 22 MB and is projected to exceed 30 MB within 10 minutes.
+        assert round(manager.killable_workers[1].memory_growth) == round(1024 * 1024 / 60.0)
+        assert manager.killable_workers[0].memory_growth == 0
+        assert manager.kill_workers(dry_run=True) == [1002]
+        assert manager.manager_metrics['workers_recycled'] == 1
+        # A shorter horizon doesn't trigger recycling.
+        assert manager.kill_workers(dry_run=True, recycle_horizon=60) == []
+        # Check that the growth rates per group are exported.
+        metrics = dict((row[:-1], row[-1]) for heading, rows in manager.export_metrics() for row in rows)
+        assert metrics[('memory-growth', 'example', 'max')] == 0
+        assert metrics[('memory-growth', 'native', 'max')] > 0
+        # The samples are remembered between runs (e.g. from cron).
+        fd, state_file = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        os.unlink(state_file)
+        try:
+            for i in range(3):
+                manager = ReplayManager(
+                    snapshot=make_snapshot(i),
+                    max_memory_idle=1024 * 1024 * 30,
+                    recycle_horizon=60 * 10,
+                    state_file=state_file,
+                )
+                killed = manager.kill_workers()
+            assert killed == [1002]
+        finally:
+            os.unlink(state_file)
+
+    def test_kill_budget(self):
+        """Test that the kill budget staggers the killing of workers over multiple cycles."""
+        fd, state_file = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        os.unlink(state_file)
+        options = dict(
+            max_memory_active=1024 * 1024 * 5,
+            max_memory_idle=1024 * 1024 * 5,
+            max_kills_per_cycle=1,
+            max_kills_per_window=2,
+            state_file=state_file,
+        )
+        try:
+            manager = ReplayManager(snapshot=EXAMPLE_SNAPSHOT, **options)
+            # All three workers exceed a threshold. One worker is killed per
+            # group, workers are prioritized by how far they exceed their
+            # threshold (1003 uses 20x, 1002 4x and 1001 2x its threshold).
+            assert [c.worker.pid for c in manager.find_kill_candidates()] == [1001, 1002, 1003]
+            assert manager.kill_workers() == [1003, 1002]
+            assert manager.manager_metrics['workers_deferred'] == 1
+            # The deferred worker is killed first in the next cycle.
+            manager.refresh()
+            assert manager.kill_workers() == [1001, 1003]
+            assert manager.manager_metrics['workers_deferred'] == 1
+            # Now the budget of both groups is exhausted.
+            manager.refresh()
+            assert manager.kill_workers() == []
+            assert manager.manager_metrics['workers_deferred'] == 3
+            # The state is remembered between runs (e.g. from cron).
+            manager = ReplayManager(snapshot=EXAMPLE_SNAPSHOT, **options)
+            assert manager.kill_workers(dry_run=True) == []
+            assert len(manager.deferred_kills) == 3
+            # Once the time window has passed workers are killed again.
+            later = dict(EXAMPLE_SNAPSHOT, timestamp=EXAMPLE_SNAPSHOT['timestamp'] + manager.kill_window + 1)
+            manager = ReplayManager(snapshot=later, **options)
+            assert manager.kill_workers() == [1003, 1002]
+        finally:
+            os.unlink(state_file)
+
+    def test_memory_budgets(self):
+        """Test that groups of workers are kept within their memory budget."""
+        assert parse_memory_budgets('native:25M, example:1G') == dict(native=1024 * 1024 * 25, example=1024 ** 3)
+        self.assertRaises(ValueError, parse_memory_budgets, '25M')
+        self.assertRaises(ValueError, parse_memory_budgets, 'native:lots')
+        # The native workers use 30 MB combined, killing the idle worker suffices.
+        manager = ReplayManager(snapshot=EXAMPLE_SNAPSHOT)
+        assert manager.kill_workers(dry_run=True, memory_budgets=dict(native=1024 * 1024 * 25)) == [1002]
+        # Idle workers are killed first, then the active workers.
+        assert manager.kill_workers(dry_run=True, memory_budgets=dict(native=1024 * 1024 * 5)) == [1002, 1001]
+        assert manager.kill_workers(dry_run=True, memory_budgets=dict(example=1024 * 1024 * 50)) == [1003]
+        # Workers that are killed because of other thresholds count towards the budget.
+        manager.config['memory-budgets'] = 'native:25M'
+        killed = manager.kill_workers(dry_run=True, max_memory_active=1024 * 1024 * 5)
+        assert sorted(killed) == [1001, 1003]
+
+    def test_group_thresholds(self):
+        """Test that thresholds can be overridden per group of workers."""
+        directory = tempfile.mkdtemp()
+        try:
+            config_file = os.path.join(directory, 'apache-manager.ini')
+            with open(config_file, 'w') as handle:
+                handle.write(dedent('''
+                    [apache-manager]
+                    max-memory-idle = 15M
+                    max-memory-active = 5M
+
+                    [apache-manager:native]
+                    max-memory-active = 15M
+
+                    [apache-manager:example]
+                    max-memory-active = 200M
+                    memory-budget = 50M
+                '''))
+            manager = ReplayManager(snapshot=EXAMPLE_SNAPSHOT)
+            set_property(manager, 'config_loader', ConfigLoader(filename_patterns=[config_file]))
+            assert manager.group_thresholds == dict(
+                native={'max-memory-active': 1024 * 1024 * 15},
+                example={'max-memory-active': 1024 * 1024 * 200, 'memory-budget': 1024 * 1024 * 50},
+            )
+            assert manager.memory_budgets == dict(example=1024 * 1024 * 50)
+            # The group sections take precedence over the global thresholds
+            # (so the active native worker using 10 MB isn't killed) and the
+            # WSGI worker is only killed because of its memory budget.
+            candidates = dict((c.worker.pid, c.rule) for c in manager.find_kill_candidates())
+            assert candidates == {1002: 'max-memory-idle', 1003: 'memory budget'}
+            # Explicit thresholds override the global thresholds as well as the group sections.
+            candidates = dict((c.worker.pid, c.rule) for c in manager.find_kill_candidates(
+                max_memory_idle=1024 * 1024 * 25,
+            ))
+            assert candidates == {1003: 'memory budget'}
+            candidates = dict((c.worker.pid, c.rule) for c in manager.find_kill_candidates(
+                max_memory_active=1024 * 1024 * 5, memory_budgets={},
+            ))
+            assert candidates == {1001: 'max-memory-active', 1002: 'max-memory-idle', 1003: 'max-memory-active'}
+            manager.max_memory_active = 1024 * 1024 * 5
+            candidates = dict((c.worker.pid, c.rule) for c in manager.find_kill_candidates(memory_budgets={}))
+            assert candidates == {1001: 'max-memory-active', 1002: 'max-memory-idle', 1003: 'max-memory-active'}
+            del manager.max_memory_active
+            # The applied rule is logged.
+            with CaptureOutput() as capturer:
+                manager.kill_workers(dry_run=True)
+                assert '[max-memory-idle]' in capturer.get_text()
+        finally:
+            shutil.rmtree(directory)
+
+    def test_drain_workers(self):
+        """Test that active workers are given time to exit gracefully before they're killed."""
+        def spawn(handler):
+            process = subprocess.Popen([sys.executable, '-c', dedent('''
+                import signal, sys, time
+                signal.signal(signal.SIGTERM, {handler})
+                sys.stdout.write('ready\\n')
+                sys.stdout.flush()
+                time.sleep(60)
+            ''', handler=handler)], stdout=subprocess.PIPE)
+            assert process.stdout.readline().strip() == b'ready'
+            return process
+        graceful = spawn('lambda *args: sys.exit(0)')
+        stubborn = spawn('signal.SIG_IGN')
+        idle = spawn('signal.SIG_IGN')
+        manager = ApacheManager()
+        drain_worker = manager.drain_worker
+        manager.drain_worker = lambda worker, handle: worker.pid != idle.pid and drain_worker(worker, handle)
+        # Workers that aren't drained are killed without waiting for the draining workers.
+        timer = Timer()
+        exit_times = []
+        thread = threading.Thread(target=lambda: exit_times.append(idle.wait() and timer.elapsed_time))
+        thread.start()
+        manager.stop_workers([
+            KillCandidate(worker=NonNativeWorker(process=Process.from_pid(p.pid)), excess=2, reason='testing')
+            for p in (graceful, stubborn, idle)
+        ], drain_timeout=2)
+        thread.join()
+        assert idle.returncode == -signal.SIGKILL
+        assert exit_times[0] < 1
+        assert graceful.wait() == 0
+        assert stubborn.wait() == -signal.SIGKILL
+        assert manager.num_drained == 1
+        assert manager.num_confirmed == 3
+        assert manager.num_failed == 0
+        # The reclaimed memory excludes shared pages.
+        assert manager.memory_reclaimed > 0
+        assert manager.memory_reclaimed == sum(info['uss'] for info in manager.memory_info.values())
+        # Recorded workers are never signaled.
+        manager = ReplayManager(snapshot=EXAMPLE_SNAPSHOT, drain_timeout=60)
+        assert manager.kill_workers(max_memory_idle=1024 * 1024 * 5) == [1002]
+
+    def test_process_handles(self):
+        """Test race free signaling of processes and waiting for processes to exit."""
+        for use_pidfd in set([False, HAVE_PIDFD]):
+            children = [subprocess.Popen(['sleep', '60']) for i in range(3)]
+            start_ticks = [int(Process.from_pid(c.pid).stat_fields[21]) for c in children]
+            # A process whose start time doesn't match is left alone.
+            assert open_process(children[0].pid, start_ticks[0] + 1, use_pidfd=use_pidfd) is None
+            handles = [open_process(c.pid, t, use_pidfd=use_pidfd) for c, t in zip(children, start_ticks)]
+            assert all(h.is_alive for h in handles)
+            # Processes that don't exit are reported as such.
+            assert wait_for_exit(handles, timeout=0.2) == set()
+            for handle in handles[:2]:
+                assert handle.send_signal(signal.SIGKILL)
+            assert wait_for_exit(handles, timeout=0.5) == set(c.pid for c in children[:2])
+            assert not handles[0].is_alive
+            assert handles[2].is_alive
+            handles[2].send_signal(signal.SIGTERM)
+            assert wait_for_exit(handles[2:], timeout=10) == set([children[2].pid])
+            for handle, child in zip(handles, children):
+                child.wait()
+                # Signaling an exited (and reaped) process isn't an error.
+                assert handle.send_signal(signal.SIGKILL) is False
+                handle.close()
+
+    def test_outlier_thresholds(self):
+        """Test the adaptive thresholds based on the median absolute deviation."""
+        assert outlier_threshold([1, 2, 3, 4, 100], 3) == 3 + 3 * 1
+        assert outlier_threshold([1, 2, 3, 4, 100], 3, floor=50) == 50
+        assert outlier_threshold([1, 2, 3, 4, 100], 3, ceiling=5) == 5
+        # Groups where most values are identical have no meaningful spread.
+        assert outlier_threshold([10, 10, 10, 11, 50], 3) is None
+        # Add a WSGI process group of six workers where one worker is much larger than the others.
+        processes = list(EXAMPLE_SNAPSHOT['processes'])
+        for pid, size in zip(range(2001, 2007), (100, 101, 102, 99, 100, 300)):
+            processes.append(dict(
+                pid=pid, ppid=1000, rss=1024 * 1024 * size, starttime=1583000000.0,
+                cmdline=['(wsgi:reports)', '-k', 'start'], wsgi_process_group='reports',
+            ))
+        manager = ReplayManager(snapshot=dict(EXAMPLE_SNAPSHOT, processes=processes))
+        assert manager.find_kill_candidates() == []
+        # The native workers and the 'example' group are too small to be considered.
+        thresholds = manager.get_outlier_thresholds(5)
+        assert list(thresholds) == [('reports', 'memory')]
+        assert thresholds[('reports', 'memory')] == 1024 * 1024 * 105.5
+        # WSGI workers are considered active so they're only killed when they can be drained.
+        assert manager.find_kill_candidates(outlier_factor=5) == []
+        candidates = manager.find_kill_candidates(outlier_factor=5, drain_timeout=60)
+        assert [(c.worker.pid, c.rule) for c in candidates] == [(2006, 'outlier-factor')]
+        # The floor and ceiling guards are applied.
+        manager.outlier_memory_floor = 1024 * 1024 * 500
+        assert manager.find_kill_candidates(outlier_factor=5, drain_timeout=60) == []
+        manager.outlier_memory_ceiling = 1024 * 1024 * 50
+        assert len(manager.find_kill_candidates(outlier_factor=5, drain_timeout=60)) == 6
+        manager.outlier_min_workers = 10
+        assert manager.find_kill_candidates(outlier_factor=5, drain_timeout=60) == []
+
+    def test_watch_data_structures(self):
+        """Test the data structures behind the ``--watch`` interface (not the curses rendering)."""
+        # The ring buffer keeps the most recent values in a fixed amount of storage.
+        buffer = RingBuffer(size=3)
+        assert buffer.values == ()
+        for value in range(1, 6):
+            buffer.append(value)
+        assert buffer.values == (3, 4, 5)
+        assert len(buffer.storage) == 3
+        # Sparklines scale the values between the lowest and highest character.
+        assert sparkline([1, 2, 3], 10, characters='abc') == 'abc'
+        assert sparkline([1, 2, 3], 2, characters='abc') == 'ac'
+        assert sparkline([5, 5], 10, characters='abc') == 'aa'
+        assert sparkline([1, 2, 3], 0) == ''
+        # The trend tracker tracks key metrics including the memory usage per group.
+        manager = ReplayManager(snapshot=EXAMPLE_SNAPSHOT, max_memory_idle=1024 * 1024 * 15)
+        workers = collect_workers(manager)
+        assert [(r.pid, r.group, r.rule) for r in workers] == [
+            (1001, 'native', None),
+            (1002, 'native', 'max-memory-idle'),
+            (1003, 'example', None),
+        ]
+        tracker = TrendTracker(window=2)
+        for i in range(3):
+            tracker.update(manager, workers)
+        trends = dict((t.label, t) for t in tracker.export())
+        assert trends['Busy workers'].values == (1, 1)
+        assert trends['native max memory'].current == '20 MiB'
+        assert trends['Targeted workers'].values == (1, 1)
+        # Groups that disappear are forgotten.
+        tracker.update(manager, [r for r in workers if r.group == 'native'])
+        assert not any('example' in t.label for t in tracker.export())
+        # The worker table sorts rows, rows without a value come last.
+        rows = (
+            WorkerRow(1, 'a', 'W', 5, 1, None, 30, None, None, None),
+            WorkerRow(2, 'b', None, None, None, 50.0, 10, None, None, 'outlier-factor'),
+            WorkerRow(3, 'a', '_', 1, 0, 1.0, 20, None, None, None),
+        )
+        snapshot = MetricsSnapshot(lines=(), workers=rows, trends=(), timestamp=0, elapsed=0, error=None)
+        table = WorkerTable()
+        assert [r.pid for r in table.get_rows(snapshot)] == [1, 3, 2]
+        assert table.handle_key(ord('C'), 10)
+        assert [r.pid for r in table.get_rows(snapshot)] == [2, 3, 1]
+        assert table.handle_key(ord('R'), 10)
+        assert [r.pid for r in table.get_rows(snapshot)] == [3, 2, 1]
+        assert table.handle_key(ord('T'), 10)
+        assert [r.pid for r in table.get_rows(snapshot)] == [1, 3, 2]
+        assert table.handle_key(ord('P'), 10) and not table.reverse
+        assert [r.pid for r in table.get_rows(snapshot)] == [1, 2, 3]
+        assert table.handle_key(ord('j'), 10) and table.offset == 1
+        assert not table.handle_key(ord('x'), 10)
+
+    def test_memory_pressure(self):
+        """Test the scaling of memory thresholds according to memory pressure."""
+        assert parse_pressure_curve('95:0.5, 50:1.5,80%:1') == [(50, 1.5), (80, 1), (95, 0.5)]
+        self.assertRaises(ValueError, parse_pressure_curve, '50:1.5,80')
+        self.assertRaises(ValueError, parse_pressure_curve, '50:1.5,50:1')
+        directory = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(directory, 'meminfo')
+            with open(filename, 'w') as handle:
+                handle.write('MemTotal:        1000 kB\nMemAvailable:     250 kB\nHugePages_Total:       0\n')
+            assert read_meminfo(filename) == dict(MemTotal=1024000, MemAvailable=256000, HugePages_Total=0)
+            filename = os.path.join(directory, 'memory')
+            with open(filename, 'w') as handle:
+                handle.write('some avg10=12.50 avg60=3.00 avg300=1.00 total=4242\n')
+            pressure = read_pressure(filename)
+            assert pressure['some'] == dict(avg10=12.5, avg60=3.0, avg300=1.0, total=4242)
+            assert pressure['full']['avg10'] == 0
+            assert read_pressure(os.path.join(directory, 'missing')) is None
+        finally:
+            shutil.rmtree(directory)
+        manager = ReplayManager(
+            snapshot=dict(EXAMPLE_SNAPSHOT, system_memory=dict(MemTotal=1000, MemAvailable=250)),
+            max_memory_idle=1024 * 1024 * 18,
+        )
+        # Without a curve the thresholds aren't scaled.
+        assert manager.memory_used_percent == 75
+        assert manager.threshold_scale == 1
+        assert [c.worker.pid for c in manager.find_kill_candidates()] == [1002]
+        # At 75% the curve interpolates between 50% and 80%.
+        manager.pressure_curve = parse_pressure_curve('50:2,80:1,95:0.5')
+        manager.refresh()
+        assert abs(manager.threshold_scale - 7 / 6.0) < 0.001
+        assert manager.find_kill_candidates() == []
+        manager.refresh()
+        manager.snapshot['system_memory'] = dict(MemTotal=1000, MemAvailable=10)
+        assert manager.threshold_scale == 0.5
+        candidates = manager.find_kill_candidates()
+        assert [(c.worker.pid, c.rule) for c in candidates] == [(1002, 'max-memory-idle scaled by 0.50')]
+        # Stalled tasks select the smallest factor regardless of memory usage.
+        manager.refresh()
+        manager.snapshot['system_memory'] = dict(MemTotal=1000, MemAvailable=900)
+        assert manager.threshold_scale == 2
+        manager.snapshot['memory_pressure'] = dict(some=dict(avg10=50.0), full=dict(avg10=10.0))
+        manager.refresh()
+        assert manager.under_pressure
+        assert manager.threshold_scale == 0.5
+
+    def test_cgroup_accounting(self):
+        """Test the accounting and kill policy based on the control group of Apache."""
+        directory = find_cgroup(os.getpid())
+        assert directory is None or os.path.isdir(directory)
+        directory = tempfile.mkdtemp()
+        try:
+            for name, contents in (('memory.current', '4096\n'), ('memory.high', 'max\n'),
+                                   ('memory.max', '8192\n'), ('memory.stat', 'anon 1024\nfile 3072\n')):
+                with open(os.path.join(directory, name), 'w') as handle:
+                    handle.write(contents)
+            assert read_cgroup_stats(directory) == dict(
+                memory_current=4096, memory_high=None, memory_max=8192,
+                memory_stat=dict(anon=1024, file=3072), cpu_stat={},
+            )
+            assert read_cgroup_stats(os.path.join(directory, 'missing')) is None
+        finally:
+            shutil.rmtree(directory)
+        # The workers use 130 MB but the control group uses 200 MB of its 150
+        # MB limit, 50 MB of which is page cache.
+        stats = dict(
+            memory_current=1024 * 1024 * 200, memory_high=None, memory_max=1024 * 1024 * 150,
+            memory_stat=dict(file=1024 * 1024 * 50), cpu_stat={},
+        )
+        snapshot = dict(EXAMPLE_SNAPSHOT, cgroup_path='/sys/fs/cgroup/apache2', cgroup_stats=stats)
+        manager = ReplayManager(snapshot=snapshot)
+        assert manager.find_kill_candidates() == []
+        # To stay below 90% of the limit (excluding the page cache) the idle worker is killed.
+        candidates = manager.find_kill_candidates(cgroup_limit_percent=90)
+        assert [(c.worker.pid, c.rule) for c in candidates] == [
+            (1002, 'cgroup-limit-percent'),
+        ]
+        # Active workers are never killed by this policy.
+        candidates = manager.find_kill_candidates(cgroup_limit_percent=50)
+        assert [(c.worker.pid, c.rule) for c in candidates] == [
+            (1002, 'cgroup-limit-percent'),
+        ]
+        # Workers killed for other reasons count towards the reclaimed memory.
+        candidates = manager.find_kill_candidates(cgroup_limit_percent=90, max_memory_active=1024 * 1024 * 50)
+        assert [(c.worker.pid, c.rule) for c in candidates] == [
+            (1003, 'max-memory-active'),
+        ]
+
+    def test_capacity_report(self):
+        """Test the recommended number of processes per group of workers."""
+        assert percentile([], 95) == 0
+        assert percentile([3, 1, 2], 50) == 2
+        assert percentile(list(range(1, 101)), 95) == 95
+        megabyte = 1024 * 1024
+        snapshot = dict(EXAMPLE_SNAPSHOT, system_memory=dict(MemTotal=1000 * megabyte))
+        manager = ReplayManager(snapshot=snapshot)
+        report = plan_capacity(manager, headroom=20)
+        assert report.memory_budget == 800 * megabyte
+        assert report.memory_required == 140 * megabyte
+        # The native workers may use the budget minus the memory of the
+        # WSGI daemon process and vice versa.
+        assert [(g.name, g.count, g.memory_usage, g.recommended) for g in report.groups] == [
+            ('native', 2, 20 * megabyte, 35),
+            ('example', 1, 100 * megabyte, 7),
+        ]
+        assert report.max_request_workers == 35
+        assert report.peak_busy_workers == 1
+        assert report.slots == 3
+        # The peak concurrency is taken from the metric history.
+        directory = tempfile.mkdtemp()
+        try:
+            manager = ReplayManager(snapshot=snapshot, history_directory=directory)
+            manager.history.append([('busy-workers', 3)], EXAMPLE_SNAPSHOT['timestamp'])
+            report = plan_capacity(manager, headroom=20)
+            assert report.peak_busy_workers == 3
+            assert report.slot_utilization == 100
+            assert any('close to the number of slots' in line for line in format_capacity_report(report))
+            # The time range of the metric history is honored.
+            manager.history.append([('busy-workers', 2)], EXAMPLE_SNAPSHOT['timestamp'] + 60)
+            report = plan_capacity(manager, since=EXAMPLE_SNAPSHOT['timestamp'] + 30)
+            assert report.peak_busy_workers == 2
+            report = plan_capacity(manager, until=EXAMPLE_SNAPSHOT['timestamp'] + 30)
+            assert report.busy_workers == [3]
+            # Without samples in the time range the current number of busy workers is used.
+            report = plan_capacity(manager, until=EXAMPLE_SNAPSHOT['timestamp'] - 30)
+            assert report.busy_workers == [1]
+        finally:
+            shutil.rmtree(directory)
+        report = plan_capacity(ReplayManager(snapshot=snapshot), until=EXAMPLE_SNAPSHOT['timestamp'])
+        assert report.peak_busy_workers == 1
+        # The amount of memory installed in the host is required.
+        self.assertRaises(Exception, plan_capacity, ReplayManager(snapshot=EXAMPLE_SNAPSHOT))
+
+    def test_benchmarks(self):
+        """Test the synthetic inputs used by the benchmarks."""
+        for layout, threads in (('prefork', 1), ('threaded', 25)):
+            snapshot = generate_snapshot(100, layout)
+            manager = ReplayManager(snapshot=snapshot)
+            assert len(manager.slots) == 100
+            native = set(p['pid'] for p in snapshot['processes'] if not p['wsgi_process_group'])
+            assert set(w.pid for w in manager.workers) == native
+            assert len(native) <= 100 // threads
+            metrics = manager.server_metrics
+            assert metrics['busy_workers'] + metrics['idle_workers'] == len(manager.workers)
+            assert len(manager.wsgi_process_groups) == 1
+            # The synthetic /proc tree matches the snapshot.
+            directory = tempfile.mkdtemp()
+            try:
+                generate_proc_tree(directory, snapshot['processes'])
+                scanned = scan_proc_tree(directory)
+                assert scanned.master_pid == 1000
+                processes = dict((p.pid, p) for p in scanned.apache_workers)
+                assert sorted(processes) == sorted(p['pid'] for p in snapshot['processes'])
+                for expected in snapshot['processes']:
+                    process = processes[expected['pid']]
+                    assert process.cmdline == expected['cmdline']
+                    assert process.rss == expected['rss']
+                    assert process.wsgi_process_group == expected['wsgi_process_group']
+                    assert scanned.memory_info[process.pid]['pss'] == expected['rss'] // 2
+                    assert scanned.get_start_ticks(process) == expected['start_ticks']
+            finally:
+                shutil.rmtree(directory)
+        results = run_benchmarks(sizes=[100], layouts=['prefork'], repeat=1)
+        assert sorted(r['benchmark'] for r in results) == [
+            'collection', 'kill-workers', 'parse-slots', 'proc-scan', 'server-metrics',
+        ]
+        assert all(r['seconds'] > 0 for r in results)
+
+    def test_phase_timings(self):
+        """Test the time spent in each phase of a monitoring cycle."""
+        manager = ReplayManager(snapshot=EXAMPLE_SNAPSHOT)
+        manager.kill_workers(dry_run=True)
+        assert set(manager.phase_timings) == set(['parse', 'proc-scan', 'decide'])
+        # Time spent in nested phases is only counted once.
+        manager.refresh()
+        with manager.time_phase('decide'):
+            time.sleep(0.05)
+            with manager.time_phase('kill'):
+                time.sleep(0.1)
+        assert 0.05 <= manager.phase_timings['decide'] < 0.1
+        assert manager.phase_timings['kill'] >= 0.1
+        assert manager.check_cycle_time() is False
+        manager.cycle_time_budget = 0.1
+        assert manager.check_cycle_time() is True
+        assert manager.check_cycle_time(elapsed=0.05) is False
+        # The time spent saving results is reported in the next cycle.
+        directory = tempfile.mkdtemp()
+        try:
+            manager.save_metrics(os.path.join(directory, 'metrics.txt'))
+            assert 'phase_time_save' not in manager.manager_metrics
+            assert manager.phase_timings['save'] > 0
+            manager.refresh()
+            assert manager.manager_metrics['phase_time_save'] > 0
+            assert manager.manager_metrics['phase_time_kill'] == 0
+            manager.save_metrics(os.path.join(directory, 'metrics.txt'))
+            with open(os.path.join(directory, 'metrics.txt')) as handle:
+                assert 'phase-time-proc-scan' in handle.read()
+        finally:
+            shutil.rmtree(directory)
+
+    def test_profiling(self):
+        """Test profiling of monitoring cycles."""
+        def busy_loop():
+            timer = Timer()
+            while timer.elapsed_time < 0.2:
+                sum(range(1000))
+        directory = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(directory, 'cycle.prof')
+            # The sampling profiler produces regular pstats files.
+            profiler = CycleProfiler(filename=filename, mode='sampling', sample_interval=0.001)
+            with profiler.profile_cycle():
+                busy_loop()
+            stats = pstats.Stats(filename)
+            assert any(name == 'busy_loop' for path, line, name in stats.stats)
+            # Every Nth cycle is profiled and old profiles are rotated.
+            profiler = CycleProfiler(filename=filename, every=2, rotate=2)
+            for i in range(6):
+                with profiler.profile_cycle():
+                    sum(range(1000))
+            assert sorted(os.listdir(directory)) == ['cycle.prof', 'cycle.prof.1', 'cycle.prof.2']
+            # Only profiles of cycles that exceed the latency budget are saved.
+            os.unlink(filename)
+            profiler = CycleProfiler(filename=filename, latency_budget=60)
+            with profiler.profile_cycle():
+                sum(range(1000))
+            assert not os.path.exists(filename)
+            # Unsupported profilers are reported.
+            profiler = CycleProfiler(filename=filename, mode='other')
+            self.assertRaises(ValueError, profiler.create_profiler)
+            with profiler.profile_cycle():
+                sum(range(1000))
+            assert not os.path.exists(filename)
+            returncode, output = run_cli(['--profile=%s' % filename, '--profile-mode=other'])
+            assert returncode != 0
+            assert "Unsupported profile mode 'other'" in output
+            # The manager only profiles cycles when configured to do so.
+            assert ApacheManager().profiler is None
+            manager = ReplayManager(snapshot=EXAMPLE_SNAPSHOT, profile_file=filename, profile_mode='sampling')
+            with manager.profile_cycle():
+                manager.kill_workers(dry_run=True)
+            assert os.path.isfile(filename)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_proc_root(self):
+        """Test reading process information from another ``proc`` file system."""
+        directory = tempfile.mkdtemp()
+        try:
+            snapshot = generate_snapshot(100)
+            generate_proc_tree(directory, snapshot['processes'])
+            os.mkdir(os.path.join(directory, 'pressure'))
+            for name, contents in (('meminfo', 'MemTotal: 1024 kB\nMemAvailable: 256 kB\n'),
+                                   ('pressure/memory', 'some avg10=5.00 avg60=0.00 avg300=0.00 total=0\n'),
+                                   ('1000/cgroup', '0::/system.slice/apache2.service\n')):
+                with open(os.path.join(directory, name), 'w') as handle:
+                    handle.write(contents)
+            manager = ApacheManager(proc_root=directory)
+            assert manager.system_memory == read_meminfo(os.path.join(directory, 'meminfo'))
+            assert manager.memory_used_percent == 75.0
+            assert manager.memory_pressure['some']['avg10'] == 5.0
+            assert manager.master_pid == 1000
+            assert len(manager.apache_workers) == len(snapshot['processes'])
+            # The control group is looked up in the proc file system (the
+            # cgroup hierarchy itself doesn't exist on this host).
+            assert find_cgroup(1000, directory) is None
+            # Workers are looked up in the proc file system.
+            pid = snapshot['processes'][0]['pid']
+            worker = WorkerStatus(status_fields=dict(pid=str(pid)), manager=manager)
+            assert worker.process.rss == snapshot['processes'][0]['rss']
+            # Process handles check the start time in the proc file system.
+            start_ticks = snapshot['processes'][0]['start_ticks']
+            assert open_process(os.getpid(), start_ticks, use_pidfd=False, proc_root=directory) is None
+            # A synthetic tree doesn't belong to our PID namespace so workers
+            # aren't signaled (the process IDs may refer to other processes).
+            assert manager.foreign_pid_namespace
+            assert not ApacheManager(proc_root='/proc/').foreign_pid_namespace
+            manager.stop_workers([KillCandidate(worker=worker, excess=0, reason='testing')])
+            assert manager.num_confirmed == 0
+            # Killing workers in another PID namespace is a dry run (the kill budget isn't used).
+            with StatusServer() as server:
+                manager = ApacheManager(proc_root=directory, status_url=server.url, max_memory_idle=1)
+                with CaptureOutput() as capturer:
+                    assert manager.kill_workers()
+                    assert 'Selected' in capturer.get_text()
+                assert manager.kill_history == {}
+                assert manager.num_confirmed == 0
+            # The master process must exist.
+            shutil.rmtree(os.path.join(directory, '1000'))
+            self.assertRaises(Exception, find_worker_processes, directory)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_fake_status_server(self):
+        """Test fetching status pages from the bundled fake server."""
+        with StatusServer() as server:
+            manager = ApacheManager(status_url=server.url, apache_config='/nonexistent')
+            assert len(manager.slots) == server.scenario.slots
+            # The status page URL survives refresh() (used by --daemon and --watch).
+            manager.refresh()
+            assert manager.html_status_url == server.url
+            assert len(manager.slots) == server.scenario.slots
+            assert sorted(set(w.pid for w in manager.workers)) == server.scenario.pids
+            assert manager.server_metrics['busy_workers'] + manager.server_metrics['idle_workers'] == \
+                sum(1 for w in manager.slots if w.m != '.')
+            assert manager.status_response is True
+            # Unknown locations result in HTTP 404.
+            self.assertRaises(StatusPageError, manager.fetch_status_page, server.url + '-missing')
+            assert manager.status_response is False
+        # Error codes (half of the requests fail).
+        with StatusServer(scenario=StatusScenario(error_code=503, error_rate=0.5)) as server:
+            manager = ApacheManager(status_url=server.url)
+            assert manager.fetch_status_page(server.url)
+            self.assertRaises(StatusPageError, manager.fetch_status_page, server.url)
+        # Slow and stalled responses are subject to the status timeout.
+        for scenario in StatusScenario(delay=5), StatusScenario(stall=5):
+            with StatusServer(scenario=scenario) as server:
+                manager = ApacheManager(status_url=server.url, status_timeout=0.2)
+                timer = Timer()
+                self.assertRaises(StatusPageError, getattr, manager, 'slots')
+                assert timer.elapsed_time < 5
+                assert manager.status_response is False
+        # Requests are handled concurrently.
+        with StatusServer(scenario=StatusScenario(delay=0.5)) as server:
+            timer = Timer()
+            threads = [threading.Thread(target=ApacheManager(status_url=server.url).fetch_status_page,
+                                        args=(server.url,)) for i in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            assert server.requests == 8
+            assert timer.elapsed_time < 8 * 0.5
+        # The complete command line interface works against the fake server.
+        directory = tempfile.mkdtemp()
+        try:
+            generate_proc_tree(directory, generate_snapshot(100)['processes'])
+            data_file = os.path.join(directory, 'metrics.txt')
+            with StatusServer() as server:
+                exit_code, output = run_cli([
+                    '--status-url=%s' % server.url, '--proc-root=%s' % directory,
+                    '--collect-metrics', '--data-file=%s' % data_file,
+                ])
+            assert exit_code == 0
+            with open(data_file) as handle:
+                metrics = handle.read()
+            assert 'busy-workers' in metrics
+            assert 'memory-usage\tnative\tcount\t%i' % len(server.scenario.pids) in metrics
+        finally:
+            shutil.rmtree(directory)
+
+    def test_discovery_cache(self):
+        """Test that the configuration and listen addresses are cached until their sources change."""
+        directory = tempfile.mkdtemp()
+        try:
+            cache_file = os.path.join(directory, 'cache', 'discovery.json')
+            config_file = os.path.join(directory, 'apache-manager.ini')
+            config_directory = os.path.join(directory, 'apache-manager.d')
+            ports_config = os.path.join(directory, 'ports.conf')
+            os.mkdir(config_directory)
+            with open(config_file, 'w') as handle:
+                handle.write('[apache-manager]\nmax-memory-idle = 15M\n')
+            with open(ports_config, 'w') as handle:
+                handle.write('Listen 8080\n')
+
+            def create_manager():
+                manager = ApacheManager(cache_file=cache_file, ports_config=ports_config)
+                set_property(manager, 'config_loader', ConfigLoader(filename_patterns=[
+                    config_file, os.path.join(config_directory, '*.ini'),
+                ]))
+                manager.config
+                manager.listen_addresses
+                return manager
+            # The first run populates the cache.
+            manager = create_manager()
+            assert manager.discovery_cache.misses == 2
+            assert manager.max_memory_idle == 1024 * 1024 * 15
+            assert os.path.isfile(cache_file)
+            # The second run is served from the cache.
+            manager = create_manager()
+            assert manager.discovery_cache.hits == 2
+            assert manager.max_memory_idle == 1024 * 1024 * 15
+            assert [a.url for a in manager.listen_addresses] == ['http://127.0.0.1:8080']
+            # Changing a source file invalidates the corresponding entry.
+            with open(ports_config, 'w') as handle:
+                handle.write('Listen 127.0.0.2:8081\n')
+            manager = create_manager()
+            assert (manager.discovery_cache.hits, manager.discovery_cache.misses) == (1, 1)
+            assert [a.url for a in manager.listen_addresses] == ['http://127.0.0.2:8081']
+            # Adding a file to a configuration directory invalidates the configuration.
+            with open(os.path.join(config_directory, 'override.ini'), 'w') as handle:
+                handle.write('[apache-manager:native]\nmax-memory-active = 20M\n')
+            manager = create_manager()
+            assert (manager.discovery_cache.hits, manager.discovery_cache.misses) == (1, 1)
+            assert manager.group_thresholds == dict(native={'max-memory-active': 1024 * 1024 * 20})
+            # Corrupt cache files are ignored.
+            with open(cache_file, 'w') as handle:
+                handle.write('garbage')
+            manager = create_manager()
+            assert manager.discovery_cache.misses == 2
+            # The cache is disabled by default.
+            assert ApacheManager().discovery_cache is None
+        finally:
+            shutil.rmtree(directory)
+
+    def test_apache_config_discovery(self):
+        """Test discovery of the status page by parsing the Apache configuration and probing candidates."""
+        assert parse_listen_directive('80') == dict(protocol='http', address='127.0.0.1', port=80)
+        assert parse_listen_directive('443') == dict(protocol='https', address='127.0.0.1', port=443)
+        assert parse_listen_directive('0.0.0.0:8080', 'HTTP') == dict(protocol='http', address='127.0.0.1', port=8080)
+        assert parse_listen_directive('[::1]:8080') == dict(protocol='http', address='::1', port=8080)
+        assert parse_listen_directive('[::]:80') == dict(protocol='http', address='::1', port=80)
+        assert parse_listen_directive('::1:80') is None
+        assert NetworkAddress(address='::1', port=8080).url == 'http://[::1]:8080'
+        directory = tempfile.mkdtemp()
+        try:
+            def write_file(filename, contents):
+                pathname = os.path.join(directory, filename)
+                if not os.path.isdir(os.path.dirname(pathname)):
+                    os.makedirs(os.path.dirname(pathname))
+                with open(pathname, 'w') as handle:
+                    handle.write(dedent(contents))
+                return pathname
+            with StatusServer(scenario=StatusScenario(delay=1)) as slow_server, \
+                    StatusServer(scenario=StatusScenario(error_code=503)) as broken_server, \
+                    StatusServer(address='::1') as fast_server:
+                main_config = write_file('httpd.conf', '''
+                    # The main configuration file.
+                    ServerRoot "{directory}"
+                    Define PORTS_FILE ports.conf
+                    Include ${{PORTS_FILE}}
+                    IncludeOptional conf.d/*.conf
+                    IncludeOptional missing.d/*.conf
+                    Include sites
+                '''.format(directory=directory))
+                write_file('ports.conf', '''
+                    Listen 127.0.0.1:{slow}
+                    <IfModule ssl_module>
+                        Listen [::1]:{fast}
+                    </IfModule>
+                '''.format(slow=slow_server.server.server_address[1], fast=fast_server.server.server_address[1]))
+                write_file('conf.d/status.conf', '''
+                    <Location "/server-status">
+                        SetHandler server-status
+                    </Location>
+                    # Include cycles are ignored.
+                    Include httpd.conf
+                ''')
+                write_file('sites/nested/broken.conf', '''
+                    Listen \\
+                        0.0.0.0:{broken}
+                    Listen not-a-port
+                '''.format(broken=broken_server.server.server_address[1]))
+                # The configuration is parsed.
+                config = ApacheConfig(filename=main_config).load()
+                assert [a['port'] for a in config.listen_addresses] == [
+                    slow_server.server.server_address[1],
+                    fast_server.server.server_address[1],
+                    broken_server.server.server_address[1],
+                ]
+                assert config.listen_addresses[1]['address'] == '::1'
+                assert config.status_paths == ['/server-status']
+                assert os.path.join(directory, 'missing.d') in config.sources
+                # The fastest candidate that returns a valid status page wins.
+                cache_file = os.path.join(directory, 'discovery.json')
+                manager = ApacheManager(apache_config=main_config, cache_file=cache_file)
+                assert len(manager.status_urls) == 3
+                assert manager.html_status_url == fast_server.url
+                assert manager.server_metrics['busy_workers'] > 0
+                # The selected candidate is cached.
+                entries = manager.discovery_cache.entries
+                assert entries['status-url']['sources'] == entries['apache-config']['sources']
+                assert os.path.join(directory, 'ports.conf') in entries['status-url']['sources']
+                manager = ApacheManager(apache_config=main_config, cache_file=cache_file)
+                assert manager.html_status_url == fast_server.url
+                assert manager.discovery_cache.hits == 2
+                # The selection is forgotten when the status page can't be fetched.
+                fast_server.scenario.error_code = 503
+                self.assertRaises(StatusPageError, getattr, manager, 'html_status')
+                assert 'status-url' not in manager.discovery_cache.entries
+                # Without candidates that respond the first candidate is used.
+                manager = ApacheManager(apache_config=main_config, probe_timeout=0.1)
+                assert manager.html_status_url == manager.status_urls[0]
+        finally:
+            shutil.rmtree(directory)
+
 
 def retry(func, max_time=60):
     """Simple test helper to retry a function until assertions no longer fail."""
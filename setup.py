@@ -74,6 +74,7 @@ setup(
     tests_require=get_requirements('requirements-tests.txt'),
     entry_points=dict(console_scripts=[
         'apache-manager = apache_manager.cli:main',
+        'apache-manager-fake-server = apache_manager.fakeserver:main',
     ]),
     classifiers=[
         'Development Status :: 4 - Beta',